@@ -0,0 +1,216 @@
+"""
+End-to-end crawl throughput of WorkersManager.start on the offline fixture site for several numbers of crawlers.
+
+    python benchmarks/bench_crawl.py [--crawlers 1 2 4 8] [--pages 10] [--latency 0.02] [--jitter 0]
+                                     [--batch-size N] [--server] [--output results.json] [--compare baseline.json]
+
+The url downloader walks the list pages and enqueues the item pages, crawlers load, wait for and extract
+them through the worker's selenium code paths on a FakeWebDriver (pages rendered in-process, or served by
+the local FixtureServer with --server) and the database worker counts the items. Reported per configuration: pages/sec and items/sec, the time
+of an ItemUrlQueue put/get pair against queue.Queue and the memory per worker. Each configuration runs
+in a fresh interpreter. Results are written as JSON, --compare prints the change against an earlier run.
+"""
+import os
+import gc
+import sys
+import json
+import platform
+import argparse
+import subprocess
+from functools import partial
+from queue import Queue
+from threading import Thread, Event
+from time import perf_counter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from raccy import __version__, UrlDownloaderWorker, CrawlerWorker, DatabaseWorker, WorkersManager, ItemUrlQueue
+from benchmarks.fixtures import BASE_URL, ITEMS_PER_LIST, ITEM_FIELDS, FakeWebDriver, FixtureServer
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class UrlDownloader(UrlDownloaderWorker):
+    start_url = f'{BASE_URL}/list/0'
+    lists = 0
+
+    def job(self):
+        while True:
+            UrlDownloader.lists += 1
+            for link in self.driver.find_elements_by_xpath('//a[@class="item"]'):
+                self.url_queue.put(link.get_attribute('href'))
+            next_links = self.driver.find_elements_by_xpath('//a[@class="next"]')
+            if not next_links:
+                return
+            self.load(next_links[0].get_attribute('href'))
+
+
+class Crawler(CrawlerWorker):
+    url_wait_timeout = 0.5
+    parsed = 0
+    last = None
+
+    def parse(self, url):
+        self.load(url)
+        self.wait(ITEM_FIELDS['title'])
+        item = self.extract(ITEM_FIELDS)[0]
+        item['url'] = url
+        self.db_queue.put(item)
+        with self.mutex:
+            Crawler.parsed += 1
+            Crawler.last = perf_counter()
+
+
+class Db(DatabaseWorker):
+    data_wait_timeout = 0.5
+    saved = 0
+    last = None
+
+    def save(self, data):
+        Db.saved += 1
+        Db.last = perf_counter()
+
+
+def rss() -> int:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakMemory(Thread):
+    """
+    Samples the resident memory of the process until stopped and keeps the peak
+    """
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss()
+        self._stop_event = Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, rss())
+
+
+def put_get_time(queue, items=20_000) -> float:
+    """
+    Average time in microseconds of a put, get and task_done on queue
+    """
+    start = perf_counter()
+    for i in range(items):
+        queue.put(f'{BASE_URL}/item/{i}')
+    for _ in range(items):
+        queue.get()
+        queue.task_done()
+    return (perf_counter() - start) / items * 1e6
+
+
+def run(config: dict) -> dict:
+    n, pages = config['crawlers'], config['pages']
+    Db.batch_size = config['batch_size']
+    queue_us = put_get_time(ItemUrlQueue.named('bench'))
+    raw_queue_us = put_get_time(Queue())
+
+    server = FixtureServer(pages).__enter__() if config['server'] else None
+    manager = WorkersManager()
+    manager.add_driver(partial(
+        FakeWebDriver, pages, config['latency'], config['jitter'], None if server is None else server.base_url
+    ))
+    gc.collect()
+    baseline = rss()
+    memory = PeakMemory()
+    memory.start()
+    start = perf_counter()
+    manager.start(n=n)
+    peak = memory.stop()
+    if server is not None:
+        server.__exit__(None, None, None)
+
+    # the workers idle for their wait timeouts after the last item, the crawl ends with the last save
+    elapsed = max(Db.last or perf_counter(), Crawler.last or 0) - start
+    page_count = Crawler.parsed + UrlDownloader.lists
+    return {
+        'crawlers': n,
+        'pages': page_count,
+        'items': Db.saved,
+        'expected_items': pages * ITEMS_PER_LIST,
+        'seconds': round(elapsed, 4),
+        'pages_per_sec': round(page_count / elapsed, 2),
+        'items_per_sec': round(Db.saved / elapsed, 2),
+        'queue_put_get_us': round(queue_us, 3),
+        'raw_queue_put_get_us': round(raw_queue_us, 3),
+        'memory_per_worker_bytes': (peak - baseline) // (n + 2),
+    }
+
+
+def compare(results: dict, baseline: dict):
+    keys = ('pages_per_sec', 'items_per_sec', 'queue_put_get_us', 'memory_per_worker_bytes')
+    before = {r['crawlers']: r for r in baseline['results']}
+    print(f"\nchange against raccy {baseline['raccy']} ({', '.join(keys)}):")
+    for result in results['results']:
+        old = before.get(result['crawlers'])
+        if old is None:
+            continue
+        changes = [f'{(result[k] - old[k]) / old[k] * 100:+.1f}%' if old[k] else 'n/a' for k in keys]
+        print(f"crawlers={result['crawlers']:>3}: " + '  '.join(changes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--crawlers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--pages', type=int, default=10, help=f'list pages, each links {ITEMS_PER_LIST} items')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds a page load takes')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many seconds are added to the latency')
+    parser.add_argument('--batch-size', type=int, default=None, help='DatabaseWorker.batch_size')
+    parser.add_argument('--server', action='store_true', help='fetch the pages from the local fixture server')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    results = {
+        'raccy': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'results': [],
+    }
+    for n in args.crawlers:
+        config = dict(results['config'], crawlers=n)
+        out = subprocess.run(
+            [sys.executable, __file__, '--run', json.dumps(config)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        results['results'].append(result)
+        print(
+            f"crawlers={n:>3}: {result['pages_per_sec']:>8,.1f} pages/sec {result['items_per_sec']:>8,.1f} items/sec "
+            f"queue {result['queue_put_get_us']:.1f}us (raw {result['raw_queue_put_get_us']:.1f}us) "
+            f"{result['memory_per_worker_bytes'] / 2 ** 20:.2f} MiB/worker"
+        )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return results
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        print(json.dumps(run(json.loads(sys.argv[2]))))
+    else:
+        main()
@@ -0,0 +1,92 @@
+"""
+Scaling of crawler workers with the number of processes on a CPU bound parse.
+
+    python benchmarks/bench_processes.py [pages] [crawlers per process]
+
+Each configuration runs in a fresh interpreter since workers can only be started once per process.
+"""
+import os
+import re
+import sys
+import json
+import subprocess
+from time import perf_counter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from raccy import UrlDownloaderWorker, CrawlerWorker, DatabaseWorker, WorkersManager
+
+WORDS = re.compile(r'\w+')
+PAGE = ' '.join(f'<td class="cell">Item {i} price {i * 3.5:.2f}</td>' for i in range(300))
+
+
+class FakeDriver:
+    current_url = 'about:blank'
+    page_source = PAGE
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        pass
+
+
+class UrlDownloader(UrlDownloaderWorker):
+    start_url = 'https://example.com/'
+    pages = 0
+
+    def job(self):
+        for i in range(self.pages):
+            self.url_queue.put(f'https://example.com/items/{i}')
+
+
+class Crawler(CrawlerWorker):
+    url_wait_timeout = 1
+
+    def parse(self, url):
+        self.driver.get(url)
+        counts = {}
+        for _ in range(5):
+            for word in WORDS.findall(self.driver.page_source.lower()):
+                counts[word] = counts.get(word, 0) + 1
+        self.db_queue.put({'url': url, 'words': len(counts)})
+
+
+class Db(DatabaseWorker):
+    data_wait_timeout = 1
+    saved = 0
+
+    def save(self, data):
+        Db.saved += 1
+
+
+def run(processes, pages, n):
+    UrlDownloader.pages = pages
+    manager = WorkersManager()
+    manager.add_driver(FakeDriver)
+    start = perf_counter()
+    if processes:
+        manager.start(n=n, processes=processes)
+    else:
+        manager.start(n=n)
+    # the workers idle for their wait timeouts before exiting
+    elapsed = perf_counter() - start - Crawler.url_wait_timeout - Db.data_wait_timeout
+    return {'processes': processes, 'crawlers': n * max(processes, 1), 'pages': Db.saved, 'pages_per_sec': Db.saved / elapsed}
+
+
+def main(pages=2000, n=2):
+    for processes in sorted({0, 1, 2, 4, os.cpu_count() or 1}):
+        out = subprocess.run(
+            [sys.executable, __file__, '--run', str(processes), str(pages), str(n)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(f"processes={result['processes']:>2} crawlers={result['crawlers']:>3}: {result['pages_per_sec']:>8,.1f} pages/sec")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        print(json.dumps(run(*map(int, sys.argv[2:]))))
+    else:
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,51 @@
+"""
+Throughput of the in-memory queue against the disk backed SQLiteQueue.
+
+    python benchmarks/bench_queues.py [items]
+"""
+import os
+import sys
+import tempfile
+from queue import Queue
+from threading import Thread
+from time import perf_counter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from raccy.core.backends import SQLiteQueue
+
+
+def run(queue, items, consumers=4):
+    def consume():
+        while True:
+            item = queue.get()
+            queue.task_done()
+            if item is None:
+                return
+
+    threads = [Thread(target=consume) for _ in range(consumers)]
+    start = perf_counter()
+    for t in threads:
+        t.start()
+    for i in range(items):
+        queue.put({'url': f'https://example.com/item/{i}', 'price': i})
+    for _ in threads:
+        queue.put(None)
+    for t in threads:
+        t.join()
+    return items / (perf_counter() - start)
+
+
+def main(items=20_000):
+    tmp = tempfile.mkdtemp()
+    results = {
+        'queue.Queue': run(Queue(), items),
+        'SQLiteQueue': run(SQLiteQueue(os.path.join(tmp, 'bench.sqlite3')), items),
+    }
+    for name, rate in results.items():
+        print(f'{name:>12}: {rate:>10,.0f} items/sec')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
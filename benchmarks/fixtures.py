@@ -0,0 +1,135 @@
+"""
+Offline fixtures for the benchmarks: a fake webdriver serving generated pages with configurable
+latencies and a local HTTP server serving the same pages, so crawls run without a browser or network.
+
+Site layout: /list/<page> holds links to ITEMS_PER_LIST item pages and to the next list page,
+/item/<id> holds one item (title, price and image) in a small product page.
+"""
+import os
+import re
+import sys
+import random
+from threading import Thread
+from time import sleep
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from raccy.utils.http import HttpDriver
+from raccy.utils.driver import EXTRACT_SCRIPT
+
+BASE_URL = 'http://fixture.local'
+ITEMS_PER_LIST = 20
+ITEM_FIELDS = {
+    'title': '//h1[@class="title"]',
+    'price': '//span[@class="price"]',
+    'image': ('//img[@class="photo"]', 'src'),
+}
+LIST_PATH = re.compile(r'^/list/(\d+)$')
+ITEM_PATH = re.compile(r'^/item/(\d+)$')
+
+
+def list_page(page: int, pages: int) -> str:
+    first = page * ITEMS_PER_LIST
+    links = ''.join(f'<li><a class="item" href="/item/{i}">Item {i}</a></li>' for i in range(first, first + ITEMS_PER_LIST))
+    next_link = f'<a class="next" href="/list/{page + 1}">next</a>' if page + 1 < pages else ''
+    return f'<html><head><title>List {page}</title></head><body><ul>{links}</ul>{next_link}</body></html>'
+
+
+def item_page(item: int) -> str:
+    specs = ''.join(f'<tr><td>spec {i}</td><td>{item * i % 97}</td></tr>' for i in range(30))
+    return (
+        f'<html><head><title>Item {item}</title></head><body>'
+        f'<h1 class="title">Item {item}</h1><span class="price">{item * 3.5:.2f}</span>'
+        f'<img class="photo" src="/img/{item}.jpg"><table>{specs}</table></body></html>'
+    )
+
+
+def render(path: str, pages: int):
+    """
+    Returns the html of path on a site of pages list pages, None if there is no such page
+    """
+    match = LIST_PATH.match(path)
+    if match and int(match.group(1)) < pages:
+        return list_page(int(match.group(1)), pages)
+    match = ITEM_PATH.match(path)
+    if match and int(match.group(1)) < pages * ITEMS_PER_LIST:
+        return item_page(int(match.group(1)))
+    return None
+
+
+class FakeWebDriver(HttpDriver):
+    """
+    In-process stand-in for a selenium webdriver: get sleeps latency seconds (plus up to jitter)
+    to mimic a browser page load and parses the fixture page, from the fixture server if
+    base_url is given, otherwise rendered in-process. Workers use it through their selenium
+    code paths: find_element(s) serve driver_wait and execute_script runs the extract script
+    of raccy.utils.driver with lxml.
+    """
+
+    def __init__(self, pages: int = 10, latency: float = 0.0, jitter: float = 0.0, base_url: str = None):
+        super().__init__()
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.base_url = base_url
+        self.loaded = 0
+
+    def get(self, url: str) -> None:
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            sleep(delay)
+        self.loaded += 1
+        if self.base_url is not None:
+            return super().get(self.base_url + urlsplit(url).path)
+        self.load(url, render(urlsplit(url).path, self.pages) or '<html><title>Not found</title></html>')
+
+    def execute_script(self, script: str, *args):
+        """
+        Evaluates raccy.utils.driver.EXTRACT_SCRIPT with lxml, other scripts (eg. scrolling) do nothing
+        """
+        if script != EXTRACT_SCRIPT:
+            return None
+        rows, fields = args
+        return self.extract({name: (xpath, attr) if attr else xpath for name, xpath, attr in fields}, rows)
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    pages = 10
+
+    def do_GET(self):
+        html = render(urlsplit(self.path).path, self.pages)
+        if html is None:
+            self.send_error(404)
+            return
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """
+    Serves the fixture site on a free local port from a background thread, use it as a context manager
+    """
+
+    def __init__(self, pages: int = 10, host: str = '127.0.0.1'):
+        handler = type('FixtureHandler', (_FixtureHandler,), {'pages': pages})
+        self.server = ThreadingHTTPServer((host, 0), handler)
+        self.server.daemon_threads = True
+        self.base_url = f'http://{host}:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        Thread(target=self.server.serve_forever, name='fixture-server', daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
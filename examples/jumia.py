@@ -50,10 +50,12 @@ class Crawler(CrawlerWorker):
             action="click",
             condition=EC.element_to_be_clickable
         )
-        products = self.driver.find_elements_by_xpath("//article[@class='prd _fb col c-prd']")
+        products = self.extract(
+            rows="//article[@class='prd _fb col c-prd']",
+            fields={'url': ('.//a', 'href')}
+        )
         for product in products:
-            product_url = product.find_element_by_xpath(".//a").get_attribute('href')
-            self.parse_product(product_url)
+            self.parse_product(product['url'])
 
     def _get_data(self, xpath):
         try:
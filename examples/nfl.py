@@ -45,29 +45,31 @@ class Crawler(CrawlerWorker):
 
     def parse(self, url):
         self.driver.get(url)
-        rows = self.driver.find_elements_by_xpath("//table/tbody/tr")
-        select = Select(self.driver.find_element_by_xpath("//select"))
-
-        for row in rows:
-            data = {
-                'year': select.first_selected_option.text,
-                'team': row.find_element_by_xpath(".//td/div/div[contains(@class,'shortname')]").text,
-                'att': row.find_element_by_xpath("(.//td)[2]").text,
-                'cmp': row.find_element_by_xpath("(.//td)[3]").text,
-                'cmp_pct': row.find_element_by_xpath("(.//td)[4]").text,
-                'yds_att': row.find_element_by_xpath("(.//td)[5]").text,
-                'pass_yds': row.find_element_by_xpath("(.//td)[6]").text,
-                'td': row.find_element_by_xpath("(.//td)[7]").text,
-                'int': row.find_element_by_xpath("(.//td)[8]").text,
-                'rate': row.find_element_by_xpath("(.//td)[9]").text,
-                'first': row.find_element_by_xpath("(.//td)[10]").text,
-                'first_pct': row.find_element_by_xpath("(.//td)[11]").text,
-                'twenty_plus': row.find_element_by_xpath("(.//td)[12]").text,
-                'forty_plus': row.find_element_by_xpath("(.//td)[13]").text,
-                'lng': row.find_element_by_xpath("(.//td)[14]").text,
-                'sck': row.find_element_by_xpath("(.//td)[15]").text,
-                'scky': row.find_element_by_xpath("(.//td)[16]").text
+        year = Select(self.driver.find_element_by_xpath("//select")).first_selected_option.text
+        rows = self.extract(
+            rows="//table/tbody/tr",
+            fields={
+                'team': ".//td/div/div[contains(@class,'shortname')]",
+                'att': "(.//td)[2]",
+                'cmp': "(.//td)[3]",
+                'cmp_pct': "(.//td)[4]",
+                'yds_att': "(.//td)[5]",
+                'pass_yds': "(.//td)[6]",
+                'td': "(.//td)[7]",
+                'int': "(.//td)[8]",
+                'rate': "(.//td)[9]",
+                'first': "(.//td)[10]",
+                'first_pct': "(.//td)[11]",
+                'twenty_plus': "(.//td)[12]",
+                'forty_plus': "(.//td)[13]",
+                'lng': "(.//td)[14]",
+                'sck': "(.//td)[15]",
+                'scky': "(.//td)[16]"
             }
+        )
+
+        for data in rows:
+            data['year'] = year
             self.log.info(data)
             self.db_queue.put(data)
 
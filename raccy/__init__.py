@@ -14,8 +14,17 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 from .core.queue_ import ItemUrlQueue, DatabaseQueue
-from .worker.worker import UrlDownloaderWorker, CrawlerWorker, DatabaseWorker, BaseCrawlerWorker
+from .core.filters import MemoryUrlFilter, BloomUrlFilter
+from .core.backends import SQLiteQueue, SpillQueue
+from .core.scheduler import DomainScheduler
+from .core.frontier import Frontier
+from .core.broker import QueueBroker, RemoteQueue
+from .core.cache import PageCache
+from .worker.worker import UrlDownloaderWorker, CrawlerWorker, HttpCrawlerWorker, DatabaseWorker, BaseCrawlerWorker
 from .worker.worker import Manager as WorkersManager
+from .worker.pool import DriverPool
+from .worker.autoscale import Autoscaler
+from .worker.aio import AsyncUrlDownloaderWorker, AsyncCrawlerWorker, AsyncDatabaseWorker
 
 __version__ = '2.0.0'
 
@@ -24,8 +33,23 @@ __all__ = [
     'BaseCrawlerWorker',
     'ItemUrlQueue',
     'DatabaseQueue',
+    'MemoryUrlFilter',
+    'BloomUrlFilter',
+    'SQLiteQueue',
+    'SpillQueue',
+    'DomainScheduler',
+    'Frontier',
+    'QueueBroker',
+    'RemoteQueue',
+    'PageCache',
     'UrlDownloaderWorker',
     'CrawlerWorker',
+    'HttpCrawlerWorker',
     'DatabaseWorker',
-    'WorkersManager'
+    'WorkersManager',
+    'DriverPool',
+    'Autoscaler',
+    'AsyncUrlDownloaderWorker',
+    'AsyncCrawlerWorker',
+    'AsyncDatabaseWorker'
 ]
@@ -0,0 +1,351 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import pickle
+import sqlite3
+import tempfile
+import zlib
+from collections import deque
+from queue import Queue, Empty, Full
+from threading import Lock, Condition, local
+from time import monotonic
+from typing import Optional, Union, Callable, Any
+
+from raccy.core.exceptions import QueueError
+from raccy.core.utils import abstractmethod
+
+
+class QueueBackend:
+    """
+    Base class for queue backends, a drop-in replacement for queue.Queue in BaseQueue.
+    Unlike queue.Queue, task_done acknowledges the oldest item the calling thread got from
+    the queue, so backends can tell which items are still being processed.
+
+    Subclasses implement _put, _get, _ack and _qsize, _get returns a (token, item) pair,
+    the token is passed to _ack when the item is acknowledged.
+    """
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.mutex = Lock()
+        self.not_empty = Condition(self.mutex)
+        self.not_full = Condition(self.mutex)
+        self.all_tasks_done = Condition(self.mutex)
+        self.unfinished_tasks = 0
+        self._local = local()
+
+    def _pending(self) -> list:
+        try:
+            return self._local.pending
+        except AttributeError:
+            self._local.pending = []
+            return self._local.pending
+
+    def _wait_time(self) -> Optional[float]:
+        """
+        Returns 0 if an item can be taken now, the number of seconds after which one may
+        become available or None if there is no item
+        """
+        return 0 if self._qsize() > 0 else None
+
+    def put(self, item, block=True, timeout=None, **kwargs):
+        with self.not_full:
+            if self.maxsize > 0:
+                if not block:
+                    if self._qsize() >= self.maxsize:
+                        raise Full
+                elif timeout is None:
+                    while self._qsize() >= self.maxsize:
+                        self.not_full.wait()
+                else:
+                    endtime = monotonic() + timeout
+                    while self._qsize() >= self.maxsize:
+                        remaining = endtime - monotonic()
+                        if remaining <= 0:
+                            raise Full
+                        self.not_full.wait(remaining)
+            self._put(item, **kwargs)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def get(self, block=True, timeout=None):
+        with self.not_empty:
+            endtime = None if timeout is None else monotonic() + timeout
+            while True:
+                wait = self._wait_time()
+                if wait == 0:
+                    break
+                if not block:
+                    raise Empty
+                if endtime is not None:
+                    remaining = endtime - monotonic()
+                    if remaining <= 0:
+                        raise Empty
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.not_empty.wait(wait)
+            token, item = self._get()
+            self._pending().append(token)
+            self.not_full.notify()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def task_done(self):
+        with self.all_tasks_done:
+            pending = self._pending()
+            if pending:
+                self._ack(pending.pop(0))
+            unfinished = self.unfinished_tasks - 1
+            if unfinished < 0:
+                raise ValueError('task_done() called too many times')
+            self.unfinished_tasks = unfinished
+            if unfinished == 0:
+                self.all_tasks_done.notify_all()
+            self.not_empty.notify()
+
+    def join(self):
+        with self.all_tasks_done:
+            while self.unfinished_tasks:
+                self.all_tasks_done.wait()
+
+    def qsize(self) -> int:
+        with self.mutex:
+            return self._qsize()
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def full(self) -> bool:
+        with self.mutex:
+            return 0 < self.maxsize <= self._qsize()
+
+    @property
+    def queue(self) -> list:
+        with self.mutex:
+            return self._items()
+
+    def close(self):
+        """
+        Releases resources held by the backend
+        """
+
+    @abstractmethod
+    def _put(self, item, **kwargs):
+        pass
+
+    @abstractmethod
+    def _get(self):
+        pass
+
+    @abstractmethod
+    def _ack(self, token):
+        pass
+
+    @abstractmethod
+    def _qsize(self) -> int:
+        pass
+
+    @abstractmethod
+    def _items(self) -> list:
+        pass
+
+
+class SQLiteQueue(QueueBackend):
+    """
+    Crash-safe FIFO queue stored in a SQLite database in WAL mode. Items are pickled.
+    An item stays in the database until it is acknowledged with task_done, items that
+    were handed out but not acknowledged when the process died are redelivered on restart.
+    Several queues can share one database file by using different table names.
+    """
+
+    def __init__(self, path: str, table='queue', maxsize=0):
+        super().__init__(maxsize)
+        self.path = path
+        self.table = table
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS "{table}" '
+            f'(id INTEGER PRIMARY KEY AUTOINCREMENT, item BLOB NOT NULL, leased INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._conn.execute(f'UPDATE "{table}" SET leased = 0 WHERE leased = 1')
+        self._size = self._conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        self._last_id = 0
+        self.unfinished_tasks = self._size
+
+    def _put(self, item, **kwargs):
+        self._conn.execute(
+            f'INSERT INTO "{self.table}" (item) VALUES (?)',
+            (pickle.dumps(item, pickle.HIGHEST_PROTOCOL),)
+        )
+        self._size += 1
+
+    def _get(self):
+        row_id, data = self._conn.execute(
+            f'SELECT id, item FROM "{self.table}" WHERE id > ? AND leased = 0 ORDER BY id LIMIT 1',
+            (self._last_id,)
+        ).fetchone()
+        self._conn.execute(f'UPDATE "{self.table}" SET leased = 1 WHERE id = ?', (row_id,))
+        self._last_id = row_id
+        self._size -= 1
+        return row_id, pickle.loads(data)
+
+    def _ack(self, token):
+        self._conn.execute(f'DELETE FROM "{self.table}" WHERE id = ?', (token,))
+
+    def _qsize(self):
+        return self._size
+
+    def _items(self):
+        rows = self._conn.execute(f'SELECT item FROM "{self.table}" WHERE leased = 0 ORDER BY id')
+        return [pickle.loads(data) for data, in rows]
+
+    def close(self):
+        with self.mutex:
+            self._conn.close()
+
+
+class SpillQueue(QueueBackend):
+    """
+    FIFO queue keeping up to memory_size items in memory, further items are spilled to a SQLite file
+    and read back in order as the queue drains, so memory use stays flat however far producers
+    run ahead of consumers. Spilled items are pickled. Without a path, a temporary file is used
+    and removed by close. Unlike SQLiteQueue, items are not kept across restarts.
+    """
+
+    def __init__(self, memory_size: int = 10_000, path: Optional[str] = None, maxsize=0):
+        super().__init__(maxsize)
+        self.memory_size = memory_size
+        self._temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='raccy-spill-', suffix='.sqlite')
+            os.close(fd)
+        self.path = path
+        self._memory = deque()
+        self._spilled = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=OFF')
+        self._conn.execute('DROP TABLE IF EXISTS spill')
+        self._conn.execute('CREATE TABLE spill (id INTEGER PRIMARY KEY AUTOINCREMENT, item BLOB NOT NULL)')
+
+    @property
+    def spilled(self) -> int:
+        """
+        Number of items currently on disk
+        """
+        return self._spilled
+
+    def _put(self, item, **kwargs):
+        # once items are on disk, new items follow them there to keep the order
+        if self._spilled or len(self._memory) >= self.memory_size:
+            self._conn.execute('INSERT INTO spill (item) VALUES (?)', (pickle.dumps(item, pickle.HIGHEST_PROTOCOL),))
+            self._spilled += 1
+        else:
+            self._memory.append(item)
+
+    def _refill(self):
+        count = min(max(self.memory_size - len(self._memory), 1), self._spilled)
+        rows = self._conn.execute('SELECT id, item FROM spill ORDER BY id LIMIT ?', (count,)).fetchall()
+        if rows:
+            self._conn.execute('DELETE FROM spill WHERE id <= ?', (rows[-1][0],))
+            self._memory.extend(pickle.loads(data) for _, data in rows)
+            self._spilled -= len(rows)
+
+    def _get(self):
+        if self._spilled and len(self._memory) <= self.memory_size // 2:
+            self._refill()
+        return None, self._memory.popleft()
+
+    def _ack(self, token):
+        pass
+
+    def _qsize(self):
+        return len(self._memory) + self._spilled
+
+    def _items(self):
+        rows = self._conn.execute('SELECT item FROM spill ORDER BY id')
+        return [*self._memory, *(pickle.loads(data) for data, in rows)]
+
+    def close(self):
+        with self.mutex:
+            self._conn.close()
+            if self._temporary:
+                for suffix in ('', '-wal', '-shm'):
+                    try:
+                        os.remove(self.path + suffix)
+                    except FileNotFoundError:
+                        pass
+
+
+class ShardedQueue:
+    """
+    Backend for DatabaseQueue that routes each item to one of n queues by the hash of its key, so
+    items with the same key are always saved by the same database worker. key is the name of an
+    item field or a callable returning the key of an item. Workers read their queue, see shard.
+    """
+
+    def __init__(self, n: int, key: Union[str, Callable[[dict], Any]], maxsize=0):
+        self.key = key
+        self.shards = [Queue(maxsize) for _ in range(n)]
+
+    def shard(self, index: int) -> Queue:
+        return self.shards[index]
+
+    def index(self, item) -> int:
+        """
+        Index of the shard of item, the same in every process
+        """
+        key = self.key(item) if callable(self.key) else item.get(self.key)
+        return zlib.crc32(repr(key).encode('utf-8')) % len(self.shards)
+
+    def put(self, item, block=True, timeout=None):
+        self.shards[self.index(item)].put(item, block, timeout)
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def get(self, block=True, timeout=None):
+        raise QueueError(f"{self.__class__.__name__}: items are read from the shards!")
+
+    def task_done(self):
+        raise QueueError(f"{self.__class__.__name__}: items are acknowledged on the shards!")
+
+    @property
+    def unfinished_tasks(self) -> int:
+        return sum(shard.unfinished_tasks for shard in self.shards)
+
+    def join(self):
+        for shard in self.shards:
+            shard.join()
+
+    def qsize(self) -> int:
+        return sum(shard.qsize() for shard in self.shards)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def full(self) -> bool:
+        return any(shard.full() for shard in self.shards)
+
+    @property
+    def queue(self) -> list:
+        return [item for shard in self.shards for item in list(shard.queue)]
@@ -0,0 +1,356 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import hmac
+import socket
+import argparse
+import socketserver
+from collections import deque
+from queue import Empty, Full
+from threading import Thread, Condition, Lock, Event, local
+from time import monotonic
+from typing import Optional
+
+from raccy.core.backends import QueueBackend
+from raccy.core.exceptions import QueueError
+
+DEFAULT_PORT = 8765
+
+
+##################################
+#       BROKER
+##################################
+class _LeaseQueue:
+    """
+    Queue kept by the broker: items handed out are leased until they are acknowledged,
+    items whose lease expires (eg. the node that got them died) are delivered again
+    """
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.cond = Condition()
+        self.items = deque()
+        self.leases = {}
+        self.unfinished = 0
+        self._next_id = 0
+
+    def _expire(self):
+        now = monotonic()
+        expired = [lease_id for lease_id, (_, deadline) in self.leases.items() if deadline <= now]
+        for lease_id in expired:
+            self.items.appendleft(self.leases.pop(lease_id)[0])
+        if expired:
+            self.cond.notify_all()
+
+    def _wait(self, ready, timeout):
+        endtime = None if timeout is None else monotonic() + timeout
+        while True:
+            self._expire()
+            if ready():
+                return True
+            wait = 1
+            if self.leases:
+                wait = min(wait, max(0.01, min(deadline for _, deadline in self.leases.values()) - monotonic()))
+            if endtime is not None:
+                wait = min(wait, endtime - monotonic())
+                if wait <= 0:
+                    return False
+            self.cond.wait(wait)
+
+    def put(self, item, timeout):
+        with self.cond:
+            if self.maxsize > 0 and not self._wait(lambda: len(self.items) < self.maxsize, timeout):
+                raise Full
+            self.items.append(item)
+            self.unfinished += 1
+            self.cond.notify_all()
+
+    def get(self, timeout, lease_timeout):
+        with self.cond:
+            if not self._wait(lambda: self.items, timeout):
+                raise Empty
+            item = self.items.popleft()
+            self._next_id += 1
+            self.leases[self._next_id] = (item, monotonic() + lease_timeout)
+            self.cond.notify_all()
+            return self._next_id, item
+
+    def ack(self, lease_id):
+        with self.cond:
+            if self.leases.pop(lease_id, None) is None:
+                return False
+            self.unfinished -= 1
+            self.cond.notify_all()
+            return True
+
+    def touch(self, lease_ids, lease_timeout):
+        with self.cond:
+            deadline = monotonic() + lease_timeout
+            for lease_id in lease_ids:
+                if lease_id in self.leases:
+                    self.leases[lease_id] = (self.leases[lease_id][0], deadline)
+
+    def stats(self):
+        with self.cond:
+            self._expire()
+            return dict(qsize=len(self.items), leased=len(self.leases), unfinished=self.unfinished, maxsize=self.maxsize)
+
+    def snapshot(self):
+        with self.cond:
+            return list(self.items)
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.broker.dispatch(json.loads(line))
+            except Empty:
+                response = {'error': 'empty'}
+            except Full:
+                response = {'error': 'full'}
+            except Exception as e:
+                response = {'error': 'failed', 'message': str(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class _BrokerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class QueueBroker:
+    """
+    Small TCP broker holding named queues shared by crawler nodes on several machines.
+    Items are JSON encoded, so they must be JSON serializable (urls, dicts of plain values).
+    Items handed out are leased: clients renew the leases of items they are processing and
+    acknowledge them with task_done, items of nodes that died are delivered again once their lease expires.
+    Run it with: python -m raccy.core.broker --host 0.0.0.0 --port 8765
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, maxsize=0, token: Optional[str] = None):
+        self.maxsize = maxsize
+        self.token = token
+        self._queues = {}
+        self._lock = Lock()
+        self._server = _BrokerServer((host, port), _BrokerHandler)
+        self._server.broker = self
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def queue(self, name) -> _LeaseQueue:
+        with self._lock:
+            try:
+                return self._queues[name]
+            except KeyError:
+                queue = self._queues[name] = _LeaseQueue(self.maxsize)
+                return queue
+
+    def dispatch(self, request: dict) -> dict:
+        if self.token is not None and not hmac.compare_digest(str(request.get('token')), self.token):
+            return {'error': 'failed', 'message': 'invalid token'}
+        op = request['op']
+        queue = self.queue(request['queue'])
+        if op == 'put':
+            queue.put(request['item'], request.get('timeout'))
+            return {}
+        if op == 'get':
+            lease_id, item = queue.get(request.get('timeout'), request['lease_timeout'])
+            return {'id': lease_id, 'item': item}
+        if op == 'ack':
+            return {'acked': queue.ack(request['id'])}
+        if op == 'touch':
+            queue.touch(request['ids'], request['lease_timeout'])
+            return {}
+        if op == 'stats':
+            return queue.stats()
+        if op == 'items':
+            return {'items': queue.snapshot()}
+        raise QueueError(f'unknown operation {op}')
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self) -> 'QueueBroker':
+        """
+        Serves requests in a background thread
+        """
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+##################################
+#       CLIENT
+##################################
+class RemoteQueue(QueueBackend):
+    """
+    Queue backend for ItemUrlQueue and DatabaseQueue backed by a named queue of a QueueBroker,
+    eg. ItemUrlQueue().set_queue(RemoteQueue('10.0.0.5', 8765, 'urls')).
+    Every thread uses its own connection, leases of items being processed are renewed in
+    the background every lease_timeout / 3 seconds until task_done is called.
+    """
+
+    def __init__(
+            self,
+            host='127.0.0.1',
+            port=DEFAULT_PORT,
+            name='queue',
+            lease_timeout: float = 60,
+            token: Optional[str] = None,
+            connect_timeout: float = 10
+    ):
+        super().__init__()
+        self.address = (host, port)
+        self.name = name
+        self.lease_timeout = lease_timeout
+        self.token = token
+        self.connect_timeout = connect_timeout
+        self._conn = local()
+        self._leased = set()
+        self._leased_lock = Lock()
+        self._closed = Event()
+        self._heartbeat = None
+
+    def _connection(self):
+        try:
+            return self._conn.file
+        except AttributeError:
+            sock = socket.create_connection(self.address, timeout=self.connect_timeout)
+            sock.settimeout(None)
+            self._conn.file = sock.makefile('rwb')
+            return self._conn.file
+
+    def _request(self, op, **kwargs) -> dict:
+        request = dict(op=op, queue=self.name, token=self.token, **kwargs)
+        try:
+            conn = self._connection()
+            conn.write(json.dumps(request).encode('utf-8') + b'\n')
+            conn.flush()
+            line = conn.readline()
+            if not line:
+                raise ConnectionError('connection closed by broker')
+        except (OSError, ValueError) as e:
+            try:
+                self._conn.file.close()
+                del self._conn.file
+            except AttributeError:
+                pass
+            raise QueueError(f"{self.__class__.__name__}: broker {self.address} unavailable: {e}") from e
+        response = json.loads(line)
+        error = response.get('error')
+        if error == 'empty':
+            raise Empty
+        if error == 'full':
+            raise Full
+        if error:
+            raise QueueError(f"{self.__class__.__name__}: {response.get('message')}")
+        return response
+
+    def _start_heartbeat(self):
+        with self._leased_lock:
+            if self._heartbeat is None:
+                self._heartbeat = Thread(target=self._renew_leases, daemon=True)
+                self._heartbeat.start()
+
+    def _renew_leases(self):
+        while not self._closed.wait(self.lease_timeout / 3):
+            with self._leased_lock:
+                ids = list(self._leased)
+            if ids:
+                try:
+                    self._request('touch', ids=ids, lease_timeout=self.lease_timeout)
+                except QueueError:
+                    pass
+
+    def put(self, item, block=True, timeout=None, **kwargs):
+        self._request('put', item=item, timeout=timeout if block else 0)
+
+    def get(self, block=True, timeout=None):
+        response = self._request('get', timeout=timeout if block else 0, lease_timeout=self.lease_timeout)
+        with self._leased_lock:
+            self._leased.add(response['id'])
+        self._pending().append(response['id'])
+        self._start_heartbeat()
+        return response['item']
+
+    def task_done(self):
+        pending = self._pending()
+        if not pending:
+            raise ValueError('task_done() called without a matching get()')
+        lease_id = pending.pop(0)
+        with self._leased_lock:
+            self._leased.discard(lease_id)
+        self._request('ack', id=lease_id)
+
+    def stats(self) -> dict:
+        return self._request('stats')
+
+    @property
+    def unfinished_tasks(self) -> int:
+        return self.stats()['unfinished']
+
+    @unfinished_tasks.setter
+    def unfinished_tasks(self, value):
+        # the count is kept by the broker
+        pass
+
+    def join(self):
+        while self.unfinished_tasks:
+            self._closed.wait(0.5)
+
+    def qsize(self) -> int:
+        return self.stats()['qsize']
+
+    def full(self) -> bool:
+        stats = self.stats()
+        return 0 < stats['maxsize'] <= stats['qsize']
+
+    @property
+    def queue(self) -> list:
+        return self._request('items')['items']
+
+    def close(self):
+        self._closed.set()
+        try:
+            self._conn.file.close()
+        except AttributeError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='raccy queue broker')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--maxsize', type=int, default=0, help='maximum number of items per queue, 0 for unbounded')
+    parser.add_argument('--token', default=None, help='shared secret clients have to send')
+    args = parser.parse_args()
+    broker = QueueBroker(args.host, args.port, args.maxsize, args.token)
+    print(f'raccy broker listening on {args.host}:{args.port}')
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        broker.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sqlite3
+import zlib
+from threading import Lock
+from time import time
+from typing import Optional
+
+from raccy.core.filters import canonicalize_url
+from raccy.core.metrics import CACHE_HITS, CACHE_MISSES
+
+
+class PageCache:
+    """
+    On-disk cache of rendered pages stored zlib compressed in a SQLite database and keyed by canonicalized url.
+    Pages older than ttl seconds are treated as missing. When the compressed pages take more than
+    max_size bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_size: Optional[int] = None, level: int = 6):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.level = level
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages '
+            '(key TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, '
+            'created REAL NOT NULL, accessed REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)')
+        self._size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    @property
+    def size(self) -> int:
+        """
+        Size in bytes of the compressed pages
+        """
+        return self._size
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def __contains__(self, url: str) -> bool:
+        key = canonicalize_url(url)
+        with self._lock:
+            row = self._conn.execute('SELECT created FROM pages WHERE key = ?', (key,)).fetchone()
+        return row is not None and not self._expired(row[0])
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time() - created > self.ttl
+
+    def _delete(self, key: str):
+        row = self._conn.execute('SELECT size FROM pages WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            self._conn.execute('DELETE FROM pages WHERE key = ?', (key,))
+            self._size -= row[0]
+
+    def get(self, url: str) -> Optional[str]:
+        """
+        Returns the cached page source of url, None if it is not cached or has expired
+        """
+        key = canonicalize_url(url)
+        with self._lock:
+            row = self._conn.execute('SELECT body, created FROM pages WHERE key = ?', (key,)).fetchone()
+            if row is None or self._expired(row[1]):
+                if row is not None:
+                    self._delete(key)
+                CACHE_MISSES.inc()
+                return None
+            self._conn.execute('UPDATE pages SET accessed = ? WHERE key = ?', (time(), key))
+        CACHE_HITS.inc()
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def set(self, url: str, html: str):
+        """
+        Stores the page source of url
+        """
+        key = canonicalize_url(url)
+        body = zlib.compress(html.encode('utf-8'), self.level)
+        now = time()
+        with self._lock:
+            self._delete(key)
+            self._conn.execute(
+                'INSERT INTO pages (key, body, size, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                (key, body, len(body), now, now)
+            )
+            self._size += len(body)
+            if self.max_size is not None and self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        rows = self._conn.execute('SELECT key, size FROM pages ORDER BY accessed')
+        evicted = []
+        size = self._size
+        for key, page_size in rows:
+            if size <= self.max_size:
+                break
+            evicted.append((key,))
+            size -= page_size
+        self._conn.executemany('DELETE FROM pages WHERE key = ?', evicted)
+        self._size = size
+
+    def delete(self, url: str):
+        with self._lock:
+            self._delete(canonicalize_url(url))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM pages')
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,171 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import math
+import struct
+import hashlib
+from threading import Lock
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from raccy.core.utils import abstractmethod
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url: str, keep_fragments=False) -> str:
+    """
+    Normalizes url so that equivalent urls compare equal: lowercases scheme and host,
+    drops default ports and the fragment and sorts the query parameters
+    """
+    scheme, netloc, path, query, fragment = urlsplit(url.strip())
+    scheme = scheme.lower()
+    netloc = netloc.lower()
+    host, _, port = netloc.rpartition(':')
+    if host and port.isdigit() and DEFAULT_PORTS.get(scheme) == int(port):
+        netloc = host
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path or '/', query, fragment if keep_fragments else ''))
+
+
+class BaseUrlFilter:
+    """
+    Base class for url filters: remembers canonicalized urls to detect duplicates
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+
+    def seen(self, url: str) -> bool:
+        """
+        Returns True if url was seen before, otherwise remembers it and returns False
+        """
+        key = canonicalize_url(url)
+        with self._lock:
+            if self._contains(key):
+                return True
+            self._add(key)
+            return False
+
+    def contains(self, url: str) -> bool:
+        """
+        Returns True if url was seen before without remembering it
+        """
+        key = canonicalize_url(url)
+        with self._lock:
+            return self._contains(key)
+
+    def add(self, url: str) -> None:
+        """
+        Remembers url
+        """
+        key = canonicalize_url(url)
+        with self._lock:
+            self._add(key)
+
+    @abstractmethod
+    def _contains(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def _add(self, key: str) -> None:
+        pass
+
+    def save(self) -> None:
+        """
+        Persists the filter, it is a no-op for in-memory filters
+        """
+
+
+class MemoryUrlFilter(BaseUrlFilter):
+    """
+    Exact url filter backed by a set, suitable for small crawls
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._urls = set()
+
+    def __len__(self):
+        return len(self._urls)
+
+    def _contains(self, key):
+        return key in self._urls
+
+    def _add(self, key):
+        self._urls.add(key)
+
+
+class BloomUrlFilter(BaseUrlFilter):
+    """
+    Compact probabilistic url filter for large crawls. Holds capacity urls with a false positive
+    rate of error_rate (a new url is wrongly reported as seen), eg. 10 million urls at 0.1% take about 18MB.
+    If path is given, the filter is loaded from and saved to that file,
+    a snapshot is written every save_every new urls.
+    """
+    _header = struct.Struct('<QI')
+
+    def __init__(
+            self,
+            capacity: int = 10_000_000,
+            error_rate: float = 0.001,
+            path: Optional[str] = None,
+            save_every: Optional[int] = None
+    ):
+        super().__init__()
+        self.path = path
+        self.save_every = save_every
+        self._added = 0
+        if path is not None and os.path.isfile(path):
+            self._load(path)
+        else:
+            self._size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+            self._hashes = max(1, round(self._size / capacity * math.log(2)))
+            self._bits = bytearray((self._size + 7) // 8)
+
+    def _load(self, path):
+        with open(path, 'rb') as f:
+            self._size, self._hashes = self._header.unpack(f.read(self._header.size))
+            self._bits = bytearray(f.read())
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self._size for i in range(self._hashes))
+
+    def _contains(self, key):
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def _add(self, key):
+        for p in self._positions(key):
+            self._bits[p >> 3] |= 1 << (p & 7)
+        self._added += 1
+        if self.save_every and self._added % self.save_every == 0:
+            self._save()
+
+    def _save(self):
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(self._header.pack(self._size, self._hashes))
+            f.write(self._bits)
+        os.replace(temp_path, self.path)
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            self._save()
@@ -0,0 +1,102 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import heapq
+from itertools import count
+from typing import Optional
+
+from raccy.core.backends import QueueBackend
+from raccy.core.scheduler import url_domain
+
+
+class Frontier(QueueBackend):
+    """
+    Url frontier backend for ItemUrlQueue: urls with a higher priority are handed out first and
+    hosts take turns among urls of the same priority, so one host with many urls doesn't hold up
+    the others. Each url carries the depth it was found at, urls deeper than max_depth are dropped.
+    Urls of a host are kept in a heap, hosts in a heap ordered by their best priority and last turn.
+    """
+
+    def __init__(self, max_depth: Optional[int] = None, maxsize=0):
+        super().__init__(maxsize)
+        self.max_depth = max_depth
+        self.dropped = 0
+        self._hosts = {}
+        self._turn = {}
+        self._order = []
+        self._turns = count()
+        self._seq = count()
+        self._size = 0
+
+    def put(self, item, block=True, timeout=None, priority: int = 0, depth: int = 0):
+        """
+        Enqueues url with a priority (higher first) and the depth it was found at,
+        returns False if it was dropped for being deeper than max_depth
+        """
+        if self.max_depth is not None and depth > self.max_depth:
+            with self.mutex:
+                self.dropped += 1
+            return False
+        super().put(item, block, timeout, priority=priority, depth=depth)
+        return True
+
+    def current_depth(self) -> int:
+        """
+        Depth of the url the calling thread got last, links found on its page are one level deeper
+        """
+        return getattr(self._local, 'depth', 0)
+
+    def _schedule(self, host):
+        turn = self._turn[host] = next(self._turns)
+        heapq.heappush(self._order, (self._hosts[host][0][0], turn, host))
+
+    def _put(self, item, priority=0, depth=0):
+        host = url_domain(item)
+        urls = self._hosts.get(host)
+        entry = (-priority, next(self._seq), item, depth)
+        if urls is None:
+            self._hosts[host] = [entry]
+            self._schedule(host)
+        else:
+            best = urls[0][0]
+            heapq.heappush(urls, entry)
+            if entry[0] < best:
+                # the host moves up, its old place in the order is skipped once it comes up
+                self._schedule(host)
+        self._size += 1
+
+    def _get(self):
+        while True:
+            _, turn, host = heapq.heappop(self._order)
+            if self._turn.get(host) == turn:
+                break
+        urls = self._hosts[host]
+        _, _, url, depth = heapq.heappop(urls)
+        if urls:
+            self._schedule(host)
+        else:
+            del self._hosts[host], self._turn[host]
+        self._local.depth = depth
+        self._size -= 1
+        return None, url
+
+    def _ack(self, token):
+        pass
+
+    def _qsize(self):
+        return self._size
+
+    def _items(self):
+        return [entry[2] for entry in sorted(entry for urls in self._hosts.values() for entry in urls)]
@@ -0,0 +1,339 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import math
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread, Event
+from time import monotonic
+from typing import Callable, Optional
+
+from ru import logger
+
+from raccy.core.exceptions import ImproperlyConfigured
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return '+Inf'
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metric:
+    """
+    Base class for metrics: a named family of values, one per combination of label values
+    """
+    type: str = None
+
+    def __init__(self, name: str, help: str = ''):
+        self.name = name
+        self.help = help
+        self._lock = Lock()
+        self._values = {}
+
+    def _samples(self):
+        """
+        Yields (name suffix, label pairs, value) tuples
+        """
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield '', key, value
+
+    def expose(self) -> list:
+        """
+        Returns the metric in the Prometheus text format as a list of lines
+        """
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        for suffix, pairs, value in self._samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(pairs)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    """
+    Value that only goes up, eg. the number of pages crawled
+    """
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_key(labels), 0)
+
+    def values(self) -> dict:
+        """
+        Current values keyed by label pairs
+        """
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, eg. the number of running workers. The value can also be
+    computed when the metrics are collected, see set_function.
+    """
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str = ''):
+        super().__init__(name, help)
+        self._functions = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, func: Callable[[], float], **labels):
+        """
+        Reads the value by calling func when the metrics are collected
+        """
+        with self._lock:
+            self._functions[_key(labels)] = func
+
+    def values(self) -> dict:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, func in functions:
+            try:
+                values[key] = func()
+            except Exception:
+                # the value can't be read, eg. qsize of a multiprocessing queue on macOS
+                values.pop(key, None)
+        return values
+
+    def value(self, **labels) -> float:
+        return self.values().get(_key(labels), 0)
+
+    def _samples(self):
+        for key, value in self.values().items():
+            yield '', key, value
+
+
+class Histogram(Metric):
+    """
+    Counts observed values, eg. latencies, in buckets and keeps their count and sum
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str = '', buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(_key(labels))
+        return 0 if state is None else state[2]
+
+    def sum(self, **labels) -> float:
+        state = self._values.get(_key(labels))
+        return 0.0 if state is None else state[1]
+
+    def values(self) -> dict:
+        """
+        (count, sum) pairs keyed by label pairs
+        """
+        with self._lock:
+            return {key: (state[2], state[1]) for key, state in self._values.items()}
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        for key, buckets, total, count in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, math.inf), buckets):
+                cumulative += n
+                yield '_bucket', (*key, ('le', _format_value(bound))), cumulative
+            yield '_sum', key, total
+            yield '_count', key, count
+
+
+class MetricsRegistry:
+    """
+    Holds metrics by name and renders them in the Prometheus text format
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _get_or_create(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            elif type(metric) is not cls:
+                raise ImproperlyConfigured(f"{self.__class__.__name__}: {name} is already a {metric.type}!")
+            return metric
+
+    def counter(self, name: str, help: str = '') -> Counter:
+        return self._get_or_create(Counter, name, help)
+
+    def gauge(self, name: str, help: str = '') -> Gauge:
+        return self._get_or_create(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = '', buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, buckets=buckets)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def expose(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return ''.join(f'{line}\n' for metric in metrics for line in metric.expose())
+
+
+REGISTRY = MetricsRegistry()
+
+
+###############################
+#       RACCY METRICS
+###############################
+ITEMS = REGISTRY.counter('raccy_items_processed_total', 'Items processed by workers, eg. pages parsed or items saved')
+ITEM_ERRORS = REGISTRY.counter('raccy_item_errors_total', 'Items whose processing raised an exception')
+ITEM_SECONDS = REGISTRY.histogram('raccy_item_duration_seconds', 'Time workers spend processing an item')
+ITEMS_SAVED = REGISTRY.counter('raccy_items_saved_total', 'Items saved by database workers')
+DRIVER_ERRORS = REGISTRY.counter('raccy_driver_errors_total', 'Webdriver errors raised in workers')
+DRIVERS_RECYCLED = REGISTRY.counter('raccy_drivers_recycled_total', 'Drivers closed by the driver pool')
+DRIVER_ACQUIRE_SECONDS = REGISTRY.histogram('raccy_driver_acquire_seconds', 'Time spent waiting for a pooled driver')
+WORKERS_RUNNING = REGISTRY.gauge('raccy_workers_running', 'Workers currently running')
+WORKER_ERRORS = REGISTRY.counter('raccy_worker_errors_total', 'Workers that stopped because of an exception')
+QUEUE_PUT = REGISTRY.counter('raccy_queue_put_total', 'Items put in queues')
+QUEUE_GET = REGISTRY.counter('raccy_queue_get_total', 'Items taken from queues')
+QUEUE_DROPPED = REGISTRY.counter('raccy_queue_dropped_total', 'Urls dropped as duplicates by the url filter or by the queue backend')
+QUEUE_SIZE = REGISTRY.gauge('raccy_queue_size', 'Items waiting in queues')
+CACHE_HITS = REGISTRY.counter('raccy_page_cache_hits_total', 'Pages served from the page cache')
+CACHE_MISSES = REGISTRY.counter('raccy_page_cache_misses_total', 'Pages not found in the page cache')
+
+
+###############################
+#       EXPORT
+###############################
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.expose().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int = 9100, host: str = '127.0.0.1', registry: MetricsRegistry = REGISTRY):
+    """
+    Serves the metrics on http://host:port/metrics from a background thread
+    and returns the server, call its shutdown method to stop it
+    """
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name='raccy-metrics', daemon=True).start()
+    return server
+
+
+class MetricsReporter(Thread):
+    """
+    Logs a summary line every interval seconds: items per second, average processing time
+    and errors of each worker class and the size of each queue, read from the raccy metrics
+    of registry, eg.
+    metrics: MyCrawler 12.4/s 0.802s avg 0 errors | MyDatabase 12.1/s 0.003s avg 0 errors | ItemUrlQueue 130 ...
+    """
+    log = logger()
+
+    def __init__(self, interval: float = 60, logger=None, registry: MetricsRegistry = REGISTRY):
+        super().__init__(name='raccy-metrics-reporter', daemon=True)
+        self.interval = interval
+        if logger is not None:
+            self.log = logger
+        self.registry = registry
+        self._stop_event = Event()
+        self._last = self._snapshot()
+
+    def _values(self, metric: Metric) -> dict:
+        metric = self.registry.get(metric.name)
+        return {} if metric is None else metric.values()
+
+    def _snapshot(self):
+        return monotonic(), self._values(ITEMS), self._values(ITEM_SECONDS), self._values(ITEM_ERRORS)
+
+    def summary(self) -> str:
+        """
+        Returns the summary of the period since the previous call
+        """
+        last, self._last = self._last, self._snapshot()
+        now, items, seconds, errors = self._last
+        elapsed = max(now - last[0], 1e-9)
+        parts = []
+        for key in sorted(items):
+            done = items[key] - last[1].get(key, 0)
+            count, total = seconds.get(key, (0, 0.0))
+            last_count, last_total = last[2].get(key, (0, 0.0))
+            avg = (total - last_total) / (count - last_count) if count > last_count else 0.0
+            failed = errors.get(key, 0) - last[3].get(key, 0)
+            parts.append(f'{dict(key)["worker"]} {done / elapsed:.1f}/s {avg:.3f}s avg {failed:g} errors')
+        for key, size in sorted(self._values(QUEUE_SIZE).items()):
+            parts.append(f'{dict(key)["queue"]} {size}')
+        return 'metrics: ' + ' | '.join(parts)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.log.info(self.summary())
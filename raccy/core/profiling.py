@@ -0,0 +1,206 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import cProfile
+import heapq
+import io
+import pstats
+import random
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import count
+from threading import Lock, local
+from time import perf_counter
+from typing import Optional, List
+
+
+class PageRecord:
+    """
+    Time spent on one page: total seconds and seconds per phase ('load', 'wait', 'extract', ...),
+    the rest is the parse code itself. profile holds the cProfile statistics of sampled pages.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.total = 0.0
+        self.phases = defaultdict(float)
+        self.profile: Optional[str] = None
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] += seconds
+
+    @property
+    def breakdown(self) -> dict:
+        """
+        Seconds per phase with the time outside the phases as 'parse'
+        """
+        phases = dict(self.phases)
+        measured = sum(seconds for phase, seconds in phases.items() if phase != 'save')
+        phases['parse'] = max(self.total - measured, 0.0)
+        return phases
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.url} {self.total:.3f}s>'
+
+
+class PageProfiler:
+    """
+    Records where the time of each page goes. Crawler workers time every page parsed and the phases
+    within it: 'load' (driver.get), 'follow' (clicks), 'wait', 'extract' and 'download', database
+    workers add the 'save' time of the item to the page with the same url. The top slowest pages
+    are kept with their breakdown, and cProfile runs on a sample_rate fraction of the pages.
+    Set it on the worker classes to profile, eg. CrawlerWorker.profiler = PageProfiler(sample_rate=0.01).
+    """
+
+    def __init__(self, sample_rate: float = 0.0, top: int = 20, sort: str = 'cumulative', limit: int = 25):
+        self.sample_rate = sample_rate
+        self.top = top
+        self.sort = sort
+        self.limit = limit
+        self.pages = 0
+        self.sampled = 0
+        self.totals = defaultdict(float)
+        self._slowest = []
+        self._records = {}
+        self._seq = count()
+        self._stats = None
+        self._local = local()
+        self._lock = Lock()
+
+    def _start_profile(self) -> Optional[cProfile.Profile]:
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is active in this thread
+            return None
+        return profile
+
+    @contextmanager
+    def page(self, url: str):
+        """
+        Times the page at url, phases entered in this thread meanwhile are added to it
+        """
+        record = PageRecord(url)
+        previous, self._local.record = getattr(self._local, 'record', None), record
+        profile = self._start_profile()
+        start = perf_counter()
+        try:
+            yield record
+        finally:
+            record.total = perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            self._local.record = previous
+            self._add(record, profile)
+
+    @contextmanager
+    def phase(self, name: str, url: Optional[str] = None):
+        """
+        Times a phase of the page of this thread, or of the kept page at url (eg. the save of its item).
+        Phases entered within a phase count as the outer one.
+        """
+        if getattr(self._local, 'phase', None) is not None:
+            yield
+            return
+        self._local.phase = name
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            self._local.phase = None
+            record = getattr(self._local, 'record', None)
+            with self._lock:
+                self.totals[name] += elapsed
+                if record is None and url is not None:
+                    record = self._records.get(url)
+                if record is not None:
+                    record.add(name, elapsed)
+
+    def _add(self, record: PageRecord, profile: Optional[cProfile.Profile]):
+        stats = None
+        if profile is not None:
+            stats = pstats.Stats(profile)
+        with self._lock:
+            self.pages += 1
+            if stats is not None:
+                self.sampled += 1
+                if self._stats is None:
+                    self._stats = stats
+                else:
+                    self._stats.add(stats)
+            entry = (record.total, next(self._seq), record)
+            if len(self._slowest) < self.top:
+                heapq.heappush(self._slowest, entry)
+            elif record.total > self._slowest[0][0]:
+                _, _, dropped = heapq.heapreplace(self._slowest, entry)
+                self._records.pop(dropped.url, None)
+            else:
+                return
+            self._records[record.url] = record
+        if stats is not None:
+            record.profile = self._format(pstats.Stats(profile), limit=10)
+
+    def _format(self, stats: pstats.Stats, limit: int) -> str:
+        # strip_dirs and sort_stats change the stats in place, a copy is formatted so stats keeps adding up
+        stream = io.StringIO()
+        copy = pstats.Stats(stream=stream)
+        copy.add(stats)
+        copy.strip_dirs().sort_stats(self.sort).print_stats(limit)
+        return stream.getvalue().strip()
+
+    def slowest(self) -> List[PageRecord]:
+        """
+        The kept pages, slowest first
+        """
+        with self._lock:
+            return [record for _, _, record in sorted(self._slowest, reverse=True)]
+
+    def report(self, path: Optional[str] = None) -> str:
+        """
+        Returns the report of the slowest pages, the time per phase over all pages and the statistics
+        of the sampled pages, and writes it to path if given
+        """
+        with self._lock:
+            totals = dict(self.totals)
+            pages, sampled = self.pages, self.sampled
+            profile = None if self._stats is None else self._format(self._stats, self.limit)
+        lines = [f'raccy page profile: {pages} pages, {sampled} profiled']
+        measured = sum(totals.values()) or 1
+        lines.append('time by phase: ' + ' | '.join(
+            f'{phase} {seconds:.3f}s ({seconds / measured:.0%})'
+            for phase, seconds in sorted(totals.items(), key=lambda item: -item[1])
+        ))
+        lines.append('')
+        lines.append('slowest pages:')
+        for record in self.slowest():
+            phases = ' '.join(
+                f'{phase} {seconds:.3f}s' for phase, seconds in sorted(record.breakdown.items(), key=lambda item: -item[1])
+            )
+            lines.append(f'{record.total:8.3f}s {record.url} {phases}')
+            if record.profile:
+                lines.extend(f'          {line}'.rstrip() for line in record.profile.splitlines())
+        if profile is not None:
+            lines.append('')
+            lines.append(f'profile of the sampled pages ({self.sort}):')
+            lines.append(profile)
+        text = '\n'.join(lines) + '\n'
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return text
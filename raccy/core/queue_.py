@@ -13,29 +13,118 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import asyncio
 from queue import Queue
+from threading import Lock
+from typing import Optional
 
 from raccy.core.meta import SingletonMeta
 from raccy.core.exceptions import QueueError
+from raccy.core.filters import BaseUrlFilter, canonicalize_url
+from raccy.core.signals import Signal
+from raccy.core.metrics import QUEUE_PUT, QUEUE_GET, QUEUE_DROPPED, QUEUE_SIZE
+
+high_watermark = Signal()
+low_watermark = Signal()
 
 
 class BaseQueue(metaclass=SingletonMeta):
     """
     Base Scheduler class: It restricts objects instances to only one instance.
+    Spiders get their own named instances, see named.
     """
-
-    def __init__(self, maxsize=0):
-        self.__queue = Queue(maxsize=maxsize)
+    _named = {}
+    _named_lock = Lock()
+
+    def __init__(self, maxsize=0, queue=None, name: Optional[str] = None):
+        self.__queue = Queue(maxsize=maxsize) if queue is None else queue
+        self._name = self.__class__.__name__ if name is None else f'{self.__class__.__name__}[{name}]'
+        self._high = self._low = None
+        self._above = False
+        self._watermark_lock = Lock()
+        QUEUE_SIZE.set_function(self.qsize, queue=self._name)
+
+    @classmethod
+    def named(cls, name: str):
+        """
+        Returns the queue named name, eg. the queue of a spider, created on first use.
+        Named queues are separate from the singleton and from each other.
+        """
+        with cls._named_lock:
+            queue = cls._named.get((cls, name))
+            if queue is None:
+                # type.__call__ bypasses SingletonMeta
+                queue = cls._named[(cls, name)] = type.__call__(cls, name=name)
+            return queue
 
     @property
     def get_queue(self):
         return self.__queue
 
+    def set_queue(self, queue):
+        """
+        Replaces the underlying queue, eg. with a disk backed raccy.core.backends.SQLiteQueue.
+        It should be called before any worker is started, items in the old queue are not moved.
+        """
+        self.__queue = queue
+
+    def set_maxsize(self, maxsize: int):
+        """
+        Bounds the queue to maxsize items, 0 means unbounded. put blocks while the queue is full,
+        or raises queue.Full when called with block=False or once its timeout has passed.
+        """
+        queue = self.__queue
+        try:
+            not_full = queue.not_full
+        except AttributeError:
+            raise QueueError(f"{self.__class__.__name__}: {queue.__class__.__name__} can't be resized!")
+        with not_full:
+            queue.maxsize = maxsize
+            not_full.notify_all()
+
+    def set_watermarks(self, high: Optional[int], low: Optional[int] = None):
+        """
+        Notifies the high_watermark signal when the queue grows to high items and the low_watermark signal
+        when it has shrunk back to low items (by default half of high). Dispatches registered for this queue
+        are called with the queue and its size. None disables the signals.
+        """
+        self._high = high
+        self._low = None if high is None else (high // 2 if low is None else low)
+        self._above = False
+
+    def register_signal(self, signal):
+        """
+        Lets queues be used as senders with raccy.core.signals.receiver
+        """
+
+    def _check_watermarks(self):
+        with self._watermark_lock:
+            size = self.qsize()
+            if not self._above and size >= self._high:
+                self._above, signal = True, high_watermark
+            elif self._above and size <= self._low:
+                self._above, signal = False, low_watermark
+            else:
+                return
+        if self in signal.dispatchers:
+            signal.notify(self, self, size)
+
     def put(self, item, *args, **kwargs):
-        self.__queue.put(item, *args, **kwargs)
+        result = self.__queue.put(item, *args, **kwargs)
+        if result is False:
+            QUEUE_DROPPED.inc(queue=self._name)
+            return result
+        QUEUE_PUT.inc(queue=self._name)
+        if self._high is not None and not self._above:
+            self._check_watermarks()
+        return result
 
     def get(self, *args, **kwargs):
-        return self.__queue.get(*args, **kwargs)
+        item = self.__queue.get(*args, **kwargs)
+        QUEUE_GET.inc(queue=self._name)
+        if self._above:
+            self._check_watermarks()
+        return item
 
     def qsize(self):
         return self.__queue.qsize()
@@ -70,3 +159,60 @@ class ItemUrlQueue(BaseQueue):
     Receives item urls from UrlDownloaderWorker and enqueues them
     for feeding them to CrawlerWorker
     """
+    url_filter: Optional[BaseUrlFilter] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = set()
+        self._pending_lock = Lock()
+
+    def set_filter(self, url_filter: Optional[BaseUrlFilter]):
+        """
+        Sets the filter used to drop urls that were already enqueued, None disables filtering
+        """
+        self.url_filter = url_filter
+
+    def put(self, item, *args, **kwargs) -> bool:
+        """
+        Enqueues item, returns False if it was dropped as a duplicate (or by the backend,
+        eg. for being too deep). Keyword arguments such as priority and depth are passed to
+        the backend, see raccy.core.frontier.Frontier.
+        """
+        url_filter = self.url_filter
+        if url_filter is None:
+            return super().put(item, *args, **kwargs) is not False
+        # the url is remembered once the backend has taken it, so a put that raises queue.Full or that
+        # the backend refuses (a Frontier drops urls deeper than max_depth) can be retried later,
+        # meanwhile concurrent puts of the same url are dropped as duplicates
+        key = canonicalize_url(item)
+        with self._pending_lock:
+            if key in self._pending or url_filter.contains(item):
+                QUEUE_DROPPED.inc(queue=self._name)
+                return False
+            self._pending.add(key)
+        try:
+            result = super().put(item, *args, **kwargs)
+            if result is not False:
+                url_filter.add(item)
+        finally:
+            with self._pending_lock:
+                self._pending.discard(key)
+        return result is not False
+
+    def current_depth(self) -> int:
+        """
+        Depth of the url the calling thread got last if the backend tracks depths, otherwise 0
+        """
+        current_depth = getattr(self.get_queue, 'current_depth', None)
+        return 0 if current_depth is None else current_depth()
+
+
+class AsyncDatabaseQueue(asyncio.Queue):
+    """
+    asyncio counterpart of DatabaseQueue used by the asyncio engine
+    """
+
+    def put_nowait(self, item):
+        if not isinstance(item, dict):
+            raise QueueError(f"{self.__class__.__name__} accepts only dictionary values!")
+        super().put_nowait(item)
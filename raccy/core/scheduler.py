@@ -0,0 +1,148 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from collections import deque, defaultdict
+from time import monotonic
+from typing import Optional
+from urllib.parse import urlsplit
+
+from raccy.core.backends import QueueBackend
+
+
+def url_domain(url: str) -> str:
+    return (urlsplit(url).hostname or '').lower()
+
+
+class TokenBucket:
+    """
+    Allows rate events per second on average with bursts of up to burst events
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = monotonic()
+
+    def _refill(self, now):
+        if now > self._last:
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+    def wait_time(self, now: float) -> float:
+        """
+        Seconds until an event is allowed, 0 if it is allowed now
+        """
+        self._refill(now)
+        return 0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+
+class DomainScheduler(QueueBackend):
+    """
+    Politeness queue backend for ItemUrlQueue: limits the number of urls of a domain being
+    crawled at the same time (concurrency) and how often urls of a domain are handed out
+    (rate per second, with bursts of up to burst urls). Instead of sleeping, get hands out
+    the next url whose domain is eligible, domains are served in round robin order.
+    A domain's slot is freed when the worker calls task_done.
+    """
+
+    def __init__(self, rate: float = 1, burst: int = 1, concurrency: int = 1, maxsize=0):
+        super().__init__(maxsize)
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self._limits = {}
+        self._urls = defaultdict(deque)
+        self._buckets = {}
+        self._active = defaultdict(int)
+        self._order = deque()
+        self._next = None
+        self._size = 0
+
+    def set_limit(
+            self,
+            domain: str,
+            rate: Optional[float] = None,
+            burst: Optional[int] = None,
+            concurrency: Optional[int] = None
+    ):
+        """
+        Overrides the default limits for domain
+        """
+        with self.mutex:
+            limits = self._limits.setdefault(domain.lower(), {})
+            for key, value in dict(rate=rate, burst=burst, concurrency=concurrency).items():
+                if value is not None:
+                    limits[key] = value
+            self._buckets.pop(domain.lower(), None)
+
+    def _limit(self, domain, key):
+        return self._limits.get(domain, {}).get(key, getattr(self, key))
+
+    def _bucket(self, domain) -> TokenBucket:
+        try:
+            return self._buckets[domain]
+        except KeyError:
+            bucket = self._buckets[domain] = TokenBucket(self._limit(domain, 'rate'), self._limit(domain, 'burst'))
+            return bucket
+
+    def _wait_time(self):
+        now = monotonic()
+        wait = None
+        for domain in self._order:
+            if self._active[domain] >= self._limit(domain, 'concurrency'):
+                continue
+            domain_wait = self._bucket(domain).wait_time(now)
+            if domain_wait == 0:
+                self._next = domain
+                return 0
+            wait = domain_wait if wait is None else min(wait, domain_wait)
+        return wait
+
+    def _put(self, item, **kwargs):
+        domain = url_domain(item)
+        urls = self._urls[domain]
+        if not urls:
+            self._order.append(domain)
+        urls.append(item)
+        self._size += 1
+
+    def _get(self):
+        domain = self._next
+        self._next = None
+        urls = self._urls[domain]
+        url = urls.popleft()
+        self._order.remove(domain)
+        if urls:
+            self._order.append(domain)
+        else:
+            del self._urls[domain]
+        self._bucket(domain).consume(monotonic())
+        self._active[domain] += 1
+        self._size -= 1
+        return domain, url
+
+    def _ack(self, token):
+        self._active[token] -= 1
+
+    def _qsize(self):
+        return self._size
+
+    def _items(self):
+        return [url for domain in self._order for url in self._urls[domain]]
@@ -13,13 +13,52 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import inspect
+import weakref
+from collections import defaultdict
+from concurrent.futures import Executor, ThreadPoolExecutor, wait
+from threading import Lock, Timer
+from typing import Optional
+
+from ru import logger
+
 from .exceptions import SignalException
 
 
-def receiver(signal, sender):
+class _Any:
+
+    def __repr__(self):
+        return 'ANY'
+
+
+# sender of dispatches that receive the notifications of every sender
+ANY = _Any()
+
+_executor = None
+_executor_lock = Lock()
+
+
+def default_executor() -> ThreadPoolExecutor:
+    """
+    Executor shared by asynchronous signals, its single thread calls the receivers in notification order
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='raccy-signals')
+        return _executor
+
+
+def receiver(signal, sender=ANY, weak=False):
+    """
+    Registers the decorated function as a dispatch of signal for sender (any sender by default)
+    and returns it. With weak=True the signal only keeps a weak reference to the function.
+    """
     def _decorator(dispatch):
-        signal.register_dispatch(sender, dispatch)
-        sender.register_signal(signal)
+        signal.register_dispatch(sender, dispatch, weak=weak)
+        if not isinstance(sender, type) and hasattr(sender, 'register_signal'):
+            sender.register_signal(signal)
+        return dispatch
 
     return _decorator
 
@@ -36,31 +75,168 @@ def execute_or_debug(func):
 
 class Signal:
     """
-    Base class for all signals
+    Base class for all signals. By default receivers are called in the notifying thread.
+    asynchronous: receivers are called on executor (by default a shared single thread executor),
+                  so a slow receiver doesn't hold up the notifying worker
+    batch_size, batch_interval: notifications are collected and receivers are called with a list of the
+                  argument tuples once batch_size notifications are collected or batch_interval seconds
+                  after the first one, whichever comes first
     """
-
-    def __init__(self):
+    log = logger()
+
+    def __init__(
+            self,
+            asynchronous: bool = False,
+            executor: Optional[Executor] = None,
+            batch_size: Optional[int] = None,
+            batch_interval: Optional[float] = None
+    ):
+        self.executor = executor if executor is not None or not asynchronous else default_executor()
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
         self._dispatchers = {}
+        self._lock = Lock()
+        self._batches = defaultdict(list)
+        self._timer = None
+        self._pending = set()
 
     @property
-    def dispatchers(self):
-        return self._dispatchers
+    def dispatchers(self) -> dict:
+        """
+        Live dispatches keyed by sender
+        """
+        with self._lock:
+            items = [(sender, list(refs)) for sender, refs in self._dispatchers.items()]
+        dispatchers = {}
+        for sender, refs in items:
+            dispatches = [dispatch for dispatch in (ref() for ref in refs) if dispatch is not None]
+            if dispatches:
+                dispatchers[sender] = dispatches
+        return dispatchers
+
+    def register_dispatch(self, sender, dispatch, weak=False):
+        if not weak:
+            ref = lambda: dispatch  # noqa: E731
+        else:
+            ref_type = weakref.WeakMethod if inspect.ismethod(dispatch) else weakref.ref
+            ref = ref_type(dispatch, lambda dead: self._discard(sender, dead))
+        with self._lock:
+            self._dispatchers.setdefault(sender, []).append(ref)
+
+    def _discard(self, sender, ref):
+        with self._lock:
+            refs = self._dispatchers.get(sender, [])
+            if ref in refs:
+                refs.remove(ref)
+            if not refs:
+                self._dispatchers.pop(sender, None)
 
-    def register_dispatch(self, sender, dispatch):
-        try:
-            self._dispatchers[sender].append(dispatch)
-        except KeyError:
-            self._dispatchers[sender] = [dispatch]
+    @execute_or_debug
+    def remove_dispatch(self, sender, dispatch):
+        with self._lock:
+            refs = self._dispatchers[sender]
+            for ref in refs:
+                if ref() == dispatch:
+                    refs.remove(ref)
+                    break
+            else:
+                raise ValueError(f"{dispatch} is not a dispatch of {sender}")
+            if not refs:
+                del self._dispatchers[sender]
+
+    def _receivers(self, sender) -> list:
+        refs = [*self._dispatchers.get(sender, ()), *self._dispatchers.get(ANY, ())]
+        return [dispatch for dispatch in (ref() for ref in refs) if dispatch is not None]
 
+    @execute_or_debug
     def notify(self, sender, *args, **kwargs):
+        """
+        Notifies the receivers of sender, raises SignalException if there are none
+        """
+        if sender not in self._dispatchers and ANY not in self._dispatchers:
+            raise KeyError(sender)
         self._dispatch(sender, *args, **kwargs)
 
-    @execute_or_debug
+    def send(self, sender, *args, **kwargs):
+        """
+        Notifies the receivers of sender if there are any, it is cheap when nobody listens
+        """
+        if self._dispatchers:
+            self._dispatch(sender, *args, **kwargs)
+
     def _dispatch(self, sender, *args, **kwargs):
-        dispatchers = self._dispatchers[sender]
-        for dispatch in dispatchers:
+        if self.batch_size is None and self.batch_interval is None:
+            return self._deliver(self._receivers(sender), args, kwargs)
+        if kwargs:
+            raise SignalException(f"{self.__class__.__name__}: batched signals take positional arguments only")
+        with self._lock:
+            batch = self._batches[sender]
+            batch.append(args)
+            if self.batch_size is not None and len(batch) >= self.batch_size:
+                del self._batches[sender]
+            else:
+                batch = None
+                if self.batch_interval is not None and self._timer is None:
+                    self._timer = Timer(self.batch_interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch is not None:
+            self._deliver(self._receivers(sender), (batch,), {})
+
+    def flush(self):
+        """
+        Delivers the notifications collected by a batched signal
+        """
+        with self._lock:
+            batches, self._batches = self._batches, defaultdict(list)
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        for sender, batch in batches.items():
+            self._deliver(self._receivers(sender), (batch,), {})
+
+    def _deliver(self, dispatches, args, kwargs):
+        if self.executor is None:
+            for dispatch in dispatches:
+                dispatch(*args, **kwargs)
+            return
+        for dispatch in dispatches:
+            future = self.executor.submit(self._call, dispatch, args, kwargs)
+            with self._lock:
+                self._pending.add(future)
+            future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _call(self, dispatch, args, kwargs):
+        try:
             dispatch(*args, **kwargs)
-
-    @execute_or_debug
-    def remove_dispatch(self, sender, dispatch):
-        self._dispatchers[sender].remove(dispatch)
+        except Exception as e:
+            self.handle_error(dispatch, e)
+
+    def handle_error(self, dispatch, error: Exception):
+        """
+        Called with the exceptions raised by receivers called on the executor, logs them by default
+        """
+        self.log.error(f'{self.__class__.__name__}: receiver {dispatch!r} failed', exc_info=error)
+
+    def join(self, timeout: Optional[float] = None):
+        """
+        Flushes the collected notifications and waits until the receivers called on the executor are done
+        """
+        self.flush()
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending, timeout)
+
+
+###############################
+#       LIFECYCLE SIGNALS
+###############################
+# sent by the workers with their class as sender, receivers run on the shared signals executor
+page_fetched = Signal(asynchronous=True)  # (worker, url) when a crawler worker has loaded a page
+item_scraped = Signal(asynchronous=True)  # (worker, item) when a crawler worker puts an item in its db_queue
+item_saved = Signal(asynchronous=True)  # (worker, item) when a database worker has saved an item
+worker_error = Signal(asynchronous=True)  # (worker, exception) when a worker fails on an item or stops on an exception
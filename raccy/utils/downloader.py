@@ -0,0 +1,140 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import tempfile
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, Future
+from time import sleep
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ChunkedEncodingError
+from urllib3.util.retry import Retry
+
+from .files import get_filename
+
+
+class Downloader:
+    """
+    Downloads files through a shared requests session whose keep-alive connections are pooled per host.
+    Responses are streamed in chunks to a temporary file next to the destination, which is renamed
+    into place once complete, so a partial file is never left under the final name.
+    Connection errors and 429/5xx responses are retried with exponential backoff.
+    Downloads can also run in the background on a pool of workers threads, see submit.
+    """
+
+    def __init__(
+            self,
+            pool_connections: int = 10,
+            pool_maxsize: int = 10,
+            retries: int = 3,
+            backoff_factor: float = 0.5,
+            timeout: Optional[float] = 30,
+            chunk_size: int = 64 * 1024,
+            headers: Optional[dict] = None,
+            workers: Optional[int] = None
+    ):
+        self.workers = workers or pool_maxsize
+        self._executor = None
+        self._executor_lock = Lock()
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def download(self, url: str, save_path: str, mutex=None) -> str:
+        """
+        Downloads url into the save_path directory and returns the file path
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return self._download(url, save_path, mutex)
+            except ChunkedEncodingError:
+                if attempt == self.retries:
+                    raise
+                sleep(self.backoff_factor * 2 ** attempt)
+
+    def submit(self, url: str, save_path: str, mutex=None) -> Future:
+        """
+        Queues url for download in the background, the returned future resolves to the file path
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='raccy-download')
+        return self._executor.submit(self.download, url, save_path, mutex)
+
+    def _download(self, url, save_path, mutex):
+        with self.session.get(url, stream=True, allow_redirects=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            fd, temp_path = tempfile.mkstemp(prefix='.', suffix='.part', dir=save_path)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        f.write(chunk)
+                path = get_filename(response.url, save_path, mutex)
+                os.replace(temp_path, path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        return path
+
+    def close(self):
+        """
+        Waits for background downloads to finish and closes the session
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+_downloader: Optional[Downloader] = None
+_downloader_lock = Lock()
+
+
+def get_downloader() -> Downloader:
+    """
+    Returns the Downloader shared by all workers, it is created on first use
+    """
+    global _downloader
+    if _downloader is None:
+        with _downloader_lock:
+            if _downloader is None:
+                _downloader = Downloader()
+    return _downloader
+
+
+def set_downloader(downloader: Downloader) -> None:
+    """
+    Replaces the Downloader shared by all workers, eg. to change pool sizes or retries
+    """
+    global _downloader
+    with _downloader_lock:
+        _downloader = downloader
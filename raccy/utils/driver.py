@@ -14,7 +14,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 from urllib.parse import urljoin
-from typing import Callable, Optional
+from typing import Callable, Optional, Dict, List, Union, Tuple
 from logging import Logger
 
 from selenium.common.exceptions import (
@@ -23,11 +23,45 @@ from selenium.common.exceptions import (
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.remote.webelement import WebElement
 
 from .utils import check_has_attr
 
 Driver = WebDriver
+Fields = Dict[str, Union[str, None, Tuple[Optional[str], str]]]
+
+EXTRACT_SCRIPT = """
+var rowsXpath = arguments[0], fields = arguments[1], results = [];
+
+function first(xpath, context) {
+    return document.evaluate(xpath, context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+
+function value(node, attr) {
+    if (node === null) return null;
+    if (!attr) return (node.innerText !== undefined ? node.innerText : node.textContent).trim();
+    var prop = node[attr];
+    if (prop !== undefined && prop !== null && typeof prop !== 'object' && typeof prop !== 'function') return prop;
+    return node.getAttribute ? node.getAttribute(attr) : null;
+}
+
+var rows = [document.documentElement];
+if (rowsXpath) {
+    var snapshot = document.evaluate(rowsXpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    rows = [];
+    for (var i = 0; i < snapshot.snapshotLength; i++) rows.push(snapshot.snapshotItem(i));
+}
+for (var i = 0; i < rows.length; i++) {
+    var data = {};
+    for (var j = 0; j < fields.length; j++) {
+        var node = fields[j][1] ? first(fields[j][1], rows[i]) : rows[i];
+        data[fields[j][0]] = value(node, fields[j][2]);
+    }
+    results.push(data);
+}
+return results;
+"""
 
 
 def scroll_into_view(driver: Driver, element: WebElement):
@@ -46,6 +80,7 @@ def driver_wait(
         action: Optional[str] = None
 ) -> None:
     wait = WebDriverWait(driver=driver, timeout=secs)
+    condition = EC.presence_of_element_located if condition is None else condition
     until = wait.until(condition((By.XPATH, xpath)))
     if action:
         check_has_attr(until, action)
@@ -70,6 +105,25 @@ def follow(
     callback(*cargs, **ckwargs)
 
 
+def _normalize_fields(fields: Fields) -> list:
+    normalized = []
+    for name, spec in fields.items():
+        xpath, attr = spec if isinstance(spec, tuple) else (spec, None)
+        normalized.append([name, xpath, attr])
+    return normalized
+
+
+def extract(driver: Driver, fields: Fields, rows: Optional[str] = None) -> List[dict]:
+    """
+    Extracts data from the current page in a single webdriver round trip.
+    fields maps each key to an xpath relative to the row, or an (xpath, attribute) tuple to read an
+    attribute instead of the text, an xpath of None selects the row itself. If rows (an xpath) is given,
+    a dict is returned for each matching row, otherwise the root (html) element of the page is the one row.
+    Missing elements give None values.
+    """
+    return driver.execute_script(EXTRACT_SCRIPT, rows, _normalize_fields(fields))
+
+
 def btn_click_handler(driver: Driver, xpath: str) -> None:
     try:
         btn = driver.find_element_by_xpath(xpath)
@@ -0,0 +1,60 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+from itertools import count
+from urllib.parse import urlparse
+
+DEFAULT_FILENAME = 'download'
+
+# next suffix to try for each (directory, filename) pair that had a name collision
+_counters = {}
+
+
+def _get_filepath(filename, save_path):
+    return os.path.join(save_path, filename)
+
+
+def _reserve(filepath):
+    try:
+        os.close(os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _get_filename(url, save_path):
+    fn = os.path.basename(urlparse(url).path) or DEFAULT_FILENAME
+    fp = _get_filepath(fn, save_path)
+    if _reserve(fp):
+        return fp
+    name, ext = os.path.splitext(fn)
+    counter = _counters.setdefault((save_path, fn), count(1))
+    while True:
+        fp = _get_filepath(f"{name}({next(counter)}){ext}", save_path)
+        if _reserve(fp):
+            return fp
+
+
+def get_filename(url, path, mutex=None):
+    """
+    Returns a unique path in the path directory for the file at url: name.ext, name(1).ext, name(2).ext...
+    The file is created empty (O_EXCL) to reserve the name, so no lock is needed between threads.
+    Suffix counters are kept per directory and name, so repeated names don't probe every taken suffix.
+    """
+    if mutex is None:
+        return _get_filename(url, path)
+    with mutex:
+        return _get_filename(url, path)
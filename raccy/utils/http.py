@@ -0,0 +1,203 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import re
+from typing import Optional, List
+from urllib.parse import urljoin
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.common.by import By
+
+from raccy.core.exceptions import ImproperlyConfigured, CrawlerException
+from .downloader import get_downloader
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+URL_ATTRIBUTES = ('href', 'src', 'action')
+
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def _decode(response) -> str:
+    """
+    Decodes a response body using the charset of the content-type header,
+    then the html meta charset, falling back to utf-8
+    """
+    encoding = None
+    if 'charset' in response.headers.get('content-type', '').lower():
+        encoding = response.encoding
+    else:
+        match = META_CHARSET.search(response.content[:4096])
+        if match:
+            encoding = match.group(1).decode('ascii')
+    try:
+        return response.content.decode(encoding or 'utf-8', 'replace')
+    except LookupError:
+        return response.content.decode('utf-8', 'replace')
+
+
+def _to_xpath(by: str, value: str) -> str:
+    if by == By.XPATH:
+        return value
+    if by == By.ID:
+        return f".//*[@id='{value}']"
+    if by == By.NAME:
+        return f".//*[@name='{value}']"
+    if by == By.TAG_NAME:
+        return f".//{value}"
+    if by == By.CLASS_NAME:
+        return f".//*[contains(concat(' ', normalize-space(@class), ' '), ' {value} ')]"
+    raise CrawlerException(f"Locator strategy '{by}' is not supported without a browser!")
+
+
+class _Searchable:
+    """
+    Selenium like element lookups over an lxml node
+    """
+    _node = None
+    _base_url = None
+
+    def _wrap(self, nodes) -> List['HtmlElement']:
+        return [HtmlElement(node, self._base_url) for node in nodes if isinstance(node, lxml.html.HtmlElement)]
+
+    def find_elements(self, by: str = By.ID, value: Optional[str] = None) -> List['HtmlElement']:
+        return self._wrap(self._node.xpath(_to_xpath(by, value)))
+
+    def find_element(self, by: str = By.ID, value: Optional[str] = None) -> 'HtmlElement':
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"Unable to locate element: {value}")
+        return elements[0]
+
+    def find_elements_by_xpath(self, xpath: str) -> List['HtmlElement']:
+        return self.find_elements(By.XPATH, xpath)
+
+    def find_element_by_xpath(self, xpath: str) -> 'HtmlElement':
+        return self.find_element(By.XPATH, xpath)
+
+
+class HtmlElement(_Searchable):
+    """
+    Parsed html element with the read-only parts of selenium's WebElement api
+    """
+
+    def __init__(self, node, base_url: Optional[str] = None):
+        self._node = node
+        self._base_url = base_url
+
+    @property
+    def tag_name(self) -> str:
+        return self._node.tag
+
+    @property
+    def text(self) -> str:
+        return self._node.text_content().strip()
+
+    def get_attribute(self, name: str) -> Optional[str]:
+        if name == 'textContent':
+            return self._node.text_content()
+        if name in ('innerHTML', 'outerHTML'):
+            html = lxml.html.tostring(self._node, encoding='unicode')
+            if name == 'outerHTML':
+                return html
+            return (self._node.text or '') + ''.join(lxml.html.tostring(c, encoding='unicode') for c in self._node)
+        value = self._node.get(name)
+        if value is not None and name in URL_ATTRIBUTES and self._base_url:
+            return urljoin(self._base_url, value)
+        return value
+
+    def is_displayed(self) -> bool:
+        return True
+
+
+class HttpDriver(_Searchable):
+    """
+    Browserless stand-in for a selenium webdriver: get fetches pages over the shared pooled
+    requests session and the html is parsed with lxml, so parse methods written against
+    selenium's find_element(s)_by_xpath work unchanged on static pages
+    """
+
+    def __init__(self, session=None, timeout: Optional[float] = None):
+        if lxml is None:
+            raise ImproperlyConfigured(f"{self.__class__.__name__} requires lxml: pip install lxml")
+        downloader = get_downloader()
+        self.session = downloader.session if session is None else session
+        self.timeout = downloader.timeout if timeout is None else timeout
+        self.current_url = None
+        self.page_source = ''
+        self.status_code = None
+        self._node = lxml.html.fromstring('<html></html>')
+
+    def get(self, url: str) -> None:
+        """
+        Fetches and parses url, raises requests.HTTPError if the server answers with an error status
+        (the page is loaded all the same, see status_code)
+        """
+        response = self.session.get(url, timeout=self.timeout)
+        self.load(response.url, _decode(response))
+        self.status_code = response.status_code
+        response.raise_for_status()
+
+    def load(self, url: str, html: str) -> None:
+        """
+        Parses html as the page at url
+        """
+        self.current_url = self._base_url = url
+        self.page_source = html
+        try:
+            self._node = lxml.html.fromstring(html or '<html></html>', base_url=url)
+        except ValueError:
+            self._node = lxml.html.fromstring(html.encode('utf-8'), base_url=url)
+
+    @property
+    def title(self) -> str:
+        titles = self._node.xpath('//title')
+        return titles[0].text_content().strip() if titles else ''
+
+    def extract(self, fields: dict, rows: Optional[str] = None) -> List[dict]:
+        """
+        Same as raccy.utils.driver.extract, evaluated with lxml
+        """
+        results = []
+        for row in (self._node.xpath(rows) if rows else [self._node]):
+            data = {}
+            for name, spec in fields.items():
+                xpath, attr = spec if isinstance(spec, tuple) else (spec, None)
+                nodes = row.xpath(xpath) if xpath else [row]
+                nodes = [n for n in nodes if isinstance(n, lxml.html.HtmlElement)]
+                if not nodes:
+                    data[name] = None
+                elif attr:
+                    data[name] = HtmlElement(nodes[0], self._base_url).get_attribute(attr)
+                else:
+                    data[name] = nodes[0].text_content().strip()
+            results.append(data)
+        return results
+
+    def wait(self, xpath: str) -> None:
+        if not self._node.xpath(xpath):
+            raise TimeoutException(f"Element {xpath} is not on the page")
+
+    def execute_script(self, script, *args):
+        raise CrawlerException(f"{self.__class__.__name__} can't execute javascript!")
+
+    def quit(self) -> None:
+        pass
+
+    close = quit
@@ -0,0 +1,137 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import re
+from typing import Iterable, Optional, List
+
+from selenium.webdriver import ChromeOptions, FirefoxOptions
+from selenium.common.exceptions import WebDriverException
+
+from raccy.core.exceptions import ImproperlyConfigured
+
+
+def _extensions(*extensions: str) -> tuple:
+    # a url with a query string (eg. logo.png?v=3) doesn't end with its extension
+    return tuple(pattern for ext in extensions for pattern in (f'*.{ext}', f'*.{ext}?*'))
+
+
+RESOURCE_PATTERNS = {
+    'image': _extensions('png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp'),
+    'stylesheet': _extensions('css'),
+    'font': _extensions('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'media': _extensions('mp4', 'webm', 'ogg', 'mp3', 'wav', 'm3u8'),
+}
+TRACKER_PATTERNS = (
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*googlesyndication.com*',
+    '*doubleclick.net*',
+    '*connect.facebook.net*',
+    '*hotjar.com*',
+    '*scorecardresearch.com*',
+    '*criteo.com*',
+    '*taboola.com*',
+    '*outbrain.com*',
+)
+PAGE_LOAD_STRATEGIES = ('normal', 'eager', 'none')
+
+
+class ResourceProfile:
+    """
+    Describes the resources crawler browsers should not load.
+    block: resource types to block, keys of RESOURCE_PATTERNS
+    patterns: additional url patterns to block, * matches any characters
+    trackers: blocks common analytics and advertising hosts (TRACKER_PATTERNS)
+    page_load_strategy: 'normal' waits for the load event, 'eager' for DOMContentLoaded and 'none'
+                        returns as soon as the navigation starts, see BaseCrawlerWorker.ready_xpath
+    """
+
+    def __init__(
+            self,
+            block: Iterable[str] = (),
+            patterns: Iterable[str] = (),
+            trackers: bool = False,
+            page_load_strategy: str = 'normal'
+    ):
+        self.block = tuple(block)
+        for resource in self.block:
+            if resource not in RESOURCE_PATTERNS:
+                raise ImproperlyConfigured(
+                    f"{self.__class__.__name__}: unknown resource type {resource}, use one of {tuple(RESOURCE_PATTERNS)}"
+                )
+        if page_load_strategy not in PAGE_LOAD_STRATEGIES:
+            raise ImproperlyConfigured(
+                f"{self.__class__.__name__}: unknown page load strategy {page_load_strategy}, "
+                f"use one of {PAGE_LOAD_STRATEGIES}"
+            )
+        self.patterns = tuple(patterns)
+        self.trackers = trackers
+        self.page_load_strategy = page_load_strategy
+
+    @property
+    def blocked_urls(self) -> List[str]:
+        urls = [pattern for resource in self.block for pattern in RESOURCE_PATTERNS[resource]]
+        urls.extend(self.patterns)
+        if self.trackers:
+            urls.extend(TRACKER_PATTERNS)
+        return urls
+
+    def blocks(self, url: str) -> bool:
+        """
+        Returns True if url matches one of blocked_urls, * matching any characters as in Network.setBlockedURLs
+        """
+        return any(
+            re.fullmatch('.*'.join(map(re.escape, pattern.split('*'))), url, re.DOTALL) for pattern in self.blocked_urls
+        )
+
+    def chrome_options(self, options: Optional[ChromeOptions] = None) -> ChromeOptions:
+        """
+        Returns options (new ones by default) for Chrome drivers of this profile: images are disabled
+        by the browser if they are blocked and the page load strategy is set
+        """
+        options = ChromeOptions() if options is None else options
+        if 'image' in self.block:
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+            options.add_argument('--blink-settings=imagesEnabled=false')
+        options.set_capability('pageLoadStrategy', self.page_load_strategy)
+        return options
+
+    def firefox_options(self, options: Optional[FirefoxOptions] = None) -> FirefoxOptions:
+        """
+        Returns options (new ones by default) for Firefox drivers of this profile,
+        Firefox has no url blocking so only images and the page load strategy are applied
+        """
+        options = FirefoxOptions() if options is None else options
+        if 'image' in self.block:
+            options.set_preference('permissions.default.image', 2)
+        if 'stylesheet' in self.block:
+            options.set_preference('permissions.default.stylesheet', 2)
+        options.set_capability('pageLoadStrategy', self.page_load_strategy)
+        return options
+
+    def apply(self, driver) -> bool:
+        """
+        Blocks the urls of the profile in driver through the DevTools protocol (Chromium based browsers).
+        Returns False if the driver does not support it.
+        """
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+            return True
+        except (AttributeError, WebDriverException):
+            return False
+
+
+TEXT_ONLY = ResourceProfile(block=('image', 'stylesheet', 'font', 'media'), trackers=True, page_load_strategy='eager')
@@ -16,51 +16,21 @@ limitations under the License.
 import os
 from random import randint
 from time import sleep
-from urllib.parse import urlparse
 
-import wget
-import requests
+from .files import get_filename  # noqa: F401, re-exported, get_filename used to live here
+from .downloader import get_downloader
 
 
 def download(url, save_path):
-    filename = wget.download(url, save_path)
-    path = os.path.join(save_path, filename)
-    return path
+    return get_downloader().download(url, save_path)
 
 
-def _get_filepath(filename, save_path):
-    return os.path.join(save_path, filename)
-
-
-def _get_filename(url, save_path):
-    fn = os.path.basename(urlparse(url).path)
-    fp = _get_filepath(fn, save_path)
-    counter = 1
-    while True:
-        if os.path.isfile(fp):
-            fn_split = fn.split('.')
-            ext = fn_split.pop()
-            fn_without_ext = '.'.join(fn_split)
-            temp_fn = f"{fn_without_ext}({counter}).{ext}"
-            fp = _get_filepath(temp_fn, save_path)
-            counter += 1
-            continue
-        return fp
-
-
-def get_filename(url, path, mutex=None):
-    if mutex is None:
-        return _get_filename(url, path)
-    with mutex:
-        return _get_filename(url, path)
+def download_image(url, save_path, mutex=None):
+    return get_downloader().download(url, save_path, mutex)
 
 
-def download_image(url, save_path, mutex=None):
-    response = requests.get(url, allow_redirects=True)
-    img_path = get_filename(response.url, save_path, mutex)
-    with open(img_path, 'wb') as img:
-        img.write(response.content)
-    return img_path
+def submit_download(url, save_path, mutex=None):
+    return get_downloader().submit(url, save_path, mutex)
 
 
 def path_exists(path: str, isfile=False) -> bool:
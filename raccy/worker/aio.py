@@ -0,0 +1,302 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+from functools import partial
+from concurrent.futures import Future
+from typing import Optional, List
+
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.common.exceptions import WebDriverException
+
+from raccy.core.exceptions import CrawlerException
+from raccy.core.signals import page_fetched
+from raccy.core.utils import abstractmethod
+from raccy.utils.driver import close_driver, btn_click_handler, driver_wait, extract, Fields
+from raccy.utils.utils import submit_download
+from raccy.worker.pool import DriverPool
+from raccy.worker.worker import BaseWorker, WorkerMixin, CrawlerMixin, UrlDownloaderMixin, DatabaseMixin, ScrapedItems
+
+
+###############################
+#       ASYNC WORKERS
+###############################
+class AsyncScrapedItems(ScrapedItems):
+    """
+    ScrapedItems over the asyncio.Queue of an async crawler worker
+    """
+
+    async def put(self, item):
+        await self._queue.put(item)
+        self.scraped(item)
+
+
+class AsyncBaseWorker(WorkerMixin):
+    """
+    Base class for the workers of the asyncio engine: WorkersManager.start(engine='asyncio').
+    Workers run as tasks of one event loop, blocking calls (eg. selenium) must be awaited through run_sync,
+    which runs them in the loop's thread pool.
+    """
+    log = BaseWorker.log
+    _manager = BaseWorker._manager
+    poll_interval: float = 0.5
+
+    def __init__(self):
+        self._init_state()
+
+    async def run_sync(self, func, *args, **kwargs):
+        """
+        Runs the blocking func in the event loop's thread pool
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(func, *args, **kwargs))
+
+    async def pre_job(self):
+        """
+        Runs before job method is called
+        """
+
+    async def post_job(self):
+        """
+        Runs after job method is called
+        """
+
+    async def next_item(self, queue: asyncio.Queue, timeout=None):
+        """
+        Gets the next item from queue, raises asyncio.QueueEmpty if no item arrives within
+        timeout seconds or the worker is stopped
+        """
+        for wait in self._poll_waits(timeout):
+            if wait is None:
+                return queue.get_nowait()
+            try:
+                return await asyncio.wait_for(queue.get(), wait)
+            except asyncio.TimeoutError:
+                continue
+        raise asyncio.QueueEmpty
+
+    async def process_item(self, callback, item):
+        with self._processing(item):
+            await callback(item)
+
+    async def consume(self, queue: asyncio.Queue, timeout, callback):
+        """
+        Passes items from queue to the coroutine function callback one at a time until no
+        item arrives within timeout seconds or the worker is stopped
+        """
+        while True:
+            try:
+                item = await self.next_item(queue, timeout)
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await self.process_item(callback, item)
+            finally:
+                queue.task_done()
+
+    async def run(self):
+        with self.running():
+            try:
+                await self.pre_job()
+                await self.job()
+            finally:
+                await self.post_job()
+
+
+class AsyncBaseCrawlerWorker(AsyncBaseWorker, CrawlerMixin):
+    """
+    Base class for all async crawler workers
+    """
+
+    def __init__(self, driver: Optional[WebDriver] = None, pool: Optional[DriverPool] = None):
+        super().__init__()
+        if driver is None and pool is not None and self.uses_browser:
+            driver = pool.acquire()
+        self.driver = driver
+        self.pool = pool if self.uses_browser else None
+        self.prepare_driver()
+
+    async def load(self, url: str):
+        """
+        Same as BaseCrawlerWorker.load
+        """
+        await self.run_sync(self.driver.get, url)
+        if self.ready_xpath is not None:
+            await self.wait(self.ready_xpath, secs=self.ready_timeout)
+        page_fetched.send(type(self), self, url)
+
+    async def wait(self, xpath, secs=5, condition=None, action=None):
+        await self.run_sync(
+            driver_wait,
+            driver=self.driver,
+            xpath=xpath,
+            secs=secs,
+            condition=condition,
+            action=action
+        )
+
+    async def extract(self, fields: Fields, rows: Optional[str] = None) -> List[dict]:
+        return await self.run_sync(extract, self.driver, fields, rows)
+
+    async def follow(self, xpath=None, url=None, callback=None, *cbargs, **cbkwargs):
+        """
+        Same as BaseCrawlerWorker.follow, callback is a coroutine function
+        """
+        if xpath is not None and url is not None:
+            raise CrawlerException(
+                f"{self.__class__.__name__}: both xpath and url defined "
+                f"you have to define only one"
+            )
+        if xpath is not None:
+            await self.run_sync(btn_click_handler, self.driver, xpath)
+        if url is not None:
+            await self.load(url)
+
+        return await callback(*cbargs, **cbkwargs)
+
+    async def process_item(self, callback, item):
+        """
+        Same as BaseCrawlerWorker.process_item
+        """
+        try:
+            await super().process_item(callback, item)
+        except Exception as e:
+            self._page_failed(e)
+        finally:
+            if self.pool is not None:
+                await self.run_sync(self._renew_driver)
+
+    async def post_job(self):
+        if self.driver is None:
+            return
+        if self.pool is None:
+            await self.run_sync(close_driver, self.driver, self.log)
+        else:
+            await self.run_sync(self.pool.release, self.driver)
+
+
+class AsyncUrlDownloaderWorker(AsyncBaseCrawlerWorker, UrlDownloaderMixin):
+    """
+    asyncio counterpart of UrlDownloaderWorker
+    """
+    url_queue: asyncio.Queue = None
+
+    def __init_subclass__(cls, register=True, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if register:
+            cls._manager.register_worker('uw', cls)
+
+    def __init__(
+            self,
+            driver: Optional[WebDriver] = None,
+            pool: Optional[DriverPool] = None,
+            start_urls: Optional[List[str]] = None
+    ):
+        self._init_start_urls(start_urls)
+        super().__init__(driver, pool)
+
+    async def follow(self, xpath=None, url=None, callback=None, *cbargs, **cbkwargs):
+        if not self._count_follow():
+            return
+        return await super().follow(xpath=xpath, url=url, callback=callback, *cbargs, **cbkwargs)
+
+    @abstractmethod
+    async def job(self):
+        pass
+
+    async def run(self):
+        with self.running():
+            try:
+                for first, url in self._iter_start_urls():
+                    try:
+                        await self.load(url)
+                        if first:
+                            await self.pre_job()
+                        await self.job()
+                    except WebDriverException as e:
+                        self._start_url_failed(e)
+            finally:
+                await self.post_job()
+
+
+class AsyncCrawlerWorker(AsyncBaseCrawlerWorker):
+    """
+    asyncio counterpart of CrawlerWorker, parse is a coroutine function.
+    Set uses_browser to False for crawlers doing their own (async) http requests.
+    """
+    url_wait_timeout: Optional[int] = 10
+    url_queue: asyncio.Queue = None
+    db_queue: asyncio.Queue = None
+
+    def __init_subclass__(cls, register=True, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if register:
+            cls._manager.register_worker('cw', cls)
+
+    async def download_image(self, url, save_path):
+        return await asyncio.wrap_future(submit_download(url, save_path))
+
+    async def download_file(self, url, save_path):
+        return await asyncio.wrap_future(submit_download(url, save_path))
+
+    async def job(self):
+        db_queue, self.db_queue = self.db_queue, AsyncScrapedItems(self, self.db_queue)
+        try:
+            await self.consume(self.url_queue, self.url_wait_timeout, self.parse)
+        finally:
+            self.db_queue = db_queue
+
+    @abstractmethod
+    async def parse(self, url: str) -> None:
+        pass
+
+
+class AsyncDatabaseWorker(AsyncBaseWorker, DatabaseMixin):
+    """
+    asyncio counterpart of DatabaseWorker, save is a coroutine function. Several of them can run
+    (WorkersManager.start(writers=...)), all reading the same queue, shard_key is not supported
+    """
+    data_wait_timeout: Optional[int] = 10
+    shard_key = None
+    db_queue: asyncio.Queue = None
+
+    def __init_subclass__(cls, register=True, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if register:
+            cls._manager.register_worker('dw', cls)
+
+    async def resolve(self, data: dict) -> dict:
+        """
+        Waits for the background downloads (futures) referenced by data and replaces them with
+        their file paths, failed downloads are logged and replaced with None
+        """
+        futures = {
+            key: asyncio.wrap_future(future) if isinstance(future, Future) else future
+            for key, future in self._download_futures(data).items()
+        }
+        if futures:
+            await asyncio.wait(futures.values())
+        return self._set_downloads(data, futures)
+
+    @abstractmethod
+    async def save(self, data: dict) -> None:
+        pass
+
+    async def _save(self, data):
+        await self.save(await self.resolve(data))
+        self._saved([data])
+
+    async def job(self):
+        await self.consume(self.db_queue, self.data_wait_timeout, self._save)
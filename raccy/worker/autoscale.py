@@ -0,0 +1,170 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import math
+from threading import Thread, Event
+from typing import Callable, Optional, Iterable
+
+from raccy.core.exceptions import ImproperlyConfigured
+from raccy.worker.pool import DriverPool
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class Autoscaler(Thread):
+    """
+    Adds crawler workers while urls pile up in the url queue and retires them when it runs dry,
+    between the n crawlers started by WorkersManager.start and max_workers. Every interval seconds
+    it aims at one crawler per urls_per_worker waiting urls. It does not add crawlers while the
+    database queue holds more than max_db_backlog items, since more crawlers would only grow
+    the backlog, and retires one crawler per interval while host memory use is above
+    max_memory_percent, if it is set (requires psutil). Crawlers are retired one per interval, their drivers
+    are closed, and idle drivers are closed while there are no urls.
+    """
+
+    def __init__(
+            self,
+            max_workers: int,
+            urls_per_worker: int = 10,
+            max_db_backlog: Optional[int] = None,
+            max_memory_percent: Optional[float] = None,
+            interval: float = 5,
+            step: Optional[int] = None
+    ):
+        if max_memory_percent is not None and psutil is None:
+            raise ImproperlyConfigured(
+                f"{self.__class__.__name__}: max_memory_percent requires psutil: pip install psutil"
+            )
+        super().__init__(name='raccy-autoscaler', daemon=True)
+        self.max_workers = max_workers
+        self.min_workers = 1
+        self.urls_per_worker = urls_per_worker
+        self.max_db_backlog = max_db_backlog
+        self.max_memory_percent = max_memory_percent
+        self.interval = interval
+        self.step = step or max_workers
+        self.crawlers = []
+        self.url_queue = None
+        self.db_queue = None
+        self.pool = None
+        self.producers = []
+        self.log = None
+        self._stop_event = Event()
+
+    def attach(
+            self,
+            spawn: Callable[[], Thread],
+            crawlers: list,
+            url_queue,
+            db_queue,
+            pool: Optional[DriverPool] = None,
+            producers: Iterable[Thread] = (),
+            logger=None
+    ):
+        """
+        Called by WorkersManager.start: spawn starts and returns a new crawler, crawlers is the list of
+        running crawlers, their number is the minimum. pool is resized when crawlers are added or retired.
+        The autoscaler finishes once producers (the url downloaders) and all crawlers are done.
+        """
+        self._spawn = spawn
+        self.crawlers = crawlers
+        self.min_workers = max(1, len(crawlers))
+        self.url_queue = url_queue
+        self.db_queue = db_queue
+        self.pool = pool
+        self._base_size = 0 if pool is None else pool.size - len(crawlers)
+        self.producers = list(producers)
+        self.log = logger
+
+    def memory_percent(self) -> Optional[float]:
+        """
+        Host memory use in percent, None if it can't be determined
+        """
+        try:
+            return psutil.virtual_memory().percent
+        except Exception:
+            return None
+
+    def active(self) -> list:
+        return [crawler for crawler in self.crawlers if crawler.is_alive() and not crawler.stopped]
+
+    def target(self, active: int) -> int:
+        """
+        Number of crawlers wanted given the queues and memory use, active is the number running
+        """
+        depth = self.url_queue.qsize()
+        target = min(max(self.min_workers, math.ceil(depth / self.urls_per_worker)), self.max_workers)
+        if depth == 0:
+            target = min(target, active)
+        if self.max_db_backlog is not None and self.db_queue.qsize() > self.max_db_backlog:
+            target = min(target, active)
+        if self.max_memory_percent is not None:
+            memory = self.memory_percent()
+            if memory is not None and memory > self.max_memory_percent:
+                target = min(target, max(self.min_workers, active - 1))
+        return target
+
+    def _resize_pool(self, crawlers: int):
+        if self.pool is not None:
+            self.pool.resize(self._base_size + crawlers)
+
+    def scale(self):
+        """
+        Adds or retires crawlers once, it is called every interval seconds
+        """
+        active = self.active()
+        target = self.target(len(active))
+        if target > len(active):
+            count = min(self.step, target - len(active))
+            self._resize_pool(len(active) + count)
+            for _ in range(count):
+                try:
+                    self.crawlers.append(self._spawn())
+                except Exception as e:
+                    self._resize_pool(len(self.active()))
+                    if self.log is not None:
+                        self.log.exception(e)
+                    return
+            self._info(f'{self.__class__.__name__}: added {count} crawlers, {len(active) + count} running')
+        elif target < len(active):
+            self._resize_pool(len(active) - 1)
+            active[-1].stop()
+            self._info(f'{self.__class__.__name__}: retired a crawler, {len(active) - 1} running')
+        elif self.pool is not None and self.url_queue.qsize() == 0:
+            self.pool.close_idle()
+
+    def _info(self, message):
+        if self.log is not None:
+            self.log.info(message)
+
+    def finished(self) -> bool:
+        producing = any(producer.is_alive() for producer in self.producers)
+        return not producing and not self.active() and self.url_queue.qsize() == 0
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            if self.finished():
+                return
+            try:
+                self.scale()
+            except Exception as e:
+                if self.log is not None:
+                    self.log.exception(e)
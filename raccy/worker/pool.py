@@ -0,0 +1,204 @@
+"""
+Copyright 2021 Daniel Afriyie
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from threading import Lock
+from queue import Queue, Empty
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Callable, Optional
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from raccy.core.exceptions import CrawlerException, ImproperlyConfigured
+from raccy.core.metrics import DRIVERS_RECYCLED, DRIVER_ACQUIRE_SECONDS
+from raccy.utils.driver import close_driver
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class DriverPool:
+    """
+    Creates webdriver objects ahead of time and leases them to crawler workers.
+    Leased drivers are health checked between pages and replaced when they die,
+    have loaded max_pages pages or their browser uses more than max_rss bytes of memory.
+    """
+
+    def __init__(
+            self,
+            factory: Callable[[], WebDriver],
+            size: int,
+            max_pages: Optional[int] = None,
+            max_rss: Optional[int] = None,
+            logger=None
+    ):
+        if max_rss is not None and psutil is None:
+            raise ImproperlyConfigured(f"{self.__class__.__name__}: max_rss requires psutil: pip install psutil")
+        self._factory = factory
+        self._size = size
+        self.max_pages = max_pages
+        self.max_rss = max_rss
+        self.log = logger
+        self._idle = Queue()
+        self._pages = {}
+        self._total = 0
+        self._closed = False
+        self._lock = Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def resize(self, size: int):
+        """
+        Changes the maximum number of live drivers, surplus drivers are closed as they are released
+        """
+        with self._lock:
+            self._size = size
+
+    def _create(self) -> WebDriver:
+        driver = self._factory()
+        with self._lock:
+            self._pages[driver] = 0
+        return driver
+
+    def _discard(self, driver: WebDriver):
+        with self._lock:
+            self._pages.pop(driver, None)
+            self._total -= 1
+        DRIVERS_RECYCLED.inc()
+        close_driver(driver, self.log)
+
+    def prewarm(self, n: Optional[int] = None):
+        """
+        Starts n drivers (by default the pool size) in parallel and adds them to the idle drivers
+        """
+        with self._lock:
+            n = min(self._size if n is None else n, self._size - self._total)
+            self._total += n
+        if n <= 0:
+            return
+        with ThreadPoolExecutor(max_workers=n) as executor:
+            for driver in executor.map(lambda _: self._create(), range(n)):
+                self._idle.put(driver)
+
+    def acquire(self, timeout: Optional[float] = None) -> WebDriver:
+        """
+        Leases an idle driver, a new one is created if there is none and the pool is not full.
+        Otherwise waits up to timeout seconds for a driver to be released.
+        """
+        if self._closed:
+            raise CrawlerException(f"{self.__class__.__name__}: pool is closed!")
+        try:
+            return self._idle.get(block=False)
+        except Empty:
+            pass
+        with self._lock:
+            create = self._total < self._size
+            if create:
+                self._total += 1
+        if create:
+            try:
+                return self._create()
+            except Exception:
+                with self._lock:
+                    self._total -= 1
+                raise
+        start = perf_counter()
+        try:
+            return self._idle.get(timeout=timeout)
+        except Empty:
+            raise CrawlerException(f"{self.__class__.__name__}: no driver available after {timeout} seconds!")
+        finally:
+            DRIVER_ACQUIRE_SECONDS.observe(perf_counter() - start)
+
+    def release(self, driver: WebDriver):
+        """
+        Returns a leased driver to the pool
+        """
+        with self._lock:
+            surplus = self._total > self._size
+        if self._closed or surplus or not self.is_healthy(driver) or self.needs_recycle(driver):
+            self._discard(driver)
+        else:
+            self._idle.put(driver)
+
+    def checkpoint(self, driver: WebDriver) -> WebDriver:
+        """
+        Called by workers after each page, counts the page and returns either
+        the same driver or a fresh one if the driver had to be recycled.
+        If the fresh driver can't be started the exception is raised, the pool has room for another one
+        """
+        with self._lock:
+            self._pages[driver] = self._pages.get(driver, 0) + 1
+        if self.is_healthy(driver) and not self.needs_recycle(driver):
+            return driver
+        self._discard(driver)
+        with self._lock:
+            self._total += 1
+        try:
+            return self._create()
+        except Exception:
+            with self._lock:
+                self._total -= 1
+            raise
+
+    def is_healthy(self, driver: WebDriver) -> bool:
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def pages(self, driver: WebDriver) -> int:
+        return self._pages.get(driver, 0)
+
+    def rss(self, driver: WebDriver) -> Optional[int]:
+        """
+        Resident memory in bytes of the driver process and its browser, None if it can't be determined
+        """
+        try:
+            process = psutil.Process(driver.service.process.pid)
+            return sum(p.memory_info().rss for p in [process, *process.children(recursive=True)])
+        except Exception:
+            return None
+
+    def needs_recycle(self, driver: WebDriver) -> bool:
+        if self.max_pages is not None and self.pages(driver) >= self.max_pages:
+            return True
+        if self.max_rss is not None:
+            rss = self.rss(driver)
+            return rss is not None and rss > self.max_rss
+        return False
+
+    def close_idle(self):
+        """
+        Closes the drivers that are not leased, eg. while a crawl has no work
+        """
+        while True:
+            try:
+                driver = self._idle.get(block=False)
+            except Empty:
+                return
+            self._discard(driver)
+
+    def close(self):
+        """
+        Closes idle drivers, drivers still leased are closed when they are released
+        """
+        self._closed = True
+        self.close_idle()
@@ -13,30 +13,268 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from threading import Thread, Lock
-from queue import Empty
-from typing import Optional
+import asyncio
+import multiprocessing
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from threading import Thread, Lock, Event
+from queue import Empty, Queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import monotonic, perf_counter
+from typing import Optional, List, Union, Callable, Any
 
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.common.exceptions import WebDriverException
+from requests import RequestException
 
 from raccy.core.meta import SingletonMeta
-from raccy.core.queue_ import DatabaseQueue, ItemUrlQueue
+from raccy.core.queue_ import BaseQueue, DatabaseQueue, ItemUrlQueue, AsyncDatabaseQueue
+from raccy.core.backends import ShardedQueue
 from raccy.core.exceptions import CrawlerException
+from raccy.core.cache import PageCache
+from raccy.core.profiling import PageProfiler
+from raccy.core.signals import page_fetched, item_scraped, item_saved, worker_error
+from raccy.core.metrics import (
+    ITEMS, ITEM_ERRORS, ITEM_SECONDS, ITEMS_SAVED, DRIVER_ERRORS, WORKERS_RUNNING, WORKER_ERRORS
+)
 from raccy.core.utils import abstractmethod
-from raccy.utils.driver import close_driver, btn_click_handler, driver_wait
-from raccy.utils.utils import download_image, download
+from raccy.utils.driver import close_driver, btn_click_handler, driver_wait, extract, Fields
+from raccy.utils.utils import download_image, download, submit_download
+from raccy.utils.http import HttpDriver
+from raccy.utils.profiles import ResourceProfile
+from raccy.worker.pool import DriverPool
+from raccy.worker.autoscale import Autoscaler
 from ru import logger
 
+ENGINES = ('thread', 'asyncio')
+
 
 ##################################
 #       MIXINS
 #################################
+class WorkerMixin:
+    """
+    Bookkeeping shared by the thread workers and the async workers of raccy.worker.aio: stop and drain state,
+    item and worker metrics and signals. The workers only do the (blocking or awaited) queue and driver calls.
+    """
+
+    def _init_state(self):
+        self._stop_event = Event()
+        self._drain = False
+        # the exception process_item reported, running() sees it again if it ends the worker
+        self._reported_error = None
+
+    def pre_item(self, item):
+        """
+        Runs before an item taken from the queue is processed
+        """
+
+    def post_item(self, item, elapsed: float):
+        """
+        Runs after an item is processed, elapsed is the processing time in seconds
+        """
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop_event.is_set()
+
+    def stop(self, drain=False):
+        """
+        Asks the worker to stop once the item at hand is processed.
+        If drain is true, the worker first processes the items left in its queue.
+        """
+        self._drain = drain
+        self._stop_event.set()
+
+    def _poll_waits(self, timeout=None):
+        """
+        Yields how many seconds to wait for the next item until timeout seconds have passed or the worker is
+        stopped. If it was stopped with drain, yields None once: the next item is taken without waiting, if any.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            if self.stopped:
+                if self._drain:
+                    yield None
+                return
+            wait = self.poll_interval
+            if deadline is not None:
+                wait = min(wait, deadline - monotonic())
+                if wait <= 0:
+                    return
+            yield wait
+
+    @contextmanager
+    def _processing(self, item, count: int = 1):
+        """
+        Runs pre_item and post_item around the processing of item and counts it in the item metrics.
+        A batch counts as its count items, which share its processing time.
+        """
+        name = self.__class__.__name__
+        self.pre_item(item)
+        start = perf_counter()
+        try:
+            yield
+        except Exception as e:
+            ITEM_ERRORS.inc(count, worker=name)
+            worker_error.send(type(self), self, e)
+            self._reported_error = e
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            ITEMS.inc(count, worker=name)
+            for _ in range(count):
+                ITEM_SECONDS.observe(elapsed / count, worker=name)
+        self.post_item(item, elapsed)
+
+    @contextmanager
+    def running(self):
+        """
+        Counts the worker in the running workers metric and its exceptions in the worker errors metric
+        """
+        name = self.__class__.__name__
+        WORKERS_RUNNING.inc(worker=name)
+        try:
+            yield
+        except Exception as e:
+            WORKER_ERRORS.inc(worker=name)
+            if e is not self._reported_error:
+                worker_error.send(type(self), self, e)
+            raise
+        finally:
+            WORKERS_RUNNING.dec(worker=name)
+
+
 class CrawlerMixin:
+    mutex = Lock()
+    uses_browser = True
+    # exceptions of a failed page counted as driver errors, other exceptions are only logged
+    driver_exceptions = (WebDriverException,)
+    resource_profile: Optional[ResourceProfile] = None
+    ready_xpath: Optional[str] = None
+    ready_timeout: float = 10
 
     def close_driver(self):
         close_driver(self.driver, self.log)
 
+    def prepare_driver(self):
+        """
+        Applies resource_profile to self.driver, it is called whenever the worker gets a new driver
+        """
+        if self.resource_profile is not None and self.driver is not None:
+            self.resource_profile.apply(self.driver)
+
+    def _driver_error(self, error: Exception):
+        DRIVER_ERRORS.inc(worker=self.__class__.__name__)
+        self.log.exception(error)
+
+    def _page_failed(self, error: Exception):
+        if isinstance(error, self.driver_exceptions):
+            self._driver_error(error)
+        else:
+            self.log.exception(error)
+
+    def _renew_driver(self):
+        """
+        Counts the page on the pool and switches to the fresh driver if the pool recycled the current one
+        """
+        driver = self.driver
+        try:
+            self.driver = self.pool.checkpoint(driver)
+        except Exception as e:
+            # the recycled driver is gone but its replacement failed to start, lease another one
+            self._driver_error(e)
+            self.driver = self.pool.acquire()
+        if self.driver is not driver:
+            self.prepare_driver()
+
+
+class ScrapedItems:
+    """
+    The db_queue of a crawler worker while it parses: puts items in queue and sends the item_scraped signal with
+    the worker, other attributes are those of queue
+    """
+
+    def __init__(self, worker, queue):
+        self._worker = worker
+        self._queue = queue
+
+    def __getattr__(self, name):
+        return getattr(self._queue, name)
+
+    def scraped(self, item):
+        item_scraped.send(type(self._worker), self._worker, item)
+
+    def put(self, item, *args, **kwargs):
+        self._queue.put(item, *args, **kwargs)
+        self.scraped(item)
+
+    def put_nowait(self, item):
+        self._queue.put_nowait(item)
+        self.scraped(item)
+
+
+class UrlDownloaderMixin:
+    start_url: str = None
+    start_urls: Optional[List[str]] = None
+    urls_scraped = 1
+    max_url_download = -1
+
+    def _init_start_urls(self, start_urls: Optional[List[str]] = None):
+        self.start_urls = get_start_urls(self) if start_urls is None else list(start_urls)
+
+    def _iter_start_urls(self):
+        """
+        Yields whether it is the first start url and the start url, after resetting the state of the previous one
+        """
+        for i, url in enumerate(self.start_urls):
+            self.start_url = url
+            self.urls_scraped = 1
+            yield i == 0, url
+
+    def _start_url_failed(self, error: Exception):
+        self._driver_error(error)
+        worker_error.send(type(self), self, error)
+
+    def _count_follow(self) -> bool:
+        """
+        Counts a followed url, returns False once max_url_download urls were followed
+        """
+        if self.max_url_download > 0:
+            if self.urls_scraped > self.max_url_download:
+                return False
+
+        with self.mutex:
+            self.urls_scraped += 1
+        return True
+
+
+class DatabaseMixin:
+
+    @staticmethod
+    def _download_futures(data: dict) -> dict:
+        """
+        The background downloads (futures) referenced by data, keyed by field
+        """
+        return {key: value for key, value in data.items() if isinstance(value, Future) or asyncio.isfuture(value)}
+
+    def _set_downloads(self, data: dict, futures: dict) -> dict:
+        """
+        Replaces the futures of data with their results, failed downloads are logged and replaced with None
+        """
+        for key, future in futures.items():
+            try:
+                data[key] = future.result()
+            except Exception as e:
+                self.log.exception(e)
+                data[key] = None
+        return data
+
+    def _saved(self, items: list):
+        ITEMS_SAVED.inc(len(items), worker=self.__class__.__name__)
+        for data in items:
+            item_saved.send(type(self), self, data)
+
 
 ################################
 #       WORKERS MANAGER
@@ -48,17 +286,48 @@ class Manager(metaclass=SingletonMeta):
 
     def __init__(self):
         self._workers = {}
+        self._spiders = {}
 
-    def add_driver(self, driver):
+    def add_driver(self, driver, max_pages=None, max_rss=None):
+        """
+        driver: callable that returns a new webdriver object
+        max_pages: recycle a driver after it has loaded this number of pages
+        max_rss: recycle a driver when its browser uses more than this number of bytes of memory
+        """
         self._driver = driver
+        self._pool_options = dict(max_pages=max_pages, max_rss=max_rss)
+
+    @property
+    def pool(self) -> DriverPool:
+        return self._pool
 
-    def register_worker(self, name, worker):
-        self._workers[name] = worker
+    def register_worker(self, name, worker, spider: Optional[str] = None):
+        """
+        Registers worker in the slot name ('uw', 'cw' or 'dw') of spider, or in the default slots
+        """
+        if spider is None:
+            self._workers[name] = worker
+        else:
+            self._spiders.setdefault(spider, {})[name] = worker
 
     @property
     def workers(self):
         return self._workers
 
+    @property
+    def spiders(self) -> dict:
+        return self._spiders
+
+    def spider(self, name: str) -> dict:
+        """
+        Returns the workers registered for spider name keyed by slot
+        """
+        workers = self._spiders.get(name, {})
+        for slot, role in (('uw', 'url downloader'), ('cw', 'crawler')):
+            if slot not in workers:
+                raise CrawlerException(f'{self.__class__.__name__}: spider {name} has no {role} worker registered!')
+        return workers
+
     @property
     def uw(self):
         return self._workers['uw']
@@ -71,46 +340,347 @@ class Manager(metaclass=SingletonMeta):
     def dw(self):
         return self._workers['dw']
 
-    def start(self, n=5, wait=True):
+    def start(
+            self,
+            n=5,
+            wait=True,
+            engine='thread',
+            processes=None,
+            downloaders=1,
+            writers=1,
+            autoscaler: Optional[Autoscaler] = None,
+            url_queue_size: Optional[int] = None,
+            db_queue_size: Optional[int] = None,
+            spiders: Optional[List[str]] = None
+    ):
         """
-        n: number of crawler workers to instantiate
+        n: number of crawler workers to instantiate (per process if processes is set)
         wait: if true, waits till all workers are done
+        engine: 'thread' runs every worker in its own thread, 'asyncio' runs the async
+                workers of raccy.worker.aio as tasks of one event loop
+        processes: if set, crawler workers run in this number of processes, the url downloader
+                   and the database worker stay in this process
+        downloaders: number of url downloader workers, the start urls of the registered url downloader
+                   are spread over them (at most one downloader per start url)
+        writers: number of database workers, all reading DatabaseQueue or, if the database worker sets
+                   shard_key, each reading its own shard of it (thread engine only)
+                   set downloaders or writers to 0 to run without url downloaders or database workers,
+                   eg. on crawler nodes sharing queues through a raccy.core.broker.QueueBroker
+        autoscaler: raccy.worker.autoscale.Autoscaler that adds crawler workers, up to its max_workers,
+                   while urls pile up and retires them down to n when the url queue runs dry
+        url_queue_size, db_queue_size: bound ItemUrlQueue and DatabaseQueue to this number of items,
+                   workers putting items in a full queue wait until there is room
+        spiders: names of spiders to run side by side instead of the default workers (thread engine only),
+                   each with its url downloaders, n crawlers and its own ItemUrlQueue.named(spider) queue,
+                   sharing the driver pool and, for spiders without their own database worker, the database workers
         """
         if not hasattr(self, '_driver'):
             raise CrawlerException(f'{self.__class__.__name__}: driver not added!')
+        if engine not in ENGINES:
+            raise CrawlerException(f'{self.__class__.__name__}: unknown engine {engine}, use one of {ENGINES}')
 
-        wks = []
-        uw = self.uw
+        if spiders and (engine != 'thread' or processes or autoscaler is not None):
+            raise CrawlerException(f'{self.__class__.__name__}: spiders are only supported by the thread engine!')
+        if spiders:
+            return self._start_spiders(spiders, n, wait, downloaders, writers, url_queue_size, db_queue_size)
+
+        uw = self.uw if downloaders else None
         cw = self.cw
-        dw = self.dw
+        dw = self.dw if writers else None
+        roles = [w for w, count in ((uw, downloaders), (cw, n), (dw, writers)) if count]
+        if any(asyncio.iscoroutinefunction(w.run) != (engine == 'asyncio') for w in roles):
+            raise CrawlerException(f'{self.__class__.__name__}: registered workers do not match the {engine} engine!')
+
+        if autoscaler is not None and (engine != 'thread' or processes):
+            raise CrawlerException(f'{self.__class__.__name__}: autoscaling is only supported by the thread engine!')
+
+        check_background_downloads(cw, cw.db_queue, processes)
+
+        sharded = dw is not None and writers > 1 and getattr(dw, 'shard_key', None) is not None
+        if sharded and (engine != 'thread' or processes):
+            raise CrawlerException(f'{self.__class__.__name__}: sharded writers are only supported by the thread engine!')
+
+        start_urls = get_start_urls(uw) if uw else []
+        downloaders = min(downloaders, len(start_urls))
+        self._queue_sizes = url_queue_size or 0, db_queue_size or 0
+        if processes:
+            if engine != 'thread':
+                raise CrawlerException(f'{self.__class__.__name__}: processes are only supported by the thread engine!')
+            return self._start_processes(n, processes, wait, uw, dw, downloaders, writers)
+        db_backend = None
+        maxsizes = {}
+        if engine == 'thread':
+            if url_queue_size is not None:
+                self._bound(ItemUrlQueue(), url_queue_size, maxsizes)
+            if sharded:
+                db_backend = DatabaseQueue().get_queue
+                DatabaseQueue().set_queue(ShardedQueue(writers, dw.shard_key, self._queue_sizes[1]))
+            elif db_queue_size is not None:
+                self._bound(DatabaseQueue(), db_queue_size, maxsizes)
 
-        url_dwn = uw(driver=self._driver())
-        url_dwn.start()
-        wks.append(url_dwn)
+        size = (n if cw.uses_browser else 0) + downloaders
+        pool = self._pool = DriverPool(self._driver, size, logger=BaseWorker.log, **self._pool_options)
+        pool.prewarm()
 
+        if engine == 'asyncio':
+            run = self._run_async(n, pool, uw, dw, downloaders, writers)
+            if wait:
+                return asyncio.run(run)
+            runner = Thread(target=asyncio.run, args=(run,))
+            runner.start()
+            return
+
+        url_dwns = self._downloaders(uw, downloaders, pool)
+        for url_dwn in url_dwns:
+            url_dwn.start()
+        wks = list(url_dwns)
+
+        crawlers = []
         for _ in range(n):
-            crawler = cw(driver=self._driver())
+            crawler = cw(pool=pool)
+            crawler.start()
+            crawlers.append(crawler)
+        wks.extend(crawlers)
+
+        dbs = [dw() for _ in range(writers if dw else 0)]
+        for i, db in enumerate(dbs):
+            if sharded:
+                db.db_queue = DatabaseQueue().get_queue.shard(i)
+            db.start()
+        wks.extend(dbs)
+
+        self._running = wks
+        self._autoscaler = autoscaler
+        if autoscaler is not None:
+            autoscaler.attach(
+                spawn=lambda: self._spawn_crawler(cw, pool),
+                crawlers=crawlers,
+                url_queue=cw.url_queue,
+                db_queue=cw.db_queue,
+                pool=pool if cw.uses_browser else None,
+                producers=url_dwns,
+                logger=BaseWorker.log
+            )
+            autoscaler.start()
+        restore = [partial(queue.set_maxsize, maxsize) for queue, maxsize in maxsizes.items()]
+        if db_backend is not None:
+            restore.append(partial(DatabaseQueue().set_queue, db_backend))
+        self._end(wait, wks, pool, [ItemUrlQueue()], restore, autoscaler)
+
+    def _end(self, wait, wks, pool, url_queues, restore=(), autoscaler=None):
+        """
+        Ends the run once its workers are done: closes the pool, saves the url filters of url_queues (eg. the
+        snapshot of a BloomUrlFilter) and calls restore, the callables putting back the queue sizes and backends
+        the run changed. Without wait, the run is ended by a background thread.
+        """
+        if not wait:
+            Thread(target=self._end, args=(True, wks, pool, url_queues, restore, autoscaler), daemon=True).start()
+            return
+        if autoscaler is not None:
+            autoscaler.join()
+        for wk in wks:
+            wk.join()
+        pool.close()
+        for url_queue in url_queues:
+            if url_queue.url_filter is not None:
+                url_queue.url_filter.save()
+        for func in restore:
+            func()
+
+    @staticmethod
+    def _bound(queue, maxsize: int, maxsizes: dict):
+        """
+        Bounds queue to maxsize items for a run, its size before the first change is kept in maxsizes
+        """
+        if queue not in maxsizes:
+            maxsizes[queue] = getattr(queue.get_queue, 'maxsize', 0)
+        queue.set_maxsize(maxsize)
+
+    @staticmethod
+    def _downloaders(uw, count, pool) -> list:
+        """
+        Returns count url downloaders of class uw taking turns over its start urls
+        """
+        if not uw or not count:
+            return []
+        start_urls = get_start_urls(uw)
+        return [uw(pool=pool, start_urls=start_urls[i::count]) for i in range(count)]
+
+    def _start_spiders(self, names, n, wait, downloaders, writers, url_queue_size, db_queue_size):
+        """
+        Runs the spiders names side by side over one driver pool. Each spider reads its own ItemUrlQueue.named(spider),
+        its items go to its own DatabaseQueue.named(spider) if it registered a database worker, otherwise they go
+        to DatabaseQueue and are saved by the default database workers, shared by all such spiders.
+        """
+        spiders = {name: self.spider(name) for name in names}
+        for name, workers in spiders.items():
+            db_queue = DatabaseQueue() if workers.get('dw') is None else DatabaseQueue.named(name)
+            check_background_downloads(workers['cw'], db_queue)
+        counts = {name: min(downloaders, len(get_start_urls(workers['uw']))) for name, workers in spiders.items()}
+        size = sum((n if workers['cw'].uses_browser else 0) + counts[name] for name, workers in spiders.items())
+        pool = self._pool = DriverPool(self._driver, size, logger=BaseWorker.log, **self._pool_options)
+        pool.prewarm()
+
+        wks = []
+        url_queues = []
+        maxsizes = {}
+        shared = False
+        for name, workers in spiders.items():
+            dw = workers.get('dw')
+            shared = shared or dw is None
+            url_queue = ItemUrlQueue.named(name)
+            url_queues.append(url_queue)
+            db_queue = DatabaseQueue() if dw is None else DatabaseQueue.named(name)
+            for queue, queue_size in ((url_queue, url_queue_size), (db_queue, db_queue_size)):
+                if queue_size is not None:
+                    self._bound(queue, queue_size, maxsizes)
+            for url_dwn in self._downloaders(workers['uw'], counts[name], pool):
+                url_dwn.url_queue = url_queue
+                wks.append(url_dwn)
+            for _ in range(n):
+                crawler = workers['cw'](pool=pool)
+                crawler.url_queue, crawler.db_queue = url_queue, db_queue
+                wks.append(crawler)
+            for _ in range(writers if dw else 0):
+                db = dw()
+                db.db_queue = db_queue
+                wks.append(db)
+        if shared and writers:
+            if 'dw' not in self._workers:
+                raise CrawlerException(f'{self.__class__.__name__}: no database worker registered for the spiders!')
+            wks.extend(self.dw() for _ in range(writers))
+
+        for wk in wks:
+            wk.start()
+        self._running = wks
+        self._autoscaler = None
+        restore = [partial(queue.set_maxsize, maxsize) for queue, maxsize in maxsizes.items()]
+        self._end(wait, wks, pool, url_queues, restore)
+
+    def _spawn_crawler(self, cw, pool):
+        crawler = cw(pool=pool)
+        crawler.start()
+        self._running.append(crawler)
+        return crawler
+
+    def _start_processes(self, n, processes, wait, uw, dw, downloaders, writers):
+        """
+        Runs the crawlers in processes and the url downloaders and database workers in threads of this process.
+        The processes are started before any thread or driver of this run, a fork then copies no lock held by them
+        """
+        ctx = multiprocessing.get_context()
+        url_queue, db_queue = (ctx.JoinableQueue(size) for size in self._queue_sizes)
+        queues = ItemUrlQueue(), DatabaseQueue()
+        local_queues = [q.get_queue for q in queues]
+        for q, mp_queue in zip(queues, (url_queue, db_queue)):
+            q.set_queue(mp_queue)
+
+        crawlers = [
+            ctx.Process(
+                target=_run_crawlers,
+                args=(self.cw, self._driver, self._pool_options, n, url_queue, db_queue),
+                daemon=True
+            )
+            for _ in range(processes)
+        ]
+        for crawler in crawlers:
             crawler.start()
+
+        pool = self._pool = DriverPool(self._driver, downloaders, logger=BaseWorker.log, **self._pool_options)
+        pool.prewarm()
+        wks = self._downloaders(uw, downloaders, pool)
+        wks.extend(dw() for _ in range(writers if dw else 0))
+        for wk in wks:
+            wk.start()
+
+        self._running = wks
+        self._processes = crawlers
+        restore = [partial(q.set_queue, local_queue) for q, local_queue in zip(queues, local_queues)]
+        self._end(wait, [*crawlers, *wks], pool, [ItemUrlQueue()], restore)
+
+    async def _run_async(self, n, pool, uw, dw, downloaders, writers):
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=pool.size + 2, thread_name_prefix='raccy-sync')
+        loop.set_default_executor(executor)
+        url_queue, db_queue = asyncio.Queue(self._queue_sizes[0]), AsyncDatabaseQueue(self._queue_sizes[1])
+
+        wks = self._downloaders(uw, downloaders, pool)
+        for url_dwn in wks:
+            url_dwn.url_queue = url_queue
+        for _ in range(n):
+            crawler = self.cw(pool=pool)
+            crawler.url_queue, crawler.db_queue = url_queue, db_queue
             wks.append(crawler)
+        for _ in range(writers if dw else 0):
+            db = dw()
+            db.db_queue = db_queue
+            wks.append(db)
 
-        db = dw()
-        db.start()
-        wks.append(db)
+        self._running = wks
+        try:
+            await asyncio.gather(*(wk.run() for wk in wks))
+        finally:
+            await loop.run_in_executor(None, pool.close)
 
-        if wait:
-            for wk in wks:
-                wk.join()
+    def stop(self, drain=False):
+        """
+        Asks all running workers to stop, see BaseWorker.stop
+        """
+        if getattr(self, '_autoscaler', None) is not None:
+            self._autoscaler.stop()
+        for wk in getattr(self, '_running', []):
+            wk.stop(drain)
+
+
+def _run_crawlers(cw, driver, pool_options, n, url_queue, db_queue):
+    """
+    Entry point of crawler processes: runs n crawler worker threads over the inter-process queues
+    """
+    ItemUrlQueue().set_queue(url_queue)
+    DatabaseQueue().set_queue(db_queue)
+    size = n if cw.uses_browser else 0
+    pool = DriverPool(driver, size, logger=BaseWorker.log, **pool_options)
+    pool.prewarm()
+    crawlers = [cw(pool=pool) for _ in range(n)]
+    for crawler in crawlers:
+        crawler.start()
+    for crawler in crawlers:
+        crawler.join()
+    pool.close()
+    db_queue.close()
+    db_queue.join_thread()
 
 
 ###############################
 #       WORKERS
 ###############################
-class BaseWorker(Thread):
+class BaseWorker(Thread, WorkerMixin):
     """
-    Base class for all workers
+    Base class for all workers. Workers of a named spider are declared with the spider class
+    keyword, eg. class ShopCrawler(CrawlerWorker, spider='shop'), see WorkersManager.start(spiders=...)
     """
     log = logger()
     _manager = Manager()
+    poll_interval: float = 0.5
+    spider: Optional[str] = None
+    profiler: Optional[PageProfiler] = None
+
+    def __init_subclass__(cls, spider: Optional[str] = None, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if spider is not None:
+            cls.spider = spider
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_state()
+
+    def phase(self, name: str, url: Optional[str] = None):
+        """
+        Context manager timing a phase of the current page with profiler, if it is set
+        """
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.phase(name, url)
 
     def pre_job(self):
         """
@@ -122,35 +692,105 @@ class BaseWorker(Thread):
         Runs after job method is called
         """
 
+    def next_item(self, queue, timeout=None):
+        """
+        Gets the next item from queue, raises queue.Empty if no item arrives within
+        timeout seconds or the worker is stopped
+        """
+        for wait in self._poll_waits(timeout):
+            if wait is None:
+                return queue.get(block=False)
+            try:
+                return queue.get(timeout=wait)
+            except Empty:
+                continue
+        raise Empty
+
+    def process_item(self, callback, item, count: int = 1):
+        with self._processing(item, count):
+            callback(item)
+
+    def consume(self, queue, timeout, callback):
+        """
+        Passes items from queue to callback one at a time until no item arrives
+        within timeout seconds or the worker is stopped
+        """
+        while True:
+            try:
+                item = self.next_item(queue, timeout)
+            except Empty:
+                return
+            try:
+                self.process_item(callback, item)
+            finally:
+                queue.task_done()
+
     def kill(self):
         if self.is_alive():
             self._is_stopped = True
             self.post_job()
 
     def run(self):
-        self.pre_job()
-        self.job()
-        self.kill()
+        with self.running():
+            try:
+                self.pre_job()
+                self.job()
+            finally:
+                self.kill()
 
 
 class BaseCrawlerWorker(BaseWorker, CrawlerMixin):
     """
     Base class for all crawler workers
     """
-    mutex = Lock()
 
-    def __init__(self, driver: WebDriver, *args, **kwargs):
+    def __init__(self, driver: Optional[WebDriver] = None, *args, pool: Optional[DriverPool] = None, **kwargs):
         super().__init__(*args, **kwargs)
+        if driver is None and pool is not None:
+            driver = pool.acquire()
         self.driver = driver
+        self.pool = pool
+        self.prepare_driver()
+
+    def load(self, url: str):
+        """
+        Loads url and, if ready_xpath is set, waits up to ready_timeout seconds for it to be present.
+        Set ready_xpath when the page load strategy of resource_profile is eager or none.
+        """
+        with self.phase('load'):
+            self.driver.get(url)
+        if self.ready_xpath is not None:
+            self.wait(self.ready_xpath, secs=self.ready_timeout)
+        page_fetched.send(type(self), self, url)
+
+    def process_item(self, callback, item):
+        """
+        Processes a page, a page that fails is logged (worker_error is sent) and the worker moves on to the next one
+        """
+        try:
+            super().process_item(callback, item)
+        except Exception as e:
+            self._page_failed(e)
+        finally:
+            if self.pool is not None:
+                self._renew_driver()
 
     def wait(self, xpath, secs=5, condition=None, action=None):
-        driver_wait(
-            driver=self.driver,
-            xpath=xpath,
-            secs=secs,
-            condition=condition,
-            action=action
-        )
+        with self.phase('wait'):
+            driver_wait(
+                driver=self.driver,
+                xpath=xpath,
+                secs=secs,
+                condition=condition,
+                action=action
+            )
+
+    def extract(self, fields: Fields, rows: Optional[str] = None) -> List[dict]:
+        """
+        Extracts fields from the current page in a single round trip, see raccy.utils.driver.extract
+        """
+        with self.phase('extract'):
+            return extract(self.driver, fields, rows)
 
     def follow(self, xpath=None, url=None, callback=None, *cbargs, **cbkwargs):
         if xpath is not None and url is not None:
@@ -159,42 +799,65 @@ class BaseCrawlerWorker(BaseWorker, CrawlerMixin):
                 f"you have to define only one"
             )
         if xpath is not None:
-            btn_click_handler(self.driver, xpath)
+            with self.phase('follow'):
+                btn_click_handler(self.driver, xpath)
         if url is not None:
-            self.driver.get(url)
+            self.load(url)
 
         return callback(*cbargs, **cbkwargs)
 
     def post_job(self):
-        self.close_driver()
+        if self.pool is None:
+            self.close_driver()
+        else:
+            self.pool.release(self.driver)
 
 
-class UrlDownloaderWorker(BaseCrawlerWorker, metaclass=SingletonMeta):
+def check_background_downloads(cw, db_queue, processes=None):
     """
-    Resonsible for downloading item(s) to be scraped urls and enqueue(s) them in ItemUrlQueue
+    Raises CrawlerException if the crawler worker class cw has background_downloads set and its items can't keep
+    the download futures: in crawler processes or when db_queue serializes items (eg. SQLiteQueue, RemoteQueue)
+    """
+    if not getattr(cw, 'background_downloads', False):
+        return
+    backend = db_queue.get_queue if isinstance(db_queue, BaseQueue) else db_queue
+    if processes or not isinstance(backend, (Queue, ShardedQueue)):
+        raise CrawlerException(
+            f"{cw.__name__}: background_downloads need an in-memory DatabaseQueue in this process, "
+            f"download futures can't be sent to other processes or serialized!"
+        )
+
+
+def get_start_urls(worker) -> List[str]:
+    """
+    Returns the start_urls of a url downloader worker (class or instance), or its start_url as a list
+    """
+    if worker.start_urls:
+        return list(worker.start_urls)
+    if worker.start_url is None:
+        raise CrawlerException(f"{worker.__name__ if isinstance(worker, type) else worker.__class__.__name__}: "
+                               f"start_url attribute is not defined!")
+    return [worker.start_url]
+
+
+class UrlDownloaderWorker(BaseCrawlerWorker, UrlDownloaderMixin):
+    """
+    Resonsible for downloading item(s) to be scraped urls and enqueue(s) them in ItemUrlQueue.
+    job is called for each of its start urls, WorkersManager.start spreads start_urls over its downloaders.
     """
-    start_url: str = None
     url_queue: ItemUrlQueue = ItemUrlQueue()
-    urls_scraped = 1
-    max_url_download = -1
 
     def __init_subclass__(cls, **kwargs):
-        cls._manager.register_worker('uw', cls)
+        super().__init_subclass__(**kwargs)
+        cls._manager.register_worker('uw', cls, cls.spider)
 
-    def __init__(self, driver: WebDriver, *args, **kwargs):
+    def __init__(self, driver: Optional[WebDriver] = None, *args, start_urls: Optional[List[str]] = None, **kwargs):
+        self._init_start_urls(start_urls)
         super().__init__(driver, *args, **kwargs)
 
-        if self.start_url is None:
-            raise CrawlerException(f"{self.__class__.__name__}: start_url attribute is not defined!")
-
     def follow(self, xpath=None, url=None, callback=None, *cbargs, **cbkwargs):
-        if self.max_url_download > 0:
-            if self.urls_scraped > self.max_url_download:
-                return
-
-        with self.mutex:
-            self.urls_scraped += 1
-
+        if not self._count_follow():
+            return
         return super().follow(xpath=xpath, url=url, callback=callback, *cbargs, **cbkwargs)
 
     @abstractmethod
@@ -202,14 +865,18 @@ class UrlDownloaderWorker(BaseCrawlerWorker, metaclass=SingletonMeta):
         pass
 
     def run(self):
-        try:
-            self.driver.get(self.start_url)
-            self.pre_job()
-            self.job()
-        except WebDriverException as e:
-            self.log.exception(e)
-        finally:
-            self.kill()
+        with self.running():
+            try:
+                for first, url in self._iter_start_urls():
+                    try:
+                        self.load(url)
+                        if first:
+                            self.pre_job()
+                        self.job()
+                    except WebDriverException as e:
+                        self._start_url_failed(e)
+            finally:
+                self.kill()
 
 
 class CrawlerWorker(BaseCrawlerWorker):
@@ -217,51 +884,205 @@ class CrawlerWorker(BaseCrawlerWorker):
     Fetches item web pages and scrapes or extract data and enqueues the data in DatabaseQueue
     """
     url_wait_timeout: Optional[int] = 10
+    background_downloads: bool = False
+    page_cache: Optional[PageCache] = None
     url_queue: ItemUrlQueue = ItemUrlQueue()
     db_queue: DatabaseQueue = DatabaseQueue()
 
-    def __init_subclass__(cls, **kwargs):
-        cls._manager.register_worker('cw', cls)
+    def __init_subclass__(cls, register=True, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if register:
+            cls._manager.register_worker('cw', cls, cls.spider)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._browser = None
+
+    @property
+    def from_cache(self) -> bool:
+        """
+        True while the page at hand is served from page_cache
+        """
+        return self._browser is not None
+
+    def load(self, url: str):
+        """
+        Loads url, from page_cache if it is set and holds the page: self.driver is then replaced with an
+        HttpDriver over the cached page source until the url is parsed. Pages loaded by the driver are cached.
+        """
+        if self.page_cache is None:
+            return super().load(url)
+        with self.phase('load'):
+            page = self.page_cache.get(url)
+        if page is not None:
+            with self.phase('load'):
+                if self._browser is None:
+                    self._browser, self.driver = self.driver, HttpDriver()
+                self.driver.load(url, page)
+            page_fetched.send(type(self), self, url)
+            return
+        self._restore_driver()
+        super().load(url)
+        self.page_cache.set(url, self.driver.page_source)
+
+    def _restore_driver(self):
+        if self._browser is not None:
+            self.driver, self._browser = self._browser, None
+
+    def process_item(self, callback, item):
+        if self.page_cache is None and self.profiler is None:
+            return super().process_item(callback, item)
+
+        def parse(url):
+            try:
+                if self.profiler is None:
+                    return callback(url)
+                with self.profiler.page(url):
+                    callback(url)
+            finally:
+                self._restore_driver()
+
+        super().process_item(parse, item)
+
+    def wait(self, xpath, secs=5, condition=None, action=None):
+        if self.from_cache:
+            with self.phase('wait'):
+                return self.driver.wait(xpath)
+        super().wait(xpath, secs, condition, action)
+
+    def extract(self, fields: Fields, rows: Optional[str] = None) -> List[dict]:
+        if self.from_cache:
+            with self.phase('extract'):
+                return self.driver.extract(fields, rows)
+        return super().extract(fields, rows)
 
     def download_image(self, url, save_path):
-        return download_image(url, save_path, self.mutex)
+        with self.phase('download'):
+            if self.background_downloads:
+                return submit_download(url, save_path)
+            return download_image(url, save_path)
 
     def download_file(self, url, save_path):
-        return download(url, save_path)
+        with self.phase('download'):
+            if self.background_downloads:
+                return submit_download(url, save_path)
+            return download(url, save_path)
 
     def job(self):
+        db_queue, self.db_queue = self.db_queue, ScrapedItems(self, self.db_queue)
         try:
-            url = self.url_queue.get(timeout=self.url_wait_timeout)
-            self.parse(url)
-            self.url_queue.task_done()
-            return self.job()
-        except Empty:
-            pass
+            self.consume(self.url_queue, self.url_wait_timeout, self.parse)
+        finally:
+            self.db_queue = db_queue
 
     @abstractmethod
     def parse(self, url: str) -> None:
         pass
 
 
-class DatabaseWorker(BaseWorker, metaclass=SingletonMeta):
+class HttpCrawlerWorker(CrawlerWorker, register=False):
+    """
+    CrawlerWorker for static pages that don't need a browser: self.driver is an HttpDriver which
+    fetches pages over the shared pooled http session and parses them with lxml, offering the same
+    find_element(s)_by_xpath calls as a selenium webdriver. Requires lxml.
+    Failed requests (connection errors, timeouts, error statuses) are logged and the worker moves on.
+    """
+    uses_browser = False
+    driver_exceptions = (RequestException,)
+
+    def __init__(self, driver: Optional[HttpDriver] = None, *args, pool: Optional[DriverPool] = None, **kwargs):
+        # pages are fetched over the shared http session, there are no drivers to lease from pool
+        super().__init__(HttpDriver() if driver is None else driver, *args, **kwargs)
+
+    def wait(self, xpath, secs=5, condition=None, action=None):
+        with self.phase('wait'):
+            self.driver.wait(xpath)
+
+    def extract(self, fields: Fields, rows: Optional[str] = None) -> List[dict]:
+        with self.phase('extract'):
+            return self.driver.extract(fields, rows)
+
+    def follow(self, xpath=None, url=None, callback=None, *cbargs, **cbkwargs):
+        if xpath is not None and url is None:
+            xpath, url = None, self.driver.find_element_by_xpath(xpath).get_attribute('href')
+        return super().follow(xpath=xpath, url=url, callback=callback, *cbargs, **cbkwargs)
+
+
+class DatabaseWorker(BaseWorker, DatabaseMixin):
     """
-    Receives scraped data from DatabaseQueue and stores it in a persistent database
+    Receives scraped data from DatabaseQueue and stores it in a persistent database.
+    Several database workers can run, see WorkersManager.start(writers=...). When shard_key, the name
+    of an item field or a callable returning the key of an item, is set, items with the same key are
+    always saved by the same worker, eg. to keep updates of a record in order.
     """
     data_wait_timeout: Optional[int] = 10
+    shard_key: Optional[Union[str, Callable[[dict], Any]]] = None
+    batch_size: Optional[int] = None
+    batch_wait_timeout: Optional[float] = 1
     db_queue: DatabaseQueue = DatabaseQueue()
 
     def __init_subclass__(cls, **kwargs):
-        cls._manager.register_worker('dw', cls)
+        super().__init_subclass__(**kwargs)
+        cls._manager.register_worker('dw', cls, cls.spider)
 
     @abstractmethod
     def save(self, data: dict) -> None:
         pass
 
-    def job(self):
-        try:
-            data = self.db_queue.get(timeout=self.data_wait_timeout)
+    def resolve(self, data: dict) -> dict:
+        """
+        Waits for the background downloads (futures) referenced by data and replaces them with
+        their file paths, failed downloads are logged and replaced with None
+        """
+        return self._set_downloads(data, self._download_futures(data))
+
+    def save_many(self, batch: list) -> None:
+        """
+        Called with a list of items instead of save when batch_size is set.
+        Override this method to store the whole batch at once, eg. in a single transaction.
+        """
+        for data in batch:
             self.save(data)
-            self.db_queue.task_done()
-            return self.job()
-        except Empty:
-            pass
+
+    def get_batch(self) -> list:
+        """
+        Waits up to data_wait_timeout for the first item, then drains the queue until
+        batch_size items are collected or it is empty once batch_wait_timeout seconds
+        (None for no wait) have passed.
+        """
+        batch = [self.next_item(self.db_queue, self.data_wait_timeout)]
+        deadline = monotonic() + (self.batch_wait_timeout or 0)
+        while len(batch) < self.batch_size:
+            remaining = deadline - monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.db_queue.get(timeout=remaining))
+                else:
+                    batch.append(self.db_queue.get(block=False))
+            except Empty:
+                break
+        return batch
+
+    def batch_job(self):
+        while True:
+            try:
+                batch = self.get_batch()
+            except Empty:
+                return
+            try:
+                with self.phase('save'):
+                    self.process_item(self.save_many, [self.resolve(data) for data in batch], len(batch))
+                self._saved(batch)
+            finally:
+                for _ in batch:
+                    self.db_queue.task_done()
+
+    def job(self):
+        if self.batch_size:
+            return self.batch_job()
+        self.consume(self.db_queue, self.data_wait_timeout, self._save)
+
+    def _save(self, data):
+        with self.phase('save', data.get('url')):
+            self.save(self.resolve(data))
+        self._saved([data])
@@ -21,7 +21,6 @@ with open('README.md', 'r', encoding='utf-8') as f:
 
 install_requires = [
     'selenium>=3.141.0',
-    'wget==3.2',
     'requests==2.26.0',
     'raccy-orm==0.0.1',
     'raccy-utils==0.1.1'
@@ -55,5 +54,9 @@ setuptools.setup(
     ],
     packages=setuptools.find_packages(include=include),
     install_requires=install_requires,
+    extras_require={
+        'http': ['lxml'],
+        'psutil': ['psutil'],
+    },
     python_requires=">=3.7",
 )
@@ -2,14 +2,33 @@ import unittest
 from random import randint
 import os
 import sys
+import tempfile
+from queue import Queue, Empty, Full
+from time import monotonic, sleep
+from threading import Thread
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import requests
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
 
-from raccy import DatabaseQueue, ItemUrlQueue
-from raccy.core.exceptions import QueueError, SignalException
+from raccy import DatabaseQueue, ItemUrlQueue, MemoryUrlFilter, BloomUrlFilter, SQLiteQueue, DomainScheduler
+from raccy.core.filters import canonicalize_url
+from raccy.core.queue_ import high_watermark, low_watermark
+from raccy.core.backends import SpillQueue
+from raccy.core.cache import PageCache
+from raccy.core.frontier import Frontier
+from raccy.core.exceptions import QueueError, SignalException, ImproperlyConfigured
 from raccy.core.utils import abstractmethod
 from raccy.core.signals import receiver, Signal
+from raccy.core.profiling import PageProfiler
+from raccy.core.broker import QueueBroker, RemoteQueue
+from raccy.core.metrics import MetricsRegistry, MetricsReporter, start_http_server, QUEUE_PUT, QUEUE_SIZE
+from raccy.utils.downloader import Downloader
+from raccy.utils.files import get_filename
+from raccy.utils.profiles import ResourceProfile, TEXT_ONLY
 
 
 class BaseTestClass(unittest.TestCase):
@@ -66,6 +85,18 @@ class TestQueueModule(BaseTestClass):
         with self.assertRaises(QueueError):
             self.ds1.put('item')
 
+    def test_named_queues(self):
+        shop = ItemUrlQueue.named('shop')
+        self.assertIs(shop, ItemUrlQueue.named('shop'))
+        self.assertIsNot(shop, ItemUrlQueue())
+        self.assertIsNot(shop, ItemUrlQueue.named('blog'))
+        self.assertIsNot(DatabaseQueue.named('shop'), shop)
+        shop.put('https://shop.example.com/')
+        self.assertEqual(shop.qsize(), 1)
+        self.assertEqual(QUEUE_SIZE.value(queue='ItemUrlQueue[shop]'), 1)
+        self.assertEqual(shop.get(), 'https://shop.example.com/')
+        shop.task_done()
+
     def test_different_subclass_instance(self):
         for _ in range(2):
             v = dict(rand=randint(5, 100))
@@ -89,6 +120,454 @@ class TestQueueModule(BaseTestClass):
         self.assertNotEqual(self.ds2.queue(), self.is1.queue())
         self.assertNotEqual(self.ds2.queue(), self.is2.queue())
 
+    def swap_queue(self, queue, backend):
+        self.addCleanup(queue.set_queue, queue.get_queue)
+        queue.set_queue(backend)
+
+    def test_bounded_queue(self):
+        self.swap_queue(self.is1, Queue())
+        self.is1.set_maxsize(2)
+        self.is1.put('https://example.com/1')
+        self.is1.put('https://example.com/2')
+        with self.assertRaises(Full):
+            self.is1.put('https://example.com/3', timeout=0.01)
+        with self.assertRaises(Full):
+            self.is1.put('https://example.com/4', block=False)
+
+        putter = Thread(target=self.is1.put, args=('https://example.com/5',))
+        putter.start()
+        putter.join(0.05)
+        self.assertTrue(putter.is_alive())
+        self.is1.get()
+        putter.join(1)
+        self.assertFalse(putter.is_alive())
+        self.assertEqual(list(self.is1.queue()), ['https://example.com/2', 'https://example.com/5'])
+
+    def test_watermark_signals(self):
+        self.swap_queue(self.ds1, Queue())
+        self.addCleanup(self.ds1.set_watermarks, None)
+        self.ds1.set_watermarks(high=10, low=3)
+        events = []
+
+        def high(queue, size):
+            events.append(('high', size))
+
+        def low(queue, size):
+            events.append(('low', size))
+
+        receiver(high_watermark, self.ds1)(high)
+        receiver(low_watermark, self.ds1)(low)
+        self.addCleanup(high_watermark.remove_dispatch, self.ds1, high)
+        self.addCleanup(low_watermark.remove_dispatch, self.ds1, low)
+        for i in range(15):
+            self.ds1.put({'i': i})
+        for _ in range(14):
+            self.ds1.get()
+        self.ds1.put({'i': 15})
+        self.assertEqual(events, [('high', 10), ('low', 3)])
+
+
+class TestFiltersModule(BaseTestClass):
+
+    def test_canonicalize_url(self):
+        self.assertEqual(
+            canonicalize_url('HTTPS://Example.com:443/items?page=2&cat=shoes#reviews'),
+            'https://example.com/items?cat=shoes&page=2'
+        )
+        self.assertEqual(canonicalize_url('http://example.com'), 'http://example.com/')
+        self.assertEqual(canonicalize_url('http://example.com:8080/a'), 'http://example.com:8080/a')
+
+    def test_memory_filter(self):
+        f = MemoryUrlFilter()
+        self.assertFalse(f.seen('https://example.com/item?b=1&a=2'))
+        self.assertTrue(f.seen('https://example.com/item?a=2&b=1#top'))
+        self.assertFalse(f.seen('https://example.com/item?a=3&b=1'))
+        self.assertEqual(len(f), 2)
+
+    def test_bloom_filter_snapshot(self):
+        path = os.path.join(tempfile.mkdtemp(), 'urls.bloom')
+        f = BloomUrlFilter(capacity=10_000, error_rate=0.001, path=path)
+        urls = [f'https://example.com/item/{i}' for i in range(5000)]
+        self.assertFalse(any(f.seen(url) for url in urls))
+        self.assertTrue(all(f.seen(url) for url in urls))
+        f.save()
+
+        f = BloomUrlFilter(path=path)
+        self.assertTrue(all(f.seen(url) for url in urls))
+        false_positives = sum(f.seen(f'https://example.com/other/{i}') for i in range(5000))
+        self.assertLess(false_positives, 25)
+
+    def test_item_url_queue_drops_duplicates(self):
+        queue = ItemUrlQueue()
+        self.addCleanup(queue.set_filter, None)
+        queue.set_filter(MemoryUrlFilter())
+        size = queue.qsize()
+        self.assertTrue(queue.put('https://example.com/page/1'))
+        self.assertFalse(queue.put('https://example.com/page/1#top'))
+        self.assertEqual(queue.qsize(), size + 1)
+        queue.get()
+        queue.task_done()
+
+    def test_url_rejected_by_a_full_queue_can_be_retried(self):
+        queue = ItemUrlQueue()
+        self.addCleanup(queue.set_queue, queue.get_queue)
+        self.addCleanup(queue.set_filter, None)
+        queue.set_queue(Queue(maxsize=1))
+        queue.set_filter(MemoryUrlFilter())
+        self.assertTrue(queue.put('https://example.com/1'))
+        with self.assertRaises(Full):
+            queue.put('https://example.com/2', timeout=0.01)
+        queue.get()
+        queue.task_done()
+        self.assertTrue(queue.put('https://example.com/2'))
+        self.assertFalse(queue.put('https://example.com/2'))
+
+
+class TestBackendsModule(BaseTestClass):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'queue.sqlite3')
+
+    def test_sqlite_queue_fifo(self):
+        q = SQLiteQueue(self.path)
+        for i in range(100):
+            q.put({'item': i})
+        self.assertEqual(q.qsize(), 100)
+        self.assertEqual([q.get()['item'] for _ in range(100)], list(range(100)))
+        self.assertTrue(q.empty())
+        for _ in range(100):
+            q.task_done()
+        q.join()
+        with self.assertRaises(Empty):
+            q.get(timeout=0.01)
+        q.close()
+
+    def test_sqlite_queue_redelivers_unacked_items(self):
+        q = SQLiteQueue(self.path, table='urls')
+        for i in range(5):
+            q.put(f'https://example.com/{i}')
+        q.get()
+        q.task_done()
+        q.get()
+        q.close()
+
+        q = SQLiteQueue(self.path, table='urls')
+        self.assertEqual(q.qsize(), 4)
+        self.assertEqual(q.unfinished_tasks, 4)
+        self.assertEqual(q.get(), 'https://example.com/1')
+        self.assertEqual(q.queue, [f'https://example.com/{i}' for i in range(2, 5)])
+        q.close()
+
+    def test_sqlite_queue_maxsize(self):
+        q = SQLiteQueue(self.path, maxsize=2)
+        q.put(1)
+        q.put(2)
+        self.assertTrue(q.full())
+        with self.assertRaises(Full):
+            q.put(3, timeout=0.01)
+        q.close()
+
+    def test_database_queue_backend(self):
+        queue = DatabaseQueue()
+        memory_queue = queue.get_queue
+        self.addCleanup(queue.set_queue, memory_queue)
+        queue.set_queue(SQLiteQueue(self.path))
+        queue.put({'item': 1})
+        with self.assertRaises(QueueError):
+            queue.put('item')
+        self.assertEqual(queue.queue(), [{'item': 1}])
+        self.assertEqual(queue.get(), {'item': 1})
+        queue.task_done()
+        queue.get_queue.close()
+
+    def test_spill_queue(self):
+        q = SpillQueue(memory_size=10)
+        for i in range(35):
+            q.put(i)
+        self.assertEqual(q.qsize(), 35)
+        self.assertEqual(q.spilled, 25)
+        self.assertEqual(q.queue, list(range(35)))
+        self.assertEqual([q.get() for _ in range(20)], list(range(20)))
+        for i in range(35, 40):
+            q.put(i)
+        self.assertLessEqual(len(q._memory), 10)
+        self.assertEqual([q.get() for _ in range(20)], list(range(20, 40)))
+        self.assertTrue(q.empty())
+        q.close()
+        self.assertFalse(os.path.exists(q.path))
+
+    def test_spill_queue_keeps_path(self):
+        q = SpillQueue(memory_size=0, path=self.path)
+        q.put({'item': 1})
+        self.assertEqual(q.spilled, 1)
+        self.assertEqual(q.get(), {'item': 1})
+        q.close()
+        self.assertTrue(os.path.exists(self.path))
+
+
+class TestFrontierModule(BaseTestClass):
+
+    def test_priorities_and_host_fairness(self):
+        frontier = Frontier()
+        for i in range(3):
+            frontier.put(f'https://slow.com/list/{i}')
+        for i in range(2):
+            frontier.put(f'https://fast.com/list/{i}')
+        frontier.put('https://slow.com/product/1', priority=10)
+        frontier.put('https://fast.com/product/1', priority=10)
+        self.assertEqual(frontier.qsize(), 7)
+        self.assertEqual(frontier.queue[:2], ['https://slow.com/product/1', 'https://fast.com/product/1'])
+        self.assertEqual(
+            [frontier.get() for _ in range(7)],
+            [
+                'https://slow.com/product/1', 'https://fast.com/product/1',
+                'https://slow.com/list/0', 'https://fast.com/list/0',
+                'https://slow.com/list/1', 'https://fast.com/list/1', 'https://slow.com/list/2',
+            ]
+        )
+        with self.assertRaises(Empty):
+            frontier.get(block=False)
+
+    def test_depth(self):
+        frontier = Frontier(max_depth=1)
+        self.assertTrue(frontier.put('https://example.com/', depth=0))
+        self.assertTrue(frontier.put('https://example.com/a', depth=1))
+        self.assertFalse(frontier.put('https://example.com/a/b', depth=2))
+        self.assertEqual((frontier.qsize(), frontier.dropped), (2, 1))
+
+        depths = []
+        frontier.get()
+        other = Thread(target=lambda: (frontier.get(), depths.append(frontier.current_depth())))
+        other.start()
+        other.join()
+        self.assertEqual((frontier.current_depth(), depths), (0, [1]))
+
+    def test_item_url_queue_backend(self):
+        queue = ItemUrlQueue()
+        self.addCleanup(queue.set_queue, queue.get_queue)
+        queue.set_queue(Frontier(max_depth=2))
+        self.assertTrue(queue.put('https://example.com/', priority=1, depth=2))
+        self.assertFalse(queue.put('https://example.com/deep', depth=3))
+        self.assertEqual(queue.get(), 'https://example.com/')
+        self.assertEqual(queue.current_depth(), 2)
+        queue.task_done()
+
+    def test_url_dropped_for_depth_can_be_put_again(self):
+        queue = ItemUrlQueue()
+        self.addCleanup(queue.set_queue, queue.get_queue)
+        self.addCleanup(queue.set_filter, None)
+        queue.set_queue(Frontier(max_depth=1))
+        queue.set_filter(MemoryUrlFilter())
+        self.assertFalse(queue.put('https://example.com/a', depth=5))
+        self.assertTrue(queue.put('https://example.com/a', depth=0))
+        self.assertFalse(queue.put('https://example.com/a', depth=0))
+        self.assertEqual(queue.get(), 'https://example.com/a')
+        queue.task_done()
+
+
+class TestCacheModule(BaseTestClass):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'pages.sqlite3')
+
+    def test_get_and_set(self):
+        cache = PageCache(self.path)
+        self.assertIsNone(cache.get('https://example.com/item?id=1&ref=home'))
+        html = '<html><body>' + 'Gh\u20b5 1,200 ' * 1000 + '</body></html>'
+        cache.set('https://example.com/item?id=1&ref=home', html)
+        self.assertEqual(cache.get('HTTPS://EXAMPLE.COM/item?ref=home&id=1#reviews'), html)
+        self.assertIn('https://example.com/item?ref=home&id=1', cache)
+        self.assertLess(cache.size, len(html) // 10)
+        cache.close()
+
+        cache = PageCache(self.path)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get('https://example.com/item?id=1&ref=home'), html)
+        cache.delete('https://example.com/item?id=1&ref=home')
+        self.assertEqual((len(cache), cache.size), (0, 0))
+        cache.close()
+
+    def test_ttl(self):
+        cache = PageCache(self.path, ttl=0.05)
+        cache.set('https://example.com/', '<html></html>')
+        self.assertEqual(cache.get('https://example.com/'), '<html></html>')
+        sleep(0.1)
+        self.assertNotIn('https://example.com/', cache)
+        self.assertIsNone(cache.get('https://example.com/'))
+        self.assertEqual(len(cache), 0)
+        cache.close()
+
+    def test_lru_eviction(self):
+        pages = {f'https://example.com/{i}': os.urandom(500).hex() for i in range(4)}
+        cache = PageCache(self.path, max_size=1800)
+        for url in list(pages)[:2]:
+            cache.set(url, pages[url])
+            sleep(0.01)
+        cache.get('https://example.com/0')
+        for url in list(pages)[2:]:
+            sleep(0.01)
+            cache.set(url, pages[url])
+        self.assertLessEqual(cache.size, 1800)
+        self.assertIn('https://example.com/0', cache)
+        self.assertNotIn('https://example.com/1', cache)
+        self.assertIn('https://example.com/3', cache)
+        cache.close()
+
+
+class TestSchedulerModule(BaseTestClass):
+
+    def test_round_robin_across_domains(self):
+        q = DomainScheduler(rate=1000, burst=10, concurrency=10)
+        for i in range(3):
+            q.put(f'https://a.com/{i}')
+        q.put('https://b.com/0')
+        q.put('https://c.com/0')
+        urls = [q.get(block=False) for _ in range(5)]
+        self.assertEqual(
+            urls,
+            ['https://a.com/0', 'https://b.com/0', 'https://c.com/0', 'https://a.com/1', 'https://a.com/2']
+        )
+
+    def test_domain_concurrency(self):
+        q = DomainScheduler(rate=1000, burst=10, concurrency=1)
+        q.put('https://a.com/0')
+        q.put('https://a.com/1')
+        q.put('https://b.com/0')
+        self.assertEqual(q.get(block=False), 'https://a.com/0')
+        self.assertEqual(q.get(block=False), 'https://b.com/0')
+        with self.assertRaises(Empty):
+            q.get(timeout=0.05)
+        q.task_done()
+        self.assertEqual(q.get(block=False), 'https://a.com/1')
+
+    def test_domain_rate(self):
+        q = DomainScheduler(rate=20, concurrency=10)
+        q.set_limit('b.com', rate=1000, burst=5)
+        for i in range(3):
+            q.put(f'https://a.com/{i}')
+            q.put(f'https://b.com/{i}')
+        self.assertEqual(q.get(block=False), 'https://a.com/0')
+        self.assertEqual([q.get(block=False) for _ in range(3)], [f'https://b.com/{i}' for i in range(3)])
+        with self.assertRaises(Empty):
+            q.get(block=False)
+        start = monotonic()
+        self.assertEqual(q.get(timeout=1), 'https://a.com/1')
+        self.assertGreater(monotonic() - start, 0.03)
+
+
+class TestBrokerModule(BaseTestClass):
+
+    def setUp(self):
+        self.broker = QueueBroker(port=0, token='secret').start()
+        self.addCleanup(self.broker.shutdown)
+        self.host, self.port = self.broker.address
+
+    def remote_queue(self, name='urls', **kwargs):
+        q = RemoteQueue(self.host, self.port, name, token='secret', **kwargs)
+        self.addCleanup(q.close)
+        return q
+
+    def test_shared_queue(self):
+        producer, consumer = self.remote_queue(), self.remote_queue()
+        for i in range(10):
+            producer.put(f'https://example.com/{i}')
+        producer.put({'url': 'https://example.com/', 'price': 1.5})
+        self.assertEqual(consumer.qsize(), 11)
+        self.assertEqual([consumer.get() for _ in range(10)], [f'https://example.com/{i}' for i in range(10)])
+        self.assertEqual(consumer.get(timeout=1), {'url': 'https://example.com/', 'price': 1.5})
+        with self.assertRaises(Empty):
+            consumer.get(timeout=0.05)
+        self.assertEqual(producer.unfinished_tasks, 11)
+        for _ in range(11):
+            consumer.task_done()
+        producer.join()
+
+    def test_redelivers_items_of_dead_nodes(self):
+        node = self.remote_queue(lease_timeout=0.2)
+        node.put('https://example.com/1')
+        self.assertEqual(node.get(), 'https://example.com/1')
+        node.close()
+
+        other = self.remote_queue(lease_timeout=0.2)
+        self.assertEqual(other.get(timeout=2), 'https://example.com/1')
+        other.task_done()
+        self.assertEqual(other.unfinished_tasks, 0)
+
+    def test_leases_are_renewed_while_processing(self):
+        node = self.remote_queue(lease_timeout=0.3)
+        node.put('https://example.com/1')
+        node.get()
+        other = self.remote_queue()
+        with self.assertRaises(Empty):
+            other.get(timeout=0.8)
+        node.task_done()
+
+    def test_invalid_token(self):
+        q = RemoteQueue(self.host, self.port, 'urls', token='wrong')
+        self.addCleanup(q.close)
+        with self.assertRaises(QueueError):
+            q.put('https://example.com/')
+
+
+class TestMetricsModule(BaseTestClass):
+
+    def test_prometheus_text_format(self):
+        registry = MetricsRegistry()
+        pages = registry.counter('pages_total', 'Pages crawled')
+        pages.inc(worker='Cw')
+        pages.inc(2, worker='Cw')
+        registry.gauge('queue_size', 'Queue size').set_function(lambda: 7, queue='ItemUrlQueue')
+        latency = registry.histogram('parse_seconds', 'Parse time', buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            latency.observe(value, worker='Cw')
+
+        self.assertEqual(pages.value(worker='Cw'), 3)
+        self.assertIs(registry.counter('pages_total'), pages)
+        self.assertEqual(
+            registry.expose().splitlines(),
+            [
+                '# HELP pages_total Pages crawled',
+                '# TYPE pages_total counter',
+                'pages_total{worker="Cw"} 3',
+                '# HELP queue_size Queue size',
+                '# TYPE queue_size gauge',
+                'queue_size{queue="ItemUrlQueue"} 7',
+                '# HELP parse_seconds Parse time',
+                '# TYPE parse_seconds histogram',
+                'parse_seconds_bucket{worker="Cw",le="0.1"} 1',
+                'parse_seconds_bucket{worker="Cw",le="1"} 2',
+                'parse_seconds_bucket{worker="Cw",le="+Inf"} 3',
+                'parse_seconds_sum{worker="Cw"} 5.55',
+                'parse_seconds_count{worker="Cw"} 3',
+            ]
+        )
+
+    def test_http_endpoint(self):
+        registry = MetricsRegistry()
+        registry.counter('pages_total', 'Pages crawled').inc()
+        server = start_http_server(0, registry=registry)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        response = requests.get(f'http://127.0.0.1:{server.server_address[1]}/metrics')
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('pages_total 1', response.text)
+
+    def test_queues_are_instrumented(self):
+        q = ItemUrlQueue()
+        puts = QUEUE_PUT.value(queue='ItemUrlQueue')
+        q.put('https://example.com/metrics')
+        self.assertEqual(QUEUE_PUT.value(queue='ItemUrlQueue'), puts + 1)
+        self.assertEqual(QUEUE_SIZE.value(queue='ItemUrlQueue'), q.qsize())
+        self.assertIn(f'ItemUrlQueue {q.qsize()}', MetricsReporter().summary())
+
+    def test_reporter_reads_its_registry(self):
+        registry = MetricsRegistry()
+        reporter = MetricsReporter(registry=registry)
+        registry.counter('raccy_items_processed_total').inc(4, worker='OtherCrawler')
+        registry.gauge('raccy_queue_size').set(2, queue='OtherQueue')
+        summary = reporter.summary()
+        self.assertRegex(summary, r'^metrics: OtherCrawler [0-9.]+/s 0.000s avg 0 errors \| OtherQueue 2$')
+
 
 class TestUtilsModule(BaseTestClass):
 
@@ -104,6 +583,165 @@ class TestUtilsModule(BaseTestClass):
             f.bar()
 
 
+class TestProfilesModule(BaseTestClass):
+
+    def test_blocked_urls(self):
+        profile = ResourceProfile(block=('stylesheet', 'font'), patterns=('*/ads/*',))
+        self.assertEqual(profile.blocked_urls, [
+            '*.css', '*.css?*', '*.woff', '*.woff?*', '*.woff2', '*.woff2?*', '*.ttf', '*.ttf?*',
+            '*.otf', '*.otf?*', '*.eot', '*.eot?*', '*/ads/*'
+        ])
+        self.assertIn('*doubleclick.net*', TEXT_ONLY.blocked_urls)
+        with self.assertRaises(ImproperlyConfigured):
+            ResourceProfile(block=('script',))
+        with self.assertRaises(ImproperlyConfigured):
+            ResourceProfile(page_load_strategy='fast')
+
+    def test_urls_with_query_strings_are_blocked(self):
+        profile = ResourceProfile(block=('image', 'stylesheet'))
+        self.assertTrue(profile.blocks('https://cdn.example.com/img/logo.png'))
+        self.assertTrue(profile.blocks('https://cdn.example.com/img/logo.png?v=3&w=200'))
+        self.assertTrue(profile.blocks('https://example.com/static/site.css?v=1.2'))
+        self.assertFalse(profile.blocks('https://example.com/products/png-converter'))
+        self.assertFalse(profile.blocks('https://example.com/logo.pngx'))
+        self.assertFalse(profile.blocks('https://example.com/search?q=logo'))
+
+    def test_driver_options(self):
+        options = TEXT_ONLY.chrome_options()
+        self.assertEqual(options.to_capabilities()['pageLoadStrategy'], 'eager')
+        self.assertEqual(options.experimental_options['prefs'], {'profile.managed_default_content_settings.images': 2})
+        self.assertIn('--blink-settings=imagesEnabled=false', options.arguments)
+
+        options = ResourceProfile(page_load_strategy='none').firefox_options()
+        self.assertEqual(options.to_capabilities()['pageLoadStrategy'], 'none')
+        self.assertNotIn('permissions.default.image', options.preferences)
+
+
+class TestFilesModule(BaseTestClass):
+
+    def test_unique_filenames_across_threads(self):
+        save_path = tempfile.mkdtemp()
+        paths = []
+
+        def allocate():
+            for _ in range(50):
+                paths.append(get_filename('https://example.com/img/image.jpg?size=large', save_path))
+
+        threads = [Thread(target=allocate) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(paths)), 400)
+        self.assertEqual(len(os.listdir(save_path)), 400)
+        self.assertIn(os.path.join(save_path, 'image(399).jpg'), paths)
+
+    def test_filenames_without_extension(self):
+        save_path = tempfile.mkdtemp()
+        self.assertEqual(get_filename('https://example.com/files/report', save_path), os.path.join(save_path, 'report'))
+        self.assertEqual(get_filename('https://example.com/files/report', save_path), os.path.join(save_path, 'report(1)'))
+        self.assertEqual(get_filename('https://example.com/', save_path), os.path.join(save_path, 'download'))
+
+
+class TestDownloaderModule(BaseTestClass):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.site = tempfile.mkdtemp()
+        with open(os.path.join(cls.site, 'image.jpg'), 'wb') as f:
+            f.write(os.urandom(300 * 1024))
+        handler = partial(QuietHandler, directory=cls.site)
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_streams_to_unique_paths(self):
+        save_path = tempfile.mkdtemp()
+        downloader = Downloader(retries=0)
+        paths = [downloader.download(f'{self.base_url}/image.jpg', save_path) for _ in range(3)]
+        self.assertEqual(len(set(paths)), 3)
+        with open(os.path.join(self.site, 'image.jpg'), 'rb') as f:
+            content = f.read()
+        for path in paths:
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), content)
+        self.assertEqual(sorted(os.listdir(save_path)), ['image(1).jpg', 'image(2).jpg', 'image.jpg'])
+        downloader.close()
+
+    def test_background_downloads(self):
+        save_path = tempfile.mkdtemp()
+        downloader = Downloader(retries=0, workers=4)
+        futures = [downloader.submit(f'{self.base_url}/image.jpg', save_path) for _ in range(8)]
+        paths = {future.result() for future in futures}
+        self.assertEqual(len(paths), 8)
+        self.assertTrue(all(os.path.isfile(path) for path in paths))
+        downloader.close()
+
+    def test_failed_download_leaves_no_file(self):
+        save_path = tempfile.mkdtemp()
+        downloader = Downloader(retries=0)
+        with self.assertRaises(requests.HTTPError):
+            downloader.download(f'{self.base_url}/missing.jpg', save_path)
+        self.assertEqual(os.listdir(save_path), [])
+        downloader.close()
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class TestProfilingModule(BaseTestClass):
+
+    def test_page_breakdown(self):
+        profiler = PageProfiler()
+        with profiler.page('https://example.com/1') as record:
+            with profiler.phase('load'):
+                with profiler.phase('wait'):
+                    sleep(0.02)
+            with profiler.phase('extract'):
+                sleep(0.01)
+            sleep(0.01)
+        with profiler.phase('save', 'https://example.com/1'):
+            sleep(0.01)
+
+        self.assertEqual(set(record.phases), {'load', 'extract', 'save'})
+        self.assertGreaterEqual(record.phases['load'], 0.02)
+        self.assertGreaterEqual(record.breakdown['parse'], 0.01)
+        self.assertLess(record.breakdown['parse'], record.total)
+        self.assertEqual(profiler.pages, 1)
+        self.assertIsNone(record.profile)
+
+    def test_slowest_pages_and_report(self):
+        profiler = PageProfiler(sample_rate=1, top=2)
+        for i, seconds in enumerate((0.01, 0.03, 0.02)):
+            with profiler.page(f'https://example.com/{i}'):
+                with profiler.phase('load'):
+                    sleep(seconds)
+        self.assertEqual([r.url for r in profiler.slowest()], ['https://example.com/1', 'https://example.com/2'])
+        self.assertEqual((profiler.pages, profiler.sampled), (3, 3))
+        self.assertIn('sleep', profiler.slowest()[0].profile)
+
+        path = os.path.join(tempfile.mkdtemp(), 'slow.txt')
+        report = profiler.report(path)
+        with open(path) as f:
+            self.assertEqual(f.read(), report)
+        self.assertIn('3 pages, 3 profiled', report)
+        self.assertIn('https://example.com/1', report)
+        self.assertNotIn('https://example.com/0 ', report)
+        self.assertIn('profile of the sampled pages', report)
+        # the merged statistics are formatted from a copy
+        self.assertTrue(any(os.sep in filename for filename, _, _ in profiler._stats.stats))
+        self.assertIs(profiler._stats.stream, sys.stdout)
+        self.assertEqual(profiler.report(), report)
+
+
 class TestSignalsModule(BaseTestClass):
 
     @classmethod
@@ -121,6 +759,80 @@ class TestSignalsModule(BaseTestClass):
         with self.assertRaises(SignalException):
             self.signal.remove_dispatch(self.foo, 'foo')
 
+    def test_receiver_returns_dispatch(self):
+        signal = Signal()
+        calls = []
+
+        @receiver(signal, self.foo)
+        def dispatch(value):
+            calls.append(value)
+
+        self.assertIsNotNone(dispatch)
+        signal.notify(self.foo, 1)
+        signal.remove_dispatch(self.foo, dispatch)
+        with self.assertRaises(SignalException):
+            signal.notify(self.foo, 2)
+        self.assertEqual(calls, [1])
+
+    def test_any_sender_and_send(self):
+        signal = Signal()
+        signal.send(self.foo, 'nobody listens')
+        calls = []
+        receiver(signal)(calls.append)
+        signal.notify(self.foo, 1)
+        signal.send('other', 2)
+        self.assertEqual(calls, [1, 2])
+
+    def test_weak_receivers(self):
+        signal = Signal()
+        calls = []
+
+        class Listener:
+            def on_signal(self, value):
+                calls.append(value)
+
+        listener = Listener()
+        receiver(signal, self.foo, weak=True)(listener.on_signal)
+        signal.notify(self.foo, 1)
+        del listener
+        self.assertNotIn(self.foo, signal.dispatchers)
+        signal.send(self.foo, 2)
+        self.assertEqual(calls, [1])
+
+    def test_asynchronous_dispatch(self):
+        signal = Signal(asynchronous=True)
+        calls = []
+
+        def slow(value):
+            sleep(0.1)
+            calls.append(value)
+
+        receiver(signal, self.foo)(slow)
+        start = monotonic()
+        signal.notify(self.foo, 1)
+        self.assertLess(monotonic() - start, 0.1)
+        signal.join()
+        self.assertEqual(calls, [1])
+
+        errors = []
+        signal.handle_error = lambda dispatch, error: errors.append(error)
+        receiver(signal, self.foo)(lambda value: 1 / value)
+        signal.notify(self.foo, 0)
+        signal.join()
+        self.assertIsInstance(errors[0], ZeroDivisionError)
+
+    def test_batched_dispatch(self):
+        signal = Signal(batch_size=3, batch_interval=0.05)
+        batches = []
+        receiver(signal, self.foo)(batches.append)
+        for i in range(4):
+            signal.notify(self.foo, i)
+        self.assertEqual(batches, [[(0,), (1,), (2,)]])
+        sleep(0.2)
+        self.assertEqual(batches, [[(0,), (1,), (2,)], [(3,)]])
+        with self.assertRaises(SignalException):
+            signal.notify(self.foo, value=1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,15 +1,61 @@
 import unittest
+from unittest import mock
+import asyncio
 from random import randint
 import os
 import sys
+import tempfile
+import multiprocessing
+from queue import Queue
+from threading import Thread
+from functools import partial
+from time import sleep
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
 
+import requests
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 
-from raccy import UrlDownloaderWorker, DatabaseWorker, CrawlerWorker, WorkersManager
-from raccy.core.exceptions import CrawlerException
+from raccy import (
+    UrlDownloaderWorker, DatabaseWorker, CrawlerWorker, HttpCrawlerWorker, WorkersManager, DriverPool, Autoscaler,
+    AsyncUrlDownloaderWorker, AsyncCrawlerWorker, AsyncDatabaseWorker, BloomUrlFilter
+)
+from raccy.core.exceptions import CrawlerException, ImproperlyConfigured
+from raccy.core.queue_ import ItemUrlQueue, DatabaseQueue, AsyncDatabaseQueue
+from raccy.core.backends import ShardedQueue, SQLiteQueue
+from raccy.utils.profiles import ResourceProfile
+from raccy.core.cache import PageCache
+from raccy.utils.http import HttpDriver
+from raccy.core.profiling import PageProfiler
+from raccy.core.signals import receiver, page_fetched, item_scraped, item_saved, worker_error
+from raccy.core.metrics import ITEMS, ITEM_ERRORS, ITEM_SECONDS, DRIVER_ERRORS, MetricsReporter
+
+
+class FakeDriver:
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    @property
+    def current_url(self):
+        if not self.alive:
+            raise ConnectionRefusedError
+        return 'about:blank'
+
+    def get(self, url):
+        pass
+
+    def execute_script(self, script, *args):
+        self.script_args = args
+        return []
+
+    def quit(self):
+        self.closed = True
 
 
 class BaseTestClass(unittest.TestCase):
@@ -54,3 +100,1067 @@ class TestWorkers(BaseTestClass):
         with self.assertRaises(CrawlerException):
             self.UW(self.get_driver())
 
+    def test_database_worker_batches(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'dw', self.Db)
+
+        class BatchDb(DatabaseWorker):
+            data_wait_timeout = 0.1
+            batch_size = 10
+            batch_wait_timeout = 0.1
+            batches = []
+
+            def save_many(self, batch):
+                self.batches.append(batch)
+
+        db = BatchDb()
+        db.db_queue = Queue()
+        for i in range(25):
+            db.db_queue.put({'rand': randint(5, 100)})
+        db.job()
+
+        self.assertEqual([len(b) for b in BatchDb.batches], [10, 10, 5])
+        self.assertEqual(db.db_queue.unfinished_tasks, 0)
+        # the metrics count the items of the batches
+        self.assertEqual(ITEMS.value(worker='BatchDb'), 25)
+        self.assertEqual(ITEM_SECONDS.count(worker='BatchDb'), 25)
+
+        BatchDb.batches.clear()
+        db = BatchDb()
+        db.batch_wait_timeout = None
+        db.db_queue = Queue()
+        for i in range(15):
+            db.db_queue.put({'rand': randint(5, 100)})
+        db.job()
+        self.assertEqual([len(b) for b in BatchDb.batches], [10, 5])
+
+    def test_database_worker_resolves_downloads(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'dw', self.Db)
+
+        class DownloadDb(DatabaseWorker):
+            data_wait_timeout = 0.1
+            saved = []
+
+            def save(self, data):
+                self.saved.append(data)
+
+        done, failed = Future(), Future()
+        done.set_result('/images/image.jpg')
+        failed.set_exception(OSError('connection reset'))
+        db = DownloadDb()
+        db.db_queue = Queue()
+        db.db_queue.put({'name': 'phone', 'image_path': done})
+        db.db_queue.put({'name': 'tablet', 'image_path': failed})
+        db.job()
+
+        self.assertEqual(
+            DownloadDb.saved,
+            [{'name': 'phone', 'image_path': '/images/image.jpg'}, {'name': 'tablet', 'image_path': None}]
+        )
+
+    def test_background_downloads_need_an_in_memory_queue(self):
+        mg = WorkersManager()
+        mg.add_driver(FakeDriver)
+        self.addCleanup(delattr, mg, '_driver')
+        for name, worker in (('uw', self.UW), ('cw', self.Cw), ('dw', self.Db)):
+            self.addCleanup(mg.register_worker, name, worker)
+
+        class DownloadCw(CrawlerWorker):
+            background_downloads = True
+
+        self.addCleanup(DatabaseQueue().set_queue, DatabaseQueue().get_queue)
+        DatabaseQueue().set_queue(SQLiteQueue(os.path.join(tempfile.mkdtemp(), 'items.sqlite3')))
+        with self.assertRaises(CrawlerException):
+            mg.start(n=1)
+        DatabaseQueue().set_queue(Queue())
+        with self.assertRaises(CrawlerException):
+            mg.start(n=1, processes=2)
+
+    def test_crawler_worker_does_not_recurse(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+
+        class LoopCw(CrawlerWorker):
+            url_wait_timeout = 0.1
+            timings = []
+
+            def parse(self, url):
+                self.db_queue.put({'url': url})
+
+            def post_item(self, item, elapsed):
+                self.timings.append(elapsed)
+
+        cw = LoopCw(driver=None)
+        cw.url_queue, cw.db_queue = Queue(), Queue()
+        for i in range(5000):
+            cw.url_queue.put(f'https://example.com/{i}')
+        cw.job()
+
+        self.assertEqual(cw.db_queue.qsize(), 5000)
+        self.assertEqual(len(LoopCw.timings), 5000)
+        self.assertEqual(cw.url_queue.unfinished_tasks, 0)
+
+    def test_stopped_worker_drains_queue(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+
+        class StopCw(CrawlerWorker):
+            url_wait_timeout = None
+
+            def parse(self, url):
+                self.db_queue.put({'url': url})
+
+        cw = StopCw(driver=None)
+        cw.url_queue, cw.db_queue = Queue(), Queue()
+        for i in range(10):
+            cw.url_queue.put(f'https://example.com/{i}')
+        cw.stop(drain=True)
+        cw.job()
+        self.assertEqual(cw.db_queue.qsize(), 10)
+
+        cw.url_queue.put('https://example.com/')
+        cw.stop()
+        cw.job()
+        self.assertEqual(cw.url_queue.qsize(), 1)
+
+    def test_items_are_measured(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+
+        class MeteredCw(CrawlerWorker):
+            url_wait_timeout = 0.1
+
+            def parse(self, url):
+                if url.endswith('/bad'):
+                    raise ValueError(url)
+
+        reporter = MetricsReporter()
+        cw = MeteredCw(driver=None)
+        cw.url_queue = Queue()
+        for url in ('https://example.com/1', 'https://example.com/bad', 'https://example.com/2'):
+            cw.url_queue.put(url)
+        cw.job()
+
+        self.assertEqual(ITEMS.value(worker='MeteredCw'), 3)
+        self.assertEqual(ITEM_ERRORS.value(worker='MeteredCw'), 1)
+        self.assertEqual(ITEM_SECONDS.count(worker='MeteredCw'), 3)
+        self.assertRegex(reporter.summary(), r'MeteredCw [0-9.]+/s [0-9.]+s avg 1 errors')
+
+    def test_extract_is_one_round_trip(self):
+        driver = FakeDriver()
+        cw = self.Cw(driver)
+        cw.extract(rows='//tr', fields={'name': './td[1]', 'link': ('./td/a', 'href'), 'id': (None, 'id')})
+        self.assertEqual(
+            driver.script_args,
+            ('//tr', [['name', './td[1]', None], ['link', './td/a', 'href'], ['id', None, 'id']])
+        )
+
+
+class CdpDriver(FakeDriver):
+
+    def __init__(self):
+        super().__init__()
+        self.cdp = []
+        self.loaded = []
+
+    def get(self, url):
+        self.loaded.append(url)
+
+    def execute_cdp_cmd(self, cmd, args):
+        self.cdp.append((cmd, args))
+        return {}
+
+
+class TestPageCache(BaseTestClass):
+
+    def test_parse_from_cache(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+        cache = PageCache(os.path.join(tempfile.mkdtemp(), 'pages.sqlite3'))
+        self.addCleanup(cache.close)
+
+        class PageDriver(CdpDriver):
+
+            def get(self, url):
+                super().get(url)
+                self.page_source = f'<html><body><h1>{url}</h1><a href="/next">next</a></body></html>'
+
+        class CachedCw(CrawlerWorker):
+            url_wait_timeout = 0.1
+            page_cache = cache
+            parsed = []
+
+            def parse(self, url):
+                self.load(url)
+                if not self.from_cache:
+                    return self.parsed.append(None)
+                self.wait('//h1')
+                self.parsed.append((self.driver.find_element_by_xpath('//h1').text, self.extract({'next': ('//a', 'href')})))
+
+        urls = [f'https://example.com/{i}' for i in range(3)]
+        driver = PageDriver()
+        for run in range(2):
+            cw = CachedCw(driver)
+            cw.url_queue = Queue()
+            for url in urls:
+                cw.url_queue.put(url)
+            cw.job()
+            self.assertIs(cw.driver, driver)
+
+        self.assertEqual(driver.loaded, urls)
+        self.assertEqual(
+            CachedCw.parsed,
+            [None] * 3 + [(url, [{'next': 'https://example.com/next'}]) for url in urls]
+        )
+
+
+class TestResourceProfiles(BaseTestClass):
+
+    def test_profile_is_applied_to_new_drivers(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+
+        class LightCw(CrawlerWorker):
+            url_wait_timeout = 0.1
+            resource_profile = ResourceProfile(block=('stylesheet',))
+
+            def parse(self, url):
+                self.load(url)
+
+        pool = DriverPool(CdpDriver, 1, max_pages=2)
+        cw = LightCw(pool=pool)
+        first = cw.driver
+        self.assertEqual(
+            first.cdp, [('Network.enable', {}), ('Network.setBlockedURLs', {'urls': ['*.css', '*.css?*']})]
+        )
+        cw.url_queue = Queue()
+        for i in range(3):
+            cw.url_queue.put(f'https://example.com/{i}')
+        cw.job()
+        self.assertEqual(first.loaded, ['https://example.com/0', 'https://example.com/1'])
+        self.assertIsNot(cw.driver, first)
+        self.assertEqual(cw.driver.cdp, first.cdp)
+
+        self.assertFalse(LightCw.resource_profile.apply(FakeDriver()))
+
+    def test_load_waits_for_ready_xpath(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+        waits = []
+
+        class EagerCw(self.Cw):
+            ready_xpath = '//h1'
+            ready_timeout = 3
+
+            def wait(self, xpath, secs=5, condition=None, action=None):
+                waits.append((xpath, secs))
+
+        cw = EagerCw(CdpDriver())
+        cw.follow(url='https://example.com/', callback=lambda: None)
+        self.assertEqual(cw.driver.loaded, ['https://example.com/'])
+        self.assertEqual(waits, [('//h1', 3)])
+
+
+class TestDriverPool(BaseTestClass):
+
+    def test_prewarm_and_lease(self):
+        pool = DriverPool(FakeDriver, 2)
+        pool.prewarm()
+        d1, d2 = pool.acquire(), pool.acquire()
+        self.assertIsNot(d1, d2)
+        with self.assertRaises(CrawlerException):
+            pool.acquire(timeout=0.05)
+        pool.release(d1)
+        self.assertIs(pool.acquire(), d1)
+
+    def test_recycles_dead_and_worn_drivers(self):
+        pool = DriverPool(FakeDriver, 1, max_pages=3)
+        driver = pool.acquire()
+        self.assertIs(pool.checkpoint(driver), driver)
+        self.assertIs(pool.checkpoint(driver), driver)
+        new_driver = pool.checkpoint(driver)
+        self.assertIsNot(new_driver, driver)
+        self.assertTrue(driver.closed)
+
+        new_driver.alive = False
+        self.assertIsNot(pool.checkpoint(new_driver), new_driver)
+        self.assertTrue(new_driver.closed)
+
+    def test_max_rss_requires_psutil(self):
+        with mock.patch('raccy.worker.pool.psutil', None):
+            DriverPool(FakeDriver, 1)
+            with self.assertRaises(ImproperlyConfigured):
+                DriverPool(FakeDriver, 1, max_rss=10 ** 9)
+
+    def test_close(self):
+        pool = DriverPool(FakeDriver, 2)
+        pool.prewarm()
+        leased = pool.acquire()
+        pool.close()
+        self.assertFalse(leased.closed)
+        pool.release(leased)
+        self.assertTrue(leased.closed)
+        with self.assertRaises(CrawlerException):
+            pool.acquire()
+
+    def test_crawler_survives_crashed_driver(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+
+        class CrashCw(CrawlerWorker):
+            url_wait_timeout = 0.1
+
+            def parse(self, url):
+                if url == 'crash':
+                    self.driver.alive = False
+                    raise WebDriverException('browser crashed')
+                self.db_queue.put({'url': url})
+
+        pool = DriverPool(FakeDriver, 1)
+        cw = CrashCw(pool=pool)
+        first_driver = cw.driver
+        cw.url_queue, cw.db_queue = Queue(), Queue()
+        for url in ('a', 'crash', 'b'):
+            cw.url_queue.put(url)
+        cw.job()
+
+        self.assertEqual(cw.db_queue.qsize(), 2)
+        self.assertTrue(first_driver.closed)
+        self.assertTrue(pool.is_healthy(cw.driver))
+
+    def test_crawler_survives_failing_parse(self):
+        mg = WorkersManager()
+        drivers = []
+        mg.add_driver(lambda: drivers.append(FakeDriver()) or drivers[-1])
+        self.addCleanup(delattr, mg, '_driver')
+        for name, worker in (('uw', self.UW), ('cw', self.Cw), ('dw', self.Db)):
+            self.addCleanup(mg.register_worker, name, worker)
+        self.addCleanup(ItemUrlQueue().set_queue, ItemUrlQueue().get_queue)
+        self.addCleanup(DatabaseQueue().set_queue, DatabaseQueue().get_queue)
+        ItemUrlQueue().set_queue(Queue())
+        DatabaseQueue().set_queue(Queue())
+
+        class ListUw(UrlDownloaderWorker):
+            start_url = 'https://example.com/'
+
+            def job(self):
+                for url in ('https://example.com/1', 'https://example.com/bad', 'https://example.com/2'):
+                    self.url_queue.put(url)
+
+        class BuggyCw(CrawlerWorker):
+            url_wait_timeout = 0.2
+
+            def parse(self, url):
+                if url.endswith('/bad'):
+                    raise ValueError(url)
+                self.db_queue.put({'url': url})
+
+        class ListDb(DatabaseWorker):
+            data_wait_timeout = 0.3
+            saved = []
+
+            def save(self, data):
+                self.saved.append(data['url'])
+
+        mg.start(n=1)
+        self.assertEqual(sorted(ListDb.saved), ['https://example.com/1', 'https://example.com/2'])
+        self.assertEqual(len(drivers), 2)
+        self.assertTrue(all(driver.closed for driver in drivers))
+
+    def test_crawler_survives_failed_driver_restart(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+        starts = []
+
+        def flaky_driver():
+            starts.append(None)
+            if len(starts) == 2:
+                raise WebDriverException('chrome failed to start')
+            return FakeDriver()
+
+        class WornCw(CrawlerWorker):
+            url_wait_timeout = 0.1
+
+            def parse(self, url):
+                self.db_queue.put({'url': url})
+
+        pool = DriverPool(flaky_driver, 1, max_pages=1)
+        cw = WornCw(pool=pool)
+        cw.url_queue, cw.db_queue = Queue(), Queue()
+        for url in ('a', 'b'):
+            cw.url_queue.put(url)
+        errors = DRIVER_ERRORS.value(worker='WornCw')
+        cw.job()
+
+        self.assertEqual(cw.db_queue.qsize(), 2)
+        self.assertEqual(DRIVER_ERRORS.value(worker='WornCw'), errors + 1)
+        self.assertEqual(len(starts), 4)
+        self.assertEqual(pool._total, 1)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class StubCrawler:
+
+    def __init__(self):
+        self.stopped = False
+
+    def is_alive(self):
+        return True
+
+    def stop(self, drain=False):
+        self.stopped = True
+
+
+class TestAutoscaler(BaseTestClass):
+
+    def autoscaler(self, urls, backlog=0, memory=None, **kwargs):
+        url_queue, db_queue = Queue(), Queue()
+        for i in range(urls):
+            url_queue.put(f'https://example.com/{i}')
+        for i in range(backlog):
+            db_queue.put({'i': i})
+        pool = DriverPool(FakeDriver, 2)
+        scaler = Autoscaler(max_workers=4, urls_per_worker=10, **kwargs)
+        scaler.memory_percent = lambda: memory
+        scaler.attach(StubCrawler, [StubCrawler()], url_queue, db_queue, pool=pool)
+        return scaler
+
+    def test_scales_with_queue_depth(self):
+        scaler = self.autoscaler(urls=35)
+        scaler.scale()
+        self.assertEqual(len(scaler.active()), 4)
+        self.assertEqual(scaler.pool.size, 5)
+
+        while not scaler.url_queue.empty():
+            scaler.url_queue.get()
+        for running in (3, 2, 1, 1):
+            scaler.scale()
+            self.assertEqual(len(scaler.active()), running)
+        self.assertEqual(scaler.pool.size, 2)
+
+    def test_step(self):
+        scaler = self.autoscaler(urls=100, step=2)
+        scaler.scale()
+        self.assertEqual(len(scaler.active()), 3)
+
+    def test_database_backlog_and_memory_limit_growth(self):
+        scaler = self.autoscaler(urls=100, backlog=50, max_db_backlog=20)
+        scaler.scale()
+        self.assertEqual(len(scaler.active()), 1)
+
+        scaler = self.autoscaler(urls=100, memory=95, max_memory_percent=90)
+        scaler.scale()
+        self.assertEqual(len(scaler.active()), 1)
+        scaler.memory_percent = lambda: 50
+        scaler.scale()
+        self.assertEqual(len(scaler.active()), 4)
+        scaler.memory_percent = lambda: 95
+        scaler.scale()
+        self.assertEqual(len(scaler.active()), 3)
+
+    def test_memory_limit_requires_psutil(self):
+        with mock.patch('raccy.worker.autoscale.psutil', None):
+            Autoscaler(max_workers=4)
+            with self.assertRaises(ImproperlyConfigured):
+                Autoscaler(max_workers=4, max_memory_percent=90)
+
+    def test_finished(self):
+        scaler = self.autoscaler(urls=1)
+        self.assertFalse(scaler.finished())
+        scaler.url_queue.get()
+        self.assertFalse(scaler.finished())
+        for crawler in scaler.crawlers:
+            crawler.stop()
+        self.assertTrue(scaler.finished())
+
+    def test_manager_autoscaling(self):
+        mg = WorkersManager()
+        drivers = []
+        mg.add_driver(lambda: drivers.append(FakeDriver()) or drivers[-1])
+        self.addCleanup(delattr, mg, '_driver')
+        for name, worker in (('uw', self.UW), ('cw', self.Cw), ('dw', self.Db)):
+            self.addCleanup(mg.register_worker, name, worker)
+        url_queue, db_queue = Queue(), Queue()
+
+        class ScaledUw(UrlDownloaderWorker):
+            start_url = 'https://example.com/'
+
+            def job(self):
+                for i in range(60):
+                    url_queue.put(f'https://example.com/{i}')
+
+        class ScaledCw(CrawlerWorker):
+            url_wait_timeout = 0.3
+
+            def parse(self, url):
+                sleep(0.01)
+                self.db_queue.put({'url': url})
+
+        class ScaledDb(DatabaseWorker):
+            data_wait_timeout = 0.5
+            saved = []
+
+            def save(self, data):
+                self.saved.append(data['url'])
+
+        ScaledUw.url_queue = ScaledCw.url_queue = url_queue
+        ScaledCw.db_queue = ScaledDb.db_queue = db_queue
+        scaler = Autoscaler(max_workers=4, urls_per_worker=10, interval=0.02, max_memory_percent=None)
+        mg.start(n=1, autoscaler=scaler)
+
+        self.assertEqual(sorted(ScaledDb.saved), sorted(f'https://example.com/{i}' for i in range(60)))
+        self.assertGreater(len(scaler.crawlers), 1)
+        self.assertTrue(all(driver.closed for driver in drivers))
+
+    def test_thread_engine_only(self):
+        mg = WorkersManager()
+        mg.add_driver(FakeDriver)
+        self.addCleanup(delattr, mg, '_driver')
+        with self.assertRaises(CrawlerException):
+            mg.start(processes=2, autoscaler=Autoscaler(max_workers=4))
+
+
+class TestFanOut(BaseTestClass):
+
+    def setUp(self):
+        mg = self.mg = WorkersManager()
+        mg.add_driver(FakeDriver)
+        self.addCleanup(delattr, mg, '_driver')
+        for name, worker in (('uw', self.UW), ('cw', self.Cw), ('dw', self.Db)):
+            self.addCleanup(mg.register_worker, name, worker)
+
+    def test_downloaders_and_writers(self):
+        url_queue = Queue()
+
+        class FanUw(UrlDownloaderWorker):
+            start_urls = [f'https://example.com/{i}' for i in range(5)]
+            seen = []
+            url_queue = None
+
+            def job(self):
+                self.seen.append((self.name, self.start_url))
+                self.url_queue.put(self.start_url)
+
+        class FanCw(CrawlerWorker):
+            url_wait_timeout = 0.5
+
+            def parse(self, url):
+                self.db_queue.put({'url': url})
+
+        class FanDb(DatabaseWorker):
+            data_wait_timeout = 0.5
+            shard_key = 'url'
+            saved = {}
+
+            def save(self, data):
+                self.saved.setdefault(self.name, []).append(data['url'])
+
+        FanUw.url_queue = FanCw.url_queue = url_queue
+        self.mg.start(n=2, downloaders=3, writers=2)
+
+        self.assertEqual(sorted(url for _, url in FanUw.seen), FanUw.start_urls)
+        self.assertEqual(len({name for name, _ in FanUw.seen}), 3)
+        saved = [url for urls in FanDb.saved.values() for url in urls]
+        self.assertEqual(sorted(saved), FanUw.start_urls)
+        shards = ShardedQueue(2, 'url')
+        for urls in FanDb.saved.values():
+            self.assertEqual(len({shards.index({'url': url}) for url in urls}), 1)
+        self.assertNotIsInstance(DatabaseQueue().get_queue, ShardedQueue)
+
+    def test_downloaders_are_capped_by_start_urls(self):
+        class OneUw(UrlDownloaderWorker):
+            start_url = 'https://example.com/'
+
+            def job(self):
+                pass
+
+        self.mg.start(n=0, downloaders=4, writers=0)
+        self.assertEqual(len(self.mg._running), 1)
+        self.assertEqual(self.mg.pool.size, 1)
+        self.assertEqual(self.mg._running[0].start_urls, ['https://example.com/'])
+
+    def test_queue_sizes_are_restored(self):
+        sizes = []
+
+        class SizedUw(UrlDownloaderWorker):
+            start_url = 'https://example.com/'
+
+            def job(self):
+                sizes.append(ItemUrlQueue().get_queue.maxsize)
+
+        self.addCleanup(ItemUrlQueue().set_queue, ItemUrlQueue().get_queue)
+        ItemUrlQueue().set_queue(Queue(7))
+        self.mg.start(n=0, downloaders=1, writers=0, url_queue_size=3, db_queue_size=2)
+        self.assertEqual(sizes, [3])
+        self.assertEqual(ItemUrlQueue().get_queue.maxsize, 7)
+        self.assertEqual(DatabaseQueue().get_queue.maxsize, 0)
+
+    def test_url_filter_is_saved(self):
+        class FilteredUw(UrlDownloaderWorker):
+            start_url = 'https://example.com/'
+
+            def job(self):
+                self.url_queue.put('https://example.com/1')
+
+        class FilteredCw(CrawlerWorker):
+            url_wait_timeout = 0.1
+
+            def parse(self, url):
+                pass
+
+        path = os.path.join(tempfile.mkdtemp(), 'urls.bloom')
+        self.addCleanup(ItemUrlQueue().set_filter, ItemUrlQueue().url_filter)
+        ItemUrlQueue().set_filter(BloomUrlFilter(capacity=1000, path=path))
+        self.mg.start(n=1, writers=0)
+        self.assertTrue(BloomUrlFilter(path=path).contains('https://example.com/1'))
+
+    def test_sharding_is_thread_engine_only(self):
+        class ShardDb(DatabaseWorker):
+            shard_key = 'id'
+
+        with self.assertRaises(CrawlerException):
+            self.mg.start(processes=2, writers=2)
+
+
+class TestSpiders(BaseTestClass):
+
+    def test_spiders_run_side_by_side(self):
+        mg = WorkersManager()
+        drivers = []
+        mg.add_driver(lambda: drivers.append(FakeDriver()) or drivers[-1])
+        self.addCleanup(delattr, mg, '_driver')
+        self.addCleanup(mg.register_worker, 'dw', self.Db)
+        self.addCleanup(DatabaseQueue().set_queue, DatabaseQueue().get_queue)
+        DatabaseQueue().set_queue(Queue())
+        saved = []
+
+        def spider(name, own_db):
+            class SpiderUw(UrlDownloaderWorker, spider=name):
+                start_url = f'https://{name}.example.com/'
+
+                def job(self):
+                    for i in range(3):
+                        self.url_queue.put(f'{self.start_url}{i}')
+
+            class SpiderCw(CrawlerWorker, spider=name):
+                url_wait_timeout = 0.3
+
+                def parse(self, url):
+                    self.db_queue.put({'spider': name, 'url': url})
+
+            if own_db:
+                class SpiderDb(DatabaseWorker, spider=name):
+                    data_wait_timeout = 0.5
+
+                    def save(self, data):
+                        saved.append((name, data['url']))
+
+        class SharedDb(DatabaseWorker):
+            data_wait_timeout = 0.5
+
+            def save(self, data):
+                saved.append(('shared', data['url']))
+
+        spider('shop', own_db=True)
+        spider('blog', own_db=False)
+        self.assertEqual((mg.uw, mg.cw), (self.UW, self.Cw))
+
+        mg.start(n=2, spiders=['shop', 'blog'])
+        self.assertEqual(
+            sorted(saved),
+            sorted([('shop', f'https://shop.example.com/{i}') for i in range(3)] +
+                   [('shared', f'https://blog.example.com/{i}') for i in range(3)])
+        )
+        self.assertEqual(mg.pool.size, 6)
+        self.assertTrue(all(driver.closed for driver in drivers))
+
+    def test_unknown_spider(self):
+        mg = WorkersManager()
+        mg.add_driver(FakeDriver)
+        self.addCleanup(delattr, mg, '_driver')
+        with self.assertRaises(CrawlerException):
+            mg.start(spiders=['missing'])
+        with self.assertRaises(CrawlerException):
+            mg.start(spiders=['missing'], engine='asyncio')
+
+
+class TestLifecycleSignals(BaseTestClass):
+
+    def test_workers_send_lifecycle_signals(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+        self.addCleanup(mg.register_worker, 'dw', self.Db)
+        url_queue = Queue()
+        events = []
+
+        class SignalCw(CrawlerWorker):
+            url_wait_timeout = 0.1
+
+            def parse(self, url):
+                if url.endswith('bad'):
+                    raise ValueError(url)
+                self.load(url)
+                self.db_queue.put({'url': url})
+
+        class SignalDb(DatabaseWorker):
+            data_wait_timeout = 0.1
+
+            def save(self, data):
+                pass
+
+        dispatches = [
+            receiver(page_fetched, SignalCw)(lambda worker, url: events.append(('fetched', url))),
+            receiver(item_scraped, SignalCw)(lambda worker, item: events.append(('scraped', item['url']))),
+            receiver(item_saved, SignalDb)(lambda worker, item: events.append(('saved', item['url']))),
+            receiver(worker_error, SignalCw)(lambda worker, error: events.append(('error', str(error)))),
+        ]
+        for signal, sender, dispatch in zip(
+                (page_fetched, item_scraped, item_saved, worker_error), (SignalCw, SignalCw, SignalDb, SignalCw), dispatches
+        ):
+            self.addCleanup(signal.remove_dispatch, sender, dispatch)
+        self.addCleanup(DatabaseQueue().set_queue, DatabaseQueue().get_queue)
+        DatabaseQueue().set_queue(Queue())
+
+        SignalCw.url_queue = url_queue
+        url_queue.put('https://example.com/1')
+        crawler = SignalCw(FakeDriver())
+        crawler.start()
+        crawler.join()
+        url_queue.put('https://example.com/bad')
+        SignalCw(FakeDriver()).run()
+        SignalDb().run()
+        for signal in (page_fetched, item_scraped, item_saved, worker_error):
+            signal.join()
+        self.assertEqual(events, [
+            ('fetched', 'https://example.com/1'),
+            ('scraped', 'https://example.com/1'),
+            ('error', 'https://example.com/bad'),
+            ('saved', 'https://example.com/1'),
+        ])
+
+    def test_async_workers_send_lifecycle_signals(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+        self.addCleanup(mg.register_worker, 'dw', self.Db)
+        events = []
+
+        class AsyncSignalCw(AsyncCrawlerWorker):
+            url_wait_timeout = 0.1
+
+            async def parse(self, url):
+                await self.load(url)
+                await self.db_queue.put({'url': url})
+
+        class AsyncSignalDb(AsyncDatabaseWorker):
+            data_wait_timeout = 0.1
+
+            async def save(self, data):
+                pass
+
+        dispatches = [
+            receiver(page_fetched, AsyncSignalCw)(lambda worker, url: events.append(('fetched', url))),
+            receiver(item_scraped, AsyncSignalCw)(lambda worker, item: events.append(('scraped', item['url']))),
+            receiver(item_saved, AsyncSignalDb)(lambda worker, item: events.append(('saved', item['url']))),
+        ]
+        for signal, sender, dispatch in zip(
+                (page_fetched, item_scraped, item_saved), (AsyncSignalCw, AsyncSignalCw, AsyncSignalDb), dispatches
+        ):
+            self.addCleanup(signal.remove_dispatch, sender, dispatch)
+
+        async def crawl():
+            crawler, db = AsyncSignalCw(FakeDriver()), AsyncSignalDb()
+            crawler.url_queue, crawler.db_queue = asyncio.Queue(), AsyncDatabaseQueue()
+            db.db_queue = crawler.db_queue
+            await crawler.url_queue.put('https://example.com/1')
+            await crawler.run()
+            await db.run()
+
+        asyncio.run(crawl())
+        for signal in (page_fetched, item_scraped, item_saved):
+            signal.join()
+        self.assertEqual(events, [
+            ('fetched', 'https://example.com/1'),
+            ('scraped', 'https://example.com/1'),
+            ('saved', 'https://example.com/1'),
+        ])
+
+    def test_async_worker_error_is_sent_once(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'dw', self.Db)
+        errors = []
+
+        class FailingDb(AsyncDatabaseWorker):
+            data_wait_timeout = 0.1
+
+            async def save(self, data):
+                raise ValueError(data['url'])
+
+        dispatch = receiver(worker_error, FailingDb)(lambda worker, error: errors.append(str(error)))
+        self.addCleanup(worker_error.remove_dispatch, FailingDb, dispatch)
+
+        async def crawl():
+            db = FailingDb()
+            db.db_queue = asyncio.Queue()
+            await db.db_queue.put({'url': 'https://example.com/bad'})
+            await db.run()
+
+        with self.assertRaises(ValueError):
+            asyncio.run(crawl())
+        worker_error.join()
+        self.assertEqual(errors, ['https://example.com/bad'])
+
+
+class TestPageProfiling(BaseTestClass):
+
+    def test_crawler_pages_are_profiled(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+        self.addCleanup(mg.register_worker, 'dw', self.Db)
+        url_queue, db_queue = Queue(), Queue()
+        profiler = PageProfiler(sample_rate=0.5, top=5)
+
+        class SlowDriver(FakeDriver):
+            def get(self, url):
+                sleep(0.02)
+
+        class ProfiledCw(CrawlerWorker):
+            url_wait_timeout = 0.1
+
+            def parse(self, url):
+                self.load(url)
+                self.db_queue.put({'url': url})
+
+        class ProfiledDb(DatabaseWorker):
+            data_wait_timeout = 0.1
+
+            def save(self, data):
+                sleep(0.01)
+
+        ProfiledCw.url_queue = url_queue
+        ProfiledCw.db_queue = ProfiledDb.db_queue = db_queue
+        ProfiledCw.profiler = ProfiledDb.profiler = profiler
+        for i in range(3):
+            url_queue.put(f'https://example.com/{i}')
+        ProfiledCw(SlowDriver()).run()
+        ProfiledDb().run()
+
+        self.assertEqual(profiler.pages, 3)
+        for record in profiler.slowest():
+            self.assertGreaterEqual(record.phases['load'], 0.02)
+            self.assertGreaterEqual(record.phases['save'], 0.01)
+        self.assertIn('save', profiler.report())
+
+
+class TestHttpCrawlerWorker(BaseTestClass):
+    page = """
+    <html><head><title>Phones</title></head><body>
+        <article class="prd"><a href="/phone/1"><h3>Phone 1</h3></a><span class="price">GH₵ 100</span></article>
+        <article class="prd"><a href="/phone/2"><h3>Phone 2</h3></a></article>
+        <a id="next" href="/page/2">Next</a>
+    </body></html>
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        site = tempfile.mkdtemp()
+        with open(os.path.join(site, 'phones.html'), 'w', encoding='utf-8') as f:
+            f.write(cls.page)
+        os.mkdir(os.path.join(site, 'page'))
+        with open(os.path.join(site, 'page', '2'), 'w', encoding='utf-8') as f:
+            f.write('<html><head><title>Page 2</title></head><body></body></html>')
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=site))
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}/phones.html'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_parse_contract(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+
+        class HttpCw(HttpCrawlerWorker):
+            url_wait_timeout = 0.1
+
+            def parse(self, url):
+                self.driver.get(url)
+                for product in self.driver.find_elements_by_xpath("//article[@class='prd']"):
+                    self.db_queue.put({
+                        'name': product.find_element_by_xpath('.//h3').text,
+                        'url': product.find_element_by_xpath('.//a').get_attribute('href')
+                    })
+
+        self.assertIs(mg.cw, HttpCw)
+        cw = HttpCw()
+        cw.url_queue, cw.db_queue = Queue(), Queue()
+        cw.url_queue.put(self.url)
+        cw.job()
+
+        base = self.url.rsplit('/', 1)[0]
+        self.assertEqual(
+            list(cw.db_queue.queue),
+            [{'name': 'Phone 1', 'url': f'{base}/phone/1'}, {'name': 'Phone 2', 'url': f'{base}/phone/2'}]
+        )
+        self.assertEqual(cw.driver.title, 'Phones')
+
+    def test_failed_requests_are_skipped(self):
+        mg = WorkersManager()
+        self.addCleanup(mg.register_worker, 'cw', self.Cw)
+        errors = []
+
+        class SturdyCw(HttpCrawlerWorker):
+            url_wait_timeout = 0.1
+
+            def parse(self, url):
+                self.driver.get(url)
+                self.db_queue.put({'title': self.driver.title})
+
+        dispatch = receiver(worker_error, SturdyCw)(lambda worker, error: errors.append(error))
+        self.addCleanup(worker_error.remove_dispatch, SturdyCw, dispatch)
+        # a session without the retries of the shared one
+        cw = SturdyCw(HttpDriver(session=requests.Session()))
+        cw.url_queue, cw.db_queue = Queue(), Queue()
+        base = self.url.rsplit('/', 1)[0]
+        for url in ('http://127.0.0.1:1/', f'{base}/missing.html', 'http://127.0.0.1:1/other', self.url):
+            cw.url_queue.put(url)
+        before = DRIVER_ERRORS.value(worker='SturdyCw')
+        cw.job()
+
+        self.assertEqual(list(cw.db_queue.queue), [{'title': 'Phones'}])
+        self.assertTrue(cw.url_queue.empty())
+        self.assertEqual(DRIVER_ERRORS.value(worker='SturdyCw') - before, 3)
+        worker_error.join()
+        self.assertEqual(len(errors), 3)
+
+    def test_extract_and_follow(self):
+        cw = HttpCrawlerWorker()
+        cw.driver.get(self.url)
+        self.assertEqual(
+            cw.extract(rows="//article", fields={'name': './/h3', 'price': ".//span[@class='price']"}),
+            [{'name': 'Phone 1', 'price': 'GH₵ 100'}, {'name': 'Phone 2', 'price': None}]
+        )
+        cw.wait("//a[@id='next']")
+        pages = []
+        cw.follow(xpath="//a[@id='next']", callback=lambda: pages.append(cw.driver.current_url))
+        self.assertTrue(pages[0].endswith('/page/2'))
+
+
+class TestAsyncioEngine(BaseTestClass):
+
+    def setUp(self):
+        mg = WorkersManager()
+        self.drivers = []
+        mg.add_driver(lambda: self.drivers.append(FakeDriver()) or self.drivers[-1])
+        self.addCleanup(delattr, mg, '_driver')
+        for name, worker in (('uw', self.UW), ('cw', self.Cw), ('dw', self.Db)):
+            self.addCleanup(mg.register_worker, name, worker)
+
+    def test_asyncio_engine(self):
+        class AsyncUw(AsyncUrlDownloaderWorker):
+            start_url = 'https://example.com/'
+
+            async def job(self):
+                for i in range(50):
+                    await self.url_queue.put(f'https://example.com/{i}')
+
+        class AsyncCw(AsyncCrawlerWorker):
+            url_wait_timeout = 0.2
+
+            async def parse(self, url):
+                await self.run_sync(self.driver.get, url)
+                await self.db_queue.put({'url': url})
+
+        class AsyncDb(AsyncDatabaseWorker):
+            data_wait_timeout = 0.5
+            saved = []
+
+            async def save(self, data):
+                self.saved.append(data['url'])
+
+        mg = WorkersManager()
+        with self.assertRaises(CrawlerException):
+            mg.start(n=2)
+        mg.start(n=5, engine='asyncio')
+
+        self.assertEqual(sorted(AsyncDb.saved), sorted(f'https://example.com/{i}' for i in range(50)))
+        self.assertEqual(len(self.drivers), 6)
+        self.assertTrue(all(driver.closed for driver in self.drivers))
+
+    def test_asyncio_engine_with_several_writers(self):
+        class AsyncUw(AsyncUrlDownloaderWorker):
+            start_url = 'https://example.com/'
+
+            async def job(self):
+                for i in range(30):
+                    await self.url_queue.put(f'https://example.com/{i}')
+
+        class AsyncCw(AsyncCrawlerWorker):
+            url_wait_timeout = 0.2
+
+            async def parse(self, url):
+                await self.run_sync(self.driver.get, url)
+                await self.db_queue.put({'url': url})
+
+        class AsyncDb(AsyncDatabaseWorker):
+            data_wait_timeout = 0.5
+            saved = []
+
+            async def save(self, data):
+                self.saved.append(data['url'])
+
+        WorkersManager().start(n=3, engine='asyncio', writers=2)
+        self.assertEqual(sorted(AsyncDb.saved), sorted(f'https://example.com/{i}' for i in range(30)))
+
+        class ShardedDb(AsyncDb):
+            shard_key = 'url'
+
+        with self.assertRaises(CrawlerException):
+            WorkersManager().start(n=3, engine='asyncio', writers=2)
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == 'fork', 'test workers are defined locally')
+class TestMultiProcessMode(BaseTestClass):
+
+    def setUp(self):
+        mg = WorkersManager()
+        mg.add_driver(FakeDriver)
+        self.addCleanup(delattr, mg, '_driver')
+        for name, worker in (('uw', self.UW), ('cw', self.Cw), ('dw', self.Db)):
+            self.addCleanup(mg.register_worker, name, worker)
+
+    def test_crawlers_in_processes(self):
+        class ProcessUw(UrlDownloaderWorker):
+            start_url = 'https://example.com/'
+
+            def job(self):
+                for i in range(40):
+                    self.url_queue.put(f'https://example.com/{i}')
+
+        class ProcessCw(CrawlerWorker):
+            url_wait_timeout = 0.5
+
+            def parse(self, url):
+                self.db_queue.put({'url': url, 'pid': os.getpid()})
+
+        class ProcessDb(DatabaseWorker):
+            data_wait_timeout = 1
+            saved = []
+
+            def save(self, data):
+                self.saved.append(data)
+
+        url_queue = ItemUrlQueue().get_queue
+        WorkersManager().start(n=2, processes=2)
+
+        self.assertEqual(sorted(d['url'] for d in ProcessDb.saved), sorted(f'https://example.com/{i}' for i in range(40)))
+        self.assertNotIn(os.getpid(), {d['pid'] for d in ProcessDb.saved})
+        self.assertIs(ItemUrlQueue().get_queue, url_queue)